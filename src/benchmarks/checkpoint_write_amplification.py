@@ -0,0 +1,75 @@
+"""
+Measures how many bytes the checkpoint saver writes over a long conversation, with full
+snapshots only versus delta storage.
+
+Run from `src`:
+
+    python -m benchmarks.checkpoint_write_amplification --turns 200 --snapshot-interval 20
+"""
+import argparse
+import uuid
+import bson
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.base import empty_checkpoint
+from llm.mongo_db_saver import BaseMongoDBSaver
+
+USER_TEXT = "Hi Harry! I'm in Ravenclaw and I've just learnt the Patronus charm, any tips? "
+HARRY_TEXT = "Blimey, that's brilliant! Think of your happiest memory and hold on to it tight. 🦉 "
+
+
+def simulate(turns: int, snapshot_interval: int) -> list[int]:
+    """
+    Writes the checkpoints of a conversation with the saver's document format.
+
+    Args:
+    ----
+    turns : int
+        The number of user/Harry turns.
+
+    snapshot_interval : int
+        The saver's snapshot interval. 1 writes a full snapshot for every checkpoint.
+
+    Returns:
+    -------
+    list[int]
+        The BSON size of every checkpoint document written, in order.
+    """
+    saver = BaseMongoDBSaver(snapshot_interval=snapshot_interval)
+    messages = []
+    parent_id = None
+    sizes = []
+
+    for turn in range(turns):
+        for message in (HumanMessage(USER_TEXT * 3, id=str(uuid.uuid4())), AIMessage(HARRY_TEXT * 4, id=str(uuid.uuid4()))):
+            messages = messages + [message]
+            checkpoint = empty_checkpoint()
+            checkpoint["channel_values"] = {"messages": messages}
+            config = {"configurable": {"thread_id": "benchmark", "checkpoint_ns": "", "checkpoint_id": parent_id}}
+
+            upsert_query, doc, _ = saver._dump_checkpoint(config, checkpoint, {"source": "loop", "step": turn})
+            sizes.append(len(bson.encode({**upsert_query, **doc})))
+            parent_id = checkpoint["id"]
+
+    return sizes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--snapshot-interval", type=int, default=20)
+    args = parser.parse_args()
+
+    snapshots = simulate(args.turns, 1)
+    deltas = simulate(args.turns, args.snapshot_interval)
+
+    print(f"{'turns':>6} {'snapshot bytes':>16} {'delta bytes':>14} {'ratio':>7}")
+    for turns in sorted({10, 50, 100, args.turns}):
+        if turns > args.turns:
+            continue
+        snapshot_bytes = sum(snapshots[:turns * 2])
+        delta_bytes = sum(deltas[:turns * 2])
+        print(f"{turns:>6} {snapshot_bytes:>16,} {delta_bytes:>14,} {snapshot_bytes / delta_bytes:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Measures the cold start of the app: how long `import main` takes in a fresh interpreter,
+which modules dominate it, and how long the LLM warmup takes afterwards.
+
+Run from `src`, with the usual environment variables set:
+
+    python -m benchmarks.import_time --runs 5 --top 15
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+IMPORT_MAIN = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+WARMUP = (
+    "import asyncio, time, main, llm; t = time.perf_counter(); "
+    "asyncio.run(llm.warmup()); print(time.perf_counter() - t)"
+)
+
+
+def run(code: str, *flags: str) -> subprocess.CompletedProcess:
+    """
+    Runs `code` in a fresh interpreter, so nothing is imported yet.
+
+    Args:
+    ----
+    code : str
+        The code to run.
+
+    Returns:
+    -------
+    subprocess.CompletedProcess
+        The finished process, with its output captured.
+    """
+    return subprocess.run(
+        [sys.executable, "-W", "ignore", *flags, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def slowest_imports(top: int) -> list[tuple[int, str]]:
+    """
+    Returns the `top` modules with the largest cumulative import time of `import main`.
+
+    Args:
+    ----
+    top : int
+        The number of modules to return.
+
+    Returns:
+    -------
+    list[tuple[int, str]]
+        The cumulative import time in microseconds and the name of each module, slowest first.
+    """
+    stderr = run("import main", "-X", "importtime").stderr
+    timings = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        timings.append((int(cumulative), name.strip()))
+
+    return sorted(timings, reverse=True)[:top]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--skip-warmup", action="store_true", help="Do not time the LLM warmup.")
+    args = parser.parse_args()
+
+    imports = [float(run(IMPORT_MAIN).stdout) for _ in range(args.runs)]
+    print(f"import main: median {statistics.median(imports):.3f}s, "
+          f"min {min(imports):.3f}s, max {max(imports):.3f}s over {args.runs} runs")
+
+    loaded = run("import sys, main; print(sorted(m for m in sys.modules if m.startswith(('langchain', 'langgraph'))))")
+    print(f"LLM modules loaded by import main: {loaded.stdout.strip()}")
+
+    if not args.skip_warmup:
+        print(f"LLM warmup: {float(run(WARMUP).stdout):.3f}s")
+
+    print(f"\n{'cumulative':>12}  module")
+    for cumulative, name in slowest_imports(args.top):
+        print(f"{cumulative / 1e6:>11.3f}s  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+"""
+Load-tests the chat path: simulated users register, log in, create a chat and run turns
+over `/chats/{chat_id}/send`, against the app from `main.py` answering with the fake chat
+model (`LLM_PROVIDER=fake`).
+
+The app is served by uvicorn in a thread of this process, on its own event loop, whose lag
+is sampled during the run. Storage is mongomock-motor by default, or a real MongoDB with
+`--mongo mongodb://...` (a fresh database is used). mongomock runs every query on the server's
+event loop, so beyond a few hundred users it inflates the loop lag; use a real MongoDB for
+capacity numbers. `--url` targets a server that is already running instead; the event-loop
+lag is then not measured.
+
+Run from `src`, with the packages of `requirements-dev.txt` installed:
+
+    python -m benchmarks.load_test --users 1000 --turns 5 --report load.json
+    python -m benchmarks.load_test --users 1000 --turns 5 --compare load.json
+
+Every user hashes its password twice (register and login), so with thousands of users the
+setup phase is bound by `PASSWORD_HASH_WORKERS`; rejected attempts are retried.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import subprocess
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+LOOP_LAG_INTERVAL_SECONDS = 0.05
+MAX_ATTEMPTS = 20
+
+
+class Stats:
+    """
+    Collects the measurements of a run, in seconds.
+    """
+
+    def __init__(self):
+        self.setup = {"register": [], "login": [], "create_chat": []}
+        self.latency: list[float] = []
+        self.ttft: list[float] = []
+        self.turn_spans: list[tuple[float, float]] = []
+        self.errors: dict[str, int] = {}
+        self.error_samples: dict[str, str] = {}
+        self.retries = 0
+        self.completed_users = 0
+
+    def error(self, stage: str, error: Exception) -> None:
+        self.errors[stage] = self.errors.get(stage, 0) + 1
+        self.error_samples.setdefault(stage, repr(error)[:300])
+
+
+def summarize(values: list[float]) -> dict:
+    """
+    Summarizes durations in seconds as count, mean and percentiles in milliseconds.
+
+    Args:
+    ----
+    values : list[float]
+        The durations.
+
+    Returns:
+    -------
+    dict
+        The summary.
+    """
+    if not values:
+        return {"count": 0}
+
+    ordered = sorted(values)
+
+    def percentile(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean": round(statistics.fmean(ordered) * 1000, 2),
+        "p50": round(percentile(0.50), 2),
+        "p95": round(percentile(0.95), 2),
+        "p99": round(percentile(0.99), 2),
+        "max": round(ordered[-1] * 1000, 2),
+    }
+
+
+def configure_environment(args: argparse.Namespace) -> None:
+    """
+    Sets the settings of the app under test. Must run before `main` is imported.
+    """
+    database = f"loadtest_{uuid.uuid4().hex[:8]}"
+    defaults = {
+        "APP_NAME": "harry-load-test",
+        "APP_VERSION": "0",
+        "SECRET_KEY": uuid.uuid4().hex,
+        "ALGORITHM": "HS256",
+        "MODEL_NAME": "fake",
+        "GOOGLE_API_KEY": "",
+    }
+    for name, value in defaults.items():
+        os.environ.setdefault(name, value)
+
+    os.environ.update({
+        "LLM_PROVIDER": "fake",
+        "FAKE_LLM_LATENCY_SECONDS": str(args.llm_latency),
+        "FAKE_LLM_TOKENS_PER_SECOND": str(args.llm_tokens_per_second),
+        "MONGODB_URL": args.mongo if args.mongo != "mock" else "mongodb://mongomock",
+        "MONGODB_DATABASE": database,
+        "CHECKPOINT_DATABASE": f"{database}_checkpoints",
+        "CHECKPOINT_RETENTION_ENABLED": "false",
+        "BROKER_BACKEND": "memory",
+    })
+    if args.mongo == "mock":
+        os.environ.update({"ENSURE_INDEXES": "false", "EXPLAIN_HOT_QUERIES": "false"})
+
+
+def start_server(args: argparse.Namespace, loop_lags: list[tuple[float, float]]) -> tuple[object, str]:
+    """
+    Serves the app from `main.py` with uvicorn in a background thread.
+
+    Args:
+    ----
+    args : argparse.Namespace
+        The command line options.
+
+    loop_lags : list[tuple[float, float]]
+        Receives `(time.monotonic(), lag)` samples of the server's event loop.
+
+    Returns:
+    -------
+    tuple[uvicorn.Server, str]
+        The running server and its base URL.
+    """
+    import uvicorn
+
+    if args.mongo == "mock":
+        from mongomock_motor import AsyncMongoMockClient, AsyncMongoMockCollection
+        import helpers.database
+
+        helpers.database.AsyncIOMotorClient = lambda *_, **__: AsyncMongoMockClient()
+        # mongomock-motor's `with_options` returns a sync collection; write concerns mean
+        # nothing to the mock anyway.
+        AsyncMongoMockCollection.with_options = lambda self, **_: self
+
+    import main
+
+    async def sample_loop_lag():
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(LOOP_LAG_INTERVAL_SECONDS)
+            loop_lags.append((time.monotonic(), loop.time() - started - LOOP_LAG_INTERVAL_SECONDS))
+
+    async def start_sampler():
+        main.app.loop_lag_task = asyncio.create_task(sample_loop_lag())
+
+    main.app.add_event_handler("startup", start_sampler)
+
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=args.port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="load-test-server", daemon=True)
+    thread.start()
+
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("The server failed to start")
+        time.sleep(0.05)
+
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, f"http://127.0.0.1:{port}"
+
+
+async def wait_ready(client, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = await client.get("/readyz")
+        if response.status_code == 200:
+            return
+        await asyncio.sleep(0.2)
+
+    raise RuntimeError(f"The server was not ready after {timeout}s: {response.json()}")
+
+
+async def post(client, stats: Stats, stage: str, path: str, **kwargs):
+    """
+    POSTs a setup request, retrying while the server sheds load, and records its duration.
+    """
+    for _ in range(MAX_ATTEMPTS):
+        started = time.perf_counter()
+        response = await client.post(path, **kwargs)
+        if response.status_code != 429:
+            break
+        stats.retries += 1
+        await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+
+    response.raise_for_status()
+    stats.setup[stage].append(time.perf_counter() - started)
+    return response.json()
+
+
+async def run_turn(websocket, text: str, stats: Stats) -> None:
+    """
+    Sends one message and waits for Harry's complete reply.
+    """
+    started = time.perf_counter()
+    first_token: Optional[float] = None
+    await websocket.send(text)
+
+    while True:
+        frame = json.loads(await websocket.recv())
+        if frame.get("sender") != "SYSTEM":
+            continue
+
+        if frame["type"] in ("delta", "message") and first_token is None:
+            first_token = time.perf_counter()
+        if frame["type"] in ("end", "message"):
+            break
+
+    finished = time.perf_counter()
+    stats.ttft.append((first_token or finished) - started)
+    stats.latency.append(finished - started)
+    stats.turn_spans.append((started, finished))
+
+
+async def simulate_user(index: int, args: argparse.Namespace, base_url: str, client, stats: Stats) -> None:
+    """
+    Runs one simulated user: register, log in, create a chat and run `args.turns` turns.
+    """
+    from websockets.asyncio.client import connect
+
+    await asyncio.sleep(args.ramp_seconds * index / max(1, args.users))
+
+    name = f"user{index}_{uuid.uuid4().hex[:6]}"
+    stage = "register"
+    try:
+        await post(client, stats, "register", "/register", json={
+            "username": name, "email": f"{name}@hogwarts.edu", "full_name": name, "password": "alohomora",
+        })
+        stage = "login"
+        token = (await post(client, stats, "login", "/login", json={"username": name, "password": "alohomora"}))["access_token"]
+        stage = "create_chat"
+        chat = await post(client, stats, "create_chat", "/chats/create", json={"name": "load test"},
+                          headers={"Authorization": f"Bearer {token}"})
+
+        stage = "connect"
+        url = f"{base_url.replace('http', 'ws', 1)}/chats/{chat['session_id']}/send"
+        async with connect(url, additional_headers={"Authorization": f"Bearer {token}"},
+                           max_size=None, open_timeout=args.timeout) as websocket:
+            await websocket.recv()
+            stage = "turn"
+            for turn in range(args.turns):
+                await run_turn(websocket, f"Turn {turn}: which spell would you use against a boggart?", stats)
+                if args.think_seconds:
+                    await asyncio.sleep(args.think_seconds)
+
+        stats.completed_users += 1
+    except Exception as e:
+        stats.error(stage, e)
+
+
+def raise_file_limit() -> None:
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_report(args: argparse.Namespace, stats: Stats, loop_lags: list[tuple[float, float]], duration: float) -> dict:
+    """
+    Builds the JSON report of a run.
+    """
+    turns = {"count": len(stats.latency), "duration_seconds": 0.0, "throughput_per_second": 0.0}
+    if stats.turn_spans:
+        first = min(start for start, _ in stats.turn_spans)
+        last = max(end for _, end in stats.turn_spans)
+        turns["duration_seconds"] = round(last - first, 3)
+        turns["throughput_per_second"] = round(len(stats.turn_spans) / max(last - first, 1e-9), 2)
+
+    config = {name: value for name, value in vars(args).items() if name not in ("report", "compare")}
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": config,
+        "duration_seconds": round(duration, 3),
+        "users": {
+            "simulated": args.users,
+            "completed": stats.completed_users,
+            "errors": stats.errors,
+            "error_samples": stats.error_samples,
+        },
+        "setup_ms": {stage: summarize(values) for stage, values in stats.setup.items()},
+        "setup_retries": stats.retries,
+        "turns": turns,
+        "turn_latency_ms": summarize(stats.latency),
+        "time_to_first_token_ms": summarize(stats.ttft),
+        "loop_lag_ms": summarize([lag for _, lag in loop_lags]) if loop_lags else None,
+    }
+
+
+COMPARED_METRICS = [
+    ("turns", "throughput_per_second"),
+    ("turn_latency_ms", "p50"),
+    ("turn_latency_ms", "p95"),
+    ("turn_latency_ms", "p99"),
+    ("time_to_first_token_ms", "p50"),
+    ("time_to_first_token_ms", "p95"),
+    ("time_to_first_token_ms", "p99"),
+    ("loop_lag_ms", "p99"),
+    ("loop_lag_ms", "max"),
+]
+
+
+def compare(baseline: dict, report: dict) -> None:
+    """
+    Prints the headline metrics of two reports side by side.
+    """
+    print(f"\n{'metric':<30} {baseline.get('commit') or 'baseline':>12} {report.get('commit') or 'current':>12} {'change':>9}")
+    for section, name in COMPARED_METRICS:
+        old = (baseline.get(section) or {}).get(name)
+        new = (report.get(section) or {}).get(name)
+        if old is None or new is None:
+            continue
+        change = f"{(new - old) / old * 100:+.1f}%" if old else "-"
+        print(f"{section + '.' + name:<30} {old:>12.2f} {new:>12.2f} {change:>9}")
+
+
+async def run(args: argparse.Namespace, base_url: str, stats: Stats) -> None:
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.max_http_connections)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        await wait_ready(client, args.timeout)
+        await asyncio.gather(*(simulate_user(i, args, base_url, client, stats) for i in range(args.users)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=3, help="Turns per user.")
+    parser.add_argument("--ramp-seconds", type=float, default=5.0, help="Users start evenly over this period.")
+    parser.add_argument("--think-seconds", type=float, default=0.0, help="Pause between the turns of a user.")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Fake model delay before the first token.")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--mongo", default="mock", help='"mock" for mongomock-motor, or a MongoDB URL.')
+    parser.add_argument("--url", help="Load-test a running server instead of starting one.")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--max-http-connections", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--report", help="Write the JSON report to this file.")
+    parser.add_argument("--compare", help="A previous JSON report to compare against.")
+    args = parser.parse_args()
+
+    raise_file_limit()
+    loop_lags: list[tuple[float, float]] = []
+    server = None
+    base_url = args.url
+    if base_url is None:
+        configure_environment(args)
+        server, base_url = start_server(args, loop_lags)
+
+    stats = Stats()
+    started = time.perf_counter()
+    try:
+        asyncio.run(run(args, base_url, stats))
+    finally:
+        if server is not None:
+            server.should_exit = True
+
+    report = build_report(args, stats, loop_lags, time.perf_counter() - started)
+    print(json.dumps(report, indent=2))
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Measures the cost of reading the settings on the request path: parsing `.env` into a new
+`Settings()` on every call, as `get_settings` used to, against the cached instance, directly
+and through the FastAPI dependency of a request.
+
+Run from `src`, with the usual environment variables set:
+
+    python -m benchmarks.settings_access --calls 2000
+"""
+import argparse
+import asyncio
+import time
+from typing import Callable
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from helpers import Settings, get_settings, settings_dependency
+
+
+def per_call(func: Callable[[], object], calls: int) -> float:
+    """
+    Returns the mean duration of `func`, in microseconds.
+
+    Args:
+    ----
+    func : Callable
+        The callable to time.
+
+    calls : int
+        The number of calls.
+
+    Returns:
+    -------
+    float
+        The mean duration of a call.
+    """
+    started = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+async def per_await(calls: int) -> float:
+    """
+    Returns the mean duration of awaiting `settings_dependency`, in microseconds.
+    """
+    started = time.perf_counter()
+    for _ in range(calls):
+        await settings_dependency()
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def per_request(calls: int, with_settings: bool) -> float:
+    """
+    Returns the mean duration of a GET to a route, with or without the settings dependency,
+    in microseconds.
+    """
+    app = FastAPI()
+
+    if with_settings:
+        @app.get("/")
+        async def route(settings: Settings = Depends(settings_dependency)):
+            return {"name": settings.APP_NAME}
+    else:
+        @app.get("/")
+        async def route():
+            return {"name": "app"}
+
+    with TestClient(app) as client:
+        client.get("/")
+        return per_call(lambda: client.get("/"), calls)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=2000)
+    args = parser.parse_args()
+
+    get_settings()
+    rows = [
+        ("Settings() per call", per_call(Settings, args.calls)),
+        ("get_settings()", per_call(get_settings, args.calls)),
+        ("settings_dependency()", asyncio.run(per_await(args.calls))),
+        ("request without settings", per_request(args.calls, with_settings=False)),
+        ("request with settings", per_request(args.calls, with_settings=True)),
+    ]
+
+    print(f"{'access':<28} {'per call':>12}")
+    for name, micros in rows:
+        print(f"{name:<28} {micros:>10.1f}µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 from models import ChatModel
 from schemas.chat import CreateChat, ChatInDB
-from helpers import generate_session_id
+from helpers import generate_session_id, traced
 from enums import ChatSettings
 
 class ChatController:
@@ -27,6 +27,7 @@ class ChatController:
         """
         self.chat_model = chat_model
 
+    @traced("chat.create")
     async def create_chat(self, chat: CreateChat, user_id: str) -> ChatInDB:
         """
         Creates a new chat and stores it in the database with a unique session ID.
@@ -53,6 +54,7 @@ class ChatController:
 
         return await self.chat_model.create_chat(ChatInDB(**chat_dict))
 
+    @traced("chat.get")
     async def get_chat(self, session_id: str) -> ChatInDB:
         """
         Retrieves a specific chat from the database using the session ID.
@@ -69,6 +71,7 @@ class ChatController:
         """
         return await self.chat_model.get_chat(session_id)
     
+    @traced("chat.list")
     async def get_all_chats(self, user_id: str, limit: int = ChatSettings.CHATS_COUNT_LIMIT.value) -> list[ChatInDB]:
         """
         Retrieves all chats for a given user, limited to a certain number of chats.
@@ -87,6 +90,7 @@ class ChatController:
         """
         return await self.chat_model.get_all_chats(user_id, limit)
     
+    @traced("chat.exists")
     async def chat_exists(self, session_id: str, user_id: str) -> bool:
         """
         Checks if a chat with a specific session ID exists for a given user.
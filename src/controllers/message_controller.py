@@ -1,5 +1,7 @@
 from models import MessageModel
-from schemas.message import CreateMessage, MessageInDB
+from schemas.message import CreateMessage, MessageInDB, MessagePage
+from helpers import traced
+from enums import ChatSettings
 from typing import Optional
 
 class MessageController:
@@ -26,6 +28,7 @@ class MessageController:
         """
         self.message_model = message_model
 
+    @traced("message.create")
     async def create_message(self, message: CreateMessage) -> MessageInDB:
         """
         Creates a new message and stores it in the database.
@@ -43,6 +46,7 @@ class MessageController:
         message_dict = message.dict()  # Convert CreateMessage to dictionary
         return await self.message_model.create_message(MessageInDB(**message_dict))
 
+    @traced("message.full_chat")
     async def get_full_chat(self, chat_id: str) -> Optional[list[MessageInDB]]:
         """
         Retrieves all messages from the database for a specific chat, ordered by timestamp.
@@ -58,3 +62,27 @@ class MessageController:
             A list of messages for the specified chat, ordered by their timestamp.
         """
         return await self.message_model.get_full_chat(chat_id)
+
+    @traced("message.page")
+    async def get_chat_page(self, chat_id: str, limit: int = ChatSettings.HISTORY_PAGE_SIZE.value,
+                            before: Optional[str] = None) -> MessagePage:
+        """
+        Retrieves one page of a chat's history, starting from the most recent messages.
+
+        Args:
+        ----
+        chat_id : str
+            The unique identifier of the chat whose messages are to be retrieved.
+        limit : int, optional
+            The number of messages in the page. Defaults to `ChatSettings.HISTORY_PAGE_SIZE` and
+            is capped at `ChatSettings.HISTORY_PAGE_SIZE_LIMIT`.
+        before : Optional[str], optional
+            The cursor of a previously returned page, to load the messages right before it.
+
+        Returns:
+        -------
+        MessagePage
+            The page of messages, oldest first, with the cursor to load older ones.
+        """
+        limit = max(1, min(limit, ChatSettings.HISTORY_PAGE_SIZE_LIMIT.value))
+        return await self.message_model.get_chat_page(chat_id, limit, before)
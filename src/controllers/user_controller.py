@@ -1,12 +1,13 @@
 from models import UserModel
 from schemas.user import UserInDB, RegisterUser, LoginUser
 from fastapi import HTTPException, status
-from helpers import verify_password, create_access_token, decode_access_token
+from helpers import averify_password, create_access_token, decode_access_token_claims
 from datetime import timedelta
-from helpers import get_password_hash
+from helpers import aget_password_hash, get_settings, TTLCache, traced, register_metrics
 from schemas.auth import Token, TokenData
 from enums import Auth
 from typing import Optional
+import time
 
 class UserController:
     """
@@ -14,6 +15,7 @@ class UserController:
 
     Attributes:
         user_model (UserModel): An instance of UserModel used for database operations.
+        token_cache (TTLCache): Verified access tokens and the user they belong to.
     """
 
     def __init__(self, user_model: UserModel):
@@ -27,6 +29,13 @@ class UserController:
 
         self.user_model = user_model
 
+        settings = get_settings()
+        self.token_cache = TTLCache(settings.AUTH_TOKEN_CACHE_SIZE, settings.AUTH_TOKEN_CACHE_TTL_SECONDS)
+        # When each recently changed user changed; their older tokens carry stale profile claims.
+        self._changed_users = TTLCache(settings.AUTH_TOKEN_CACHE_SIZE, Auth.ACCESS_TOKEN_EXPIRE_MINUTES.value * 60)
+        register_metrics("auth_token_cache", self.token_cache.stats)
+
+    @traced("user.register")
     async def register(self, user: RegisterUser) -> bool:
         """
         Registers a new user in the system.
@@ -48,7 +57,7 @@ class UserController:
         """
 
         user_dict = user.dict()
-        user_dict.update({"hashed_password": get_password_hash(user_dict["password"])})
+        user_dict.update({"hashed_password": await aget_password_hash(user_dict["password"])})
         user_in_db = UserInDB(**user_dict)
         
         if await self.user_model.username_exists(user_in_db):
@@ -59,6 +68,7 @@ class UserController:
         await self.user_model.create_user(user_in_db)
         return True
     
+    @traced("user.authenticate")
     async def authenticate_user(self, user: LoginUser) -> Token:
         """
         Authenticate a user by verifying their username and password.
@@ -82,7 +92,7 @@ class UserController:
                 headers = {"WWW-Authenticate": "Bearer"}
             )
         
-        if not verify_password(password, user.hashed_password):
+        if not await averify_password(password, user.hashed_password):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail = "Invalid Credentials",
@@ -91,16 +101,21 @@ class UserController:
         
         access_token_expires = timedelta(minutes = Auth.ACCESS_TOKEN_EXPIRE_MINUTES.value)
         access_token = create_access_token(
-            data = {"sub": user.username},
+            data = {"sub": user.username, "email": user.email, "full_name": user.full_name},
             expires_delta=access_token_expires
         )
 
         return access_token
 
+    @traced("user.current_user")
     async def get_current_user(self, token: str) -> Optional[TokenData]:
         """
         Retrieve the current authenticated user based on the provided JWT token.
 
+        Verified tokens are cached until they expire or their user is invalidated. The
+        profile is read from the token's claims; the database is only queried for tokens
+        issued before the claims existed or before their user last changed.
+
         Parameters:
         - token (str): The JWT token from the Authorization header.
 
@@ -108,13 +123,48 @@ class UserController:
         - TokenData: Represents the data contained within the access token.
 
         Raises:
-        - HTTPException: If the token is invalid or if the user cannot be found,
-          raises a 401 Unauthorized error.
+        - JWTError: If the token is invalid or expired.
+        - HTTPException: If the user of the token no longer exists, raises a 401 Unauthorized error.
         """
-        
-        user_name = decode_access_token(token).username
-        user = await self.user_model.get_user(user_name)
 
-        return TokenData(**user.dict())
-        
+        current_user = self.token_cache.get(token)
+        if current_user is not None:
+            return current_user
+
+        claims = decode_access_token_claims(token)
+        username = claims.get("sub")
+        changed_at = self._changed_users.get(username)
+
+        if "email" in claims and "full_name" in claims and (changed_at is None or claims.get("iat", 0) > changed_at):
+            current_user = TokenData(username=username, email=claims["email"], full_name=claims["full_name"])
+        else:
+            user = await self.user_model.get_user(username)
+            if user is None:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail = "Invalid credentials",
+                    headers = {"WWW-Authenticate": "Bearer"}
+                )
+            current_user = TokenData(**user.dict())
+
+        expires_in = claims["exp"] - time.time() if "exp" in claims else None
+        self.token_cache.set(token, current_user, expires_in)
+
+        return current_user
+
+    def invalidate_user(self, username: str) -> None:
+        """
+        Drops the cached tokens of a user and stops trusting the profile claims of the tokens
+        issued before now. Call it whenever a user's profile or password changes or the user
+        is deleted; no route changes a user yet, so every such path must call it when added.
+
+        Only this worker's cache is cleared. Other workers keep accepting the user's cached
+        tokens, with their old claims, for up to `AUTH_TOKEN_CACHE_TTL_SECONDS`; lower the
+        setting, or set `AUTH_TOKEN_CACHE_SIZE` to 0, if a change must apply everywhere at once.
+
+        Parameters:
+        - username (str): The username of the changed user.
+        """
 
+        self._changed_users.set(username, time.time())
+        self.token_cache.pop_where(lambda _, user: user.username == username)
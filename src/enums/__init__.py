@@ -1,3 +1,3 @@
 from .data_base_enums import DataBaseEnum
 from .auth_enums import Auth
-from .chat_enums import ChatSender, ChatSettings
\ No newline at end of file
+from .chat_enums import ChatSender, ChatSettings, ChatProtocol
\ No newline at end of file
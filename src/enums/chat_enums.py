@@ -25,6 +25,32 @@ class ChatSettings(Enum):
     ----------
     CHATS_COUNT_LIMIT : int
         The maximum number of chats a user can get.
+
+    HISTORY_PAGE_SIZE : int
+        The number of most recent messages sent when a client connects to a chat.
+
+    HISTORY_PAGE_SIZE_LIMIT : int
+        The maximum number of messages a client can request in one page of history.
     """
     
     CHATS_COUNT_LIMIT = 30
+    HISTORY_PAGE_SIZE = 50
+    HISTORY_PAGE_SIZE_LIMIT = 200
+
+
+class ChatProtocol(Enum):
+    """
+    Enum class that defines the wire protocols a client can negotiate for the chat socket,
+    as WebSocket subprotocols.
+
+    Attributes:
+    ----------
+    JSON : str
+        Frames are sent as JSON text. This is the default when no subprotocol is requested.
+
+    MSGPACK : str
+        Frames are sent as binary MessagePack.
+    """
+
+    JSON = "harry.json"
+    MSGPACK = "harry.msgpack"
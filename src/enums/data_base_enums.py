@@ -14,8 +14,24 @@ class DataBaseEnum(Enum):
     
     MESSAGE_COLLECTION : str
         The name of the collection that stores message data.
+
+    CHECKPOINT_COLLECTION : str
+        The name of the collection that stores LangGraph checkpoints.
+
+    CHECKPOINT_WRITES_COLLECTION : str
+        The name of the collection that stores the pending writes of LangGraph checkpoints.
+
+    BROKER_COLLECTION : str
+        The name of the collection the MongoDB broker publishes chat frames to.
+
+    LEASE_COLLECTION : str
+        The name of the collection holding the leases of jobs that only one worker may run.
     """
     
     USER_COLLECTION = "users"
     CHAT_COLLECTION = "chat"
     MESSAGE_COLLECTION = "message"
+    CHECKPOINT_COLLECTION = "checkpoints"
+    CHECKPOINT_WRITES_COLLECTION = "checkpoint_writes"
+    BROKER_COLLECTION = "chat_events"
+    LEASE_COLLECTION = "leases"
@@ -1,5 +1,15 @@
-from .config import Settings, get_settings
-from .auth import verify_password, get_password_hash, create_access_token, decode_access_token
+from .config import Settings, get_settings, reload_settings, settings_dependency, get_mongo_client_options
+from .cache import TTLCache
+from .tracing import span, traced, stage_breakdown, register_metrics, render_prometheus, stage_histograms
+from .loop_monitor import LoopMonitor, create_loop_monitor, tag_current_task, tag_request, loop_monitor_metrics
+from .write_behind import WriteBehindSink, parse_write_concern
+from .auth import (verify_password, get_password_hash, create_access_token, decode_access_token,
+                   decode_access_token_claims, averify_password, aget_password_hash, shutdown_password_executor,
+                   password_hash_metrics)
 from .chat import generate_session_id
 from .database import (get_db, get_user_model, get_chat_model, get_message_model, get_user_controller, get_chat_controller, 
                        get_message_controller, get_mongo_conn)
+from .indexes import ensure_indexes, report_collection_scans
+from .frames import EncodedFrame, encode_frame, negotiate_protocol
+from .turns import TurnScheduler
+from .broker import Broker, InProcessBroker, LocalSocketBroker, MongoChangeStreamBroker, create_broker
@@ -1,8 +1,12 @@
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
-from typing import Optional
-from helpers import get_settings
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+import asyncio
+import threading
+import time
+from helpers import get_settings, register_metrics
 from fastapi import HTTPException, status
 from pydantic import ValidationError
 from enums import auth_enums
@@ -15,6 +19,21 @@ ALGORITHM = settings.ALGORITHM
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated = "auto")
 
+_password_executor: Optional[Executor] = None
+_password_executor_lock = threading.Lock()
+
+# Current load and cumulative counters of the password hashing pool since the process started.
+password_hash_metrics = {
+    "in_flight": 0,
+    "queue_depth": 0,
+    "completed": 0,
+    "rejected": 0,
+    "hash_seconds_total": 0.0,
+    "hash_seconds_max": 0.0,
+    "wait_seconds_total": 0.0,
+}
+register_metrics("password_hash", password_hash_metrics)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     Verifies if the provided plain password matches the stored hashed password.
@@ -52,6 +71,128 @@ def get_password_hash(password: str) -> str:
 
     return pwd_context.hash(password)
 
+def _timed(func: Callable[..., Any], *args: Any) -> tuple[Any, float]:
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def get_password_executor() -> Executor:
+    """
+    Returns the pool that runs bcrypt off the event loop.
+
+    It is a thread pool by default (bcrypt releases the GIL while hashing) or a process pool
+    when `PASSWORD_HASH_EXECUTOR` is "process", sized by `PASSWORD_HASH_WORKERS`.
+
+    Returns:
+    -------
+    Executor
+        The shared executor.
+    """
+    global _password_executor
+
+    if _password_executor is None:
+        with _password_executor_lock:
+            if _password_executor is None:
+                if settings.PASSWORD_HASH_EXECUTOR == "process":
+                    _password_executor = ProcessPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS)
+                else:
+                    _password_executor = ThreadPoolExecutor(
+                        max_workers=settings.PASSWORD_HASH_WORKERS,
+                        thread_name_prefix="harry-bcrypt",
+                    )
+
+    return _password_executor
+
+
+async def _run_password_job(func: Callable[..., Any], *args: Any) -> Any:
+    metrics = password_hash_metrics
+    if metrics["in_flight"] >= settings.PASSWORD_HASH_MAX_PENDING:
+        metrics["rejected"] += 1
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts in progress, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+
+    metrics["in_flight"] += 1
+    metrics["queue_depth"] = max(0, metrics["in_flight"] - settings.PASSWORD_HASH_WORKERS)
+    started = time.perf_counter()
+    try:
+        loop = asyncio.get_running_loop()
+        result, hash_seconds = await loop.run_in_executor(get_password_executor(), _timed, func, *args)
+    finally:
+        metrics["in_flight"] -= 1
+        metrics["queue_depth"] = max(0, metrics["in_flight"] - settings.PASSWORD_HASH_WORKERS)
+
+    metrics["completed"] += 1
+    metrics["hash_seconds_total"] += hash_seconds
+    metrics["hash_seconds_max"] = max(metrics["hash_seconds_max"], hash_seconds)
+    metrics["wait_seconds_total"] += time.perf_counter() - started - hash_seconds
+
+    return result
+
+
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+    """
+    Verifies a password like `verify_password`, in the password pool.
+
+    Parameters:
+    ----------
+    plain_password : str
+        The plain text password provided by the user during login.
+    
+    hashed_password : str
+        The hashed password stored in the database.
+
+    Returns:
+    -------
+    bool
+        True if the password matches the hashed password, False otherwise.
+
+    Raises:
+    ------
+    HTTPException
+        A 429 Too Many Requests error if `PASSWORD_HASH_MAX_PENDING` jobs are already pending.
+    """
+
+    return await _run_password_job(verify_password, plain_password, hashed_password)
+
+
+async def aget_password_hash(password: str) -> str:
+    """
+    Hashes a password like `get_password_hash`, in the password pool.
+
+    Parameters:
+    ----------
+    password : str
+        The plain text password that needs to be hashed.
+
+    Returns:
+    -------
+    str
+        A hashed representation of the input password.
+
+    Raises:
+    ------
+    HTTPException
+        A 429 Too Many Requests error if `PASSWORD_HASH_MAX_PENDING` jobs are already pending.
+    """
+
+    return await _run_password_job(get_password_hash, password)
+
+
+def shutdown_password_executor() -> None:
+    """
+    Shuts down the password pool, waiting for running jobs to finish.
+    """
+    global _password_executor
+
+    with _password_executor_lock:
+        if _password_executor is not None:
+            _password_executor.shutdown(wait=True)
+            _password_executor = None
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> Token:
     """
     Creates a JWT access token with an optional expiration time.
@@ -77,16 +218,41 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     else:
         expire = datetime.utcnow() + timedelta(minutes=auth_enums.ACCESS_TOKEN_EXPIRE_MINUTES.value)
 
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": datetime.utcnow()})
 
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
     return Token(**{"access_token": encoded_jwt, "token_type": "bearer"})
 
 
+def decode_access_token_claims(token: str) -> dict:
+    """
+    Verifies a JWT access token and returns all of its claims.
+
+    Parameters:
+    ----------
+    token : str
+        The JWT access token that needs to be decoded.
+
+    Returns:
+    -------
+    dict
+        The claims of the token, including `sub`, `exp` and `iat`.
+
+    Raises:
+    ------
+    JWTError
+        If the token is invalid or expired.
+    """
+
+    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+
 def decode_access_token(token: str) -> TokenData:
     """
-    Decodes a JWT access token to extract the user information (usually the username).
+    Decodes a JWT access token to extract the user information.
+
+    Tokens issued before the profile claims were added only carry the username.
 
     Parameters:
     ----------
@@ -99,7 +265,10 @@ def decode_access_token(token: str) -> TokenData:
         Represents the data contained within the access token.
     """
 
-    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-    username: str | None = payload.get("sub")
+    payload = decode_access_token_claims(token)
             
-    return TokenData(**{"username": username})
\ No newline at end of file
+    return TokenData(**{
+        "username": payload.get("sub"),
+        "email": payload.get("email"),
+        "full_name": payload.get("full_name"),
+    })
@@ -0,0 +1,413 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import struct
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from datetime import datetime
+from typing import Awaitable, Callable, Optional
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import PyMongoError
+from helpers.config import get_settings
+from enums import DataBaseEnum
+
+logger = logging.getLogger(__name__)
+
+FrameHandler = Callable[[str, dict], Awaitable[None]]
+
+# Datagrams of the "socket" backend carrying one part of an event too large for one datagram
+# start with this byte, then the event's ID, the part's index and the number of parts.
+CHUNK_MARKER = b"\x00"
+CHUNK_HEADER = struct.Struct(">16sHH")
+
+
+class Broker:
+    """
+    Fans chat frames out to every worker that may hold a connection to the chat.
+
+    Published frames are delivered to this worker's connections right away and broadcast to
+    the other workers, which deliver them to theirs. Each worker tags its events with its
+    `origin`, so it ignores its own events when they come back through the backend.
+
+    The base class only delivers to this worker; it is the in-process backend.
+
+    Attributes:
+    ----------
+    origin : str
+        The unique ID of this worker on the broker.
+    """
+
+    def __init__(self):
+        self.origin = uuid.uuid4().hex
+        self._handler: Optional[FrameHandler] = None
+
+    async def start(self, handler: FrameHandler) -> None:
+        """
+        Starts receiving frames and delivering them with `handler(chat_id, frame)`.
+
+        Args:
+        ----
+        handler : FrameHandler
+            Delivers a frame to this worker's connections to the chat.
+        """
+        self._handler = handler
+
+    async def publish(self, chat_id: str, frame: dict) -> None:
+        """
+        Delivers a frame to the participants of a chat on every worker.
+
+        Args:
+        ----
+        chat_id : str
+            The ID of the chat.
+
+        frame : dict
+            The frame to deliver.
+        """
+        if self._handler is not None:
+            await self._handler(chat_id, frame)
+
+        await self._broadcast({"origin": self.origin, "chat_id": chat_id, "frame": frame})
+
+    async def close(self) -> None:
+        """
+        Stops receiving frames and releases the backend's resources.
+        """
+        self._handler = None
+
+    async def _broadcast(self, event: dict) -> None:
+        pass
+
+    async def _receive(self, event: dict) -> None:
+        if event.get("origin") == self.origin or self._handler is None:
+            return
+
+        try:
+            await self._handler(event["chat_id"], event["frame"])
+        except Exception:
+            logger.exception("Could not deliver a brokered frame to chat %s", event.get("chat_id"))
+
+
+class InProcessBroker(Broker):
+    """
+    Delivers frames to the connections of this worker only. Suited to a single worker.
+    """
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    # The chunked events being reassembled; the oldest is dropped once there are too many,
+    # e.g. when a part was lost.
+    MAX_PARTIAL_EVENTS = 64
+
+    def __init__(self, broker: "LocalSocketBroker"):
+        self.broker = broker
+        self._partial: OrderedDict[bytes, list[Optional[bytes]]] = OrderedDict()
+
+    def _reassemble(self, data: bytes) -> Optional[bytes]:
+        event_id, index, count = CHUNK_HEADER.unpack_from(data, len(CHUNK_MARKER))
+        parts = self._partial.get(event_id)
+        if parts is None:
+            parts = self._partial[event_id] = [None] * count
+            if len(self._partial) > self.MAX_PARTIAL_EVENTS:
+                self._partial.popitem(last=False)
+                logger.warning("Dropping an incomplete broker event")
+        parts[index] = data[len(CHUNK_MARKER) + CHUNK_HEADER.size:]
+
+        if any(part is None for part in parts):
+            return None
+        del self._partial[event_id]
+        return b"".join(parts)
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        if data.startswith(CHUNK_MARKER):
+            try:
+                data = self._reassemble(data)
+            except (struct.error, IndexError):
+                logger.warning("Dropping a malformed broker datagram")
+                return
+            if data is None:
+                return
+
+        try:
+            event = json.loads(data)
+        except ValueError:
+            logger.warning("Dropping a malformed broker datagram")
+            return
+
+        self.broker._inbox.put_nowait(event)
+
+
+class LocalSocketBroker(Broker):
+    """
+    Fans frames out to the workers of one host over Unix datagram sockets.
+
+    Every worker binds `<directory>/<origin>.sock` and sends each event to all the sockets
+    of the directory. The sockets of workers that died are removed on the first failed send.
+    Datagrams are best effort: a frame is dropped if a peer's receive queue stays full for
+    `SEND_RETRY_SECONDS`.
+
+    An event is sent as one datagram of at most `MAX_DATAGRAM_BYTES`. Larger events, such as
+    the "end" frame of a long reply, are split into parts of that size, which the receiving
+    worker reassembles before delivering the frame.
+
+    Attributes:
+    ----------
+    directory : str
+        The directory holding one socket per worker.
+    """
+
+    PEERS_REFRESH_SECONDS = 1.0
+    # Well under the default socket buffer size of Linux (about 208 KiB), which caps a datagram.
+    MAX_DATAGRAM_BYTES = 32 * 1024
+    SEND_RETRY_SECONDS = 0.1
+
+    def __init__(self, directory: str):
+        super().__init__()
+        self.directory = directory
+        self.path = os.path.join(directory, f"{self.origin}.sock")
+        self._transport: Optional[asyncio.DatagramTransport] = None
+        self._sender: Optional[socket.socket] = None
+        self._peers: list[str] = []
+        self._peers_refreshed = 0.0
+        # Events are delivered one at a time, in the order they arrived, by `_deliver_task`.
+        self._inbox: asyncio.Queue = asyncio.Queue()
+        self._deliver_task: Optional[asyncio.Task] = None
+
+    async def start(self, handler: FrameHandler) -> None:
+        await super().start(handler)
+        os.makedirs(self.directory, exist_ok=True)
+
+        loop = asyncio.get_running_loop()
+        self._transport, _ = await loop.create_datagram_endpoint(
+            lambda: _DatagramProtocol(self), local_addr=self.path, family=socket.AF_UNIX
+        )
+        self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sender.setblocking(False)
+        self._deliver_task = asyncio.create_task(self._deliver())
+
+    async def close(self) -> None:
+        await super().close()
+        if self._deliver_task is not None:
+            self._deliver_task.cancel()
+            self._deliver_task = None
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+        if self._sender is not None:
+            self._sender.close()
+            self._sender = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def _deliver(self) -> None:
+        while True:
+            await self._receive(await self._inbox.get())
+
+    def _peer_paths(self) -> list[str]:
+        now = time.monotonic()
+        if now - self._peers_refreshed > self.PEERS_REFRESH_SECONDS:
+            self._peers = [
+                os.path.join(self.directory, name)
+                for name in os.listdir(self.directory)
+                if name.endswith(".sock") and name != os.path.basename(self.path)
+            ]
+            self._peers_refreshed = now
+
+        return self._peers
+
+    async def _broadcast(self, event: dict) -> None:
+        if self._sender is None:
+            return
+
+        datagrams = self._datagrams(json.dumps(event).encode())
+        for path in list(self._peer_paths()):
+            try:
+                for datagram in datagrams:
+                    await self._send(datagram, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # The worker behind this socket is gone.
+                logger.info("Removing the stale broker socket %s", path)
+                if path in self._peers:
+                    self._peers.remove(path)
+                if os.path.exists(path):
+                    os.unlink(path)
+            except BlockingIOError:
+                logger.warning("Broker peer %s is not keeping up; dropping a frame", path)
+            except OSError as e:
+                logger.warning("Could not send a frame to broker peer %s: %s", path, e)
+
+    async def _send(self, datagram: bytes, path: str) -> None:
+        # A peer only queues a few datagrams (net.unix.max_dgram_qlen), which a chunked event
+        # can exceed, so a full queue is retried briefly while the peer drains it.
+        deadline = time.monotonic() + self.SEND_RETRY_SECONDS
+        while True:
+            if self._sender is None:
+                return
+            try:
+                self._sender.sendto(datagram, path)
+                return
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    raise
+            await asyncio.sleep(0.001)
+
+    def _datagrams(self, data: bytes) -> list[bytes]:
+        if len(data) <= self.MAX_DATAGRAM_BYTES:
+            return [data]
+
+        size = self.MAX_DATAGRAM_BYTES - len(CHUNK_MARKER) - CHUNK_HEADER.size
+        parts = [data[i:i + size] for i in range(0, len(data), size)]
+        event_id = uuid.uuid4().bytes
+        return [
+            CHUNK_MARKER + CHUNK_HEADER.pack(event_id, index, len(parts)) + part
+            for index, part in enumerate(parts)
+        ]
+
+
+class MongoChangeStreamBroker(Broker):
+    """
+    Fans frames out to every worker of every node through a MongoDB change stream.
+
+    Events are inserted into the broker collection, which every worker watches. A TTL index
+    removes them after a minute. Change streams require a replica set.
+
+    The "delta" frames of a streamed reply are merged for `delta_flush_seconds` before they
+    are inserted, so the other workers receive the reply in a few larger deltas instead of
+    one insert per token. Any other frame of the chat first flushes the merged deltas, so
+    frames keep their order. This worker's connections still get every delta right away.
+
+    Inserts run in background tasks, so a slow replica set never delays the publisher; the
+    inserts of a chat queue on its lock, in the order the frames were published.
+
+    Attributes:
+    ----------
+    collection : AsyncIOMotorCollection
+        The collection events are published to.
+
+    delta_flush_seconds : float
+        How long deltas are merged. 0 inserts every delta.
+    """
+
+    RETRY_SECONDS = 1.0
+
+    def __init__(self, mongo_conn: AsyncIOMotorClient, db_name: str, delta_flush_seconds: float = 0.0):
+        super().__init__()
+        self.collection = mongo_conn[db_name][DataBaseEnum.BROKER_COLLECTION.value]
+        self.delta_flush_seconds = delta_flush_seconds
+        self._watch_task: Optional[asyncio.Task] = None
+        # The merged delta event waiting to be inserted for each chat, and its flush timer.
+        self._deltas: dict[str, dict] = {}
+        self._timers: dict[str, asyncio.TimerHandle] = {}
+        self._inserts: set[asyncio.Task] = set()
+        # Serializes the inserts of each chat. asyncio.Lock wakes its waiters first in, first
+        # out, and insert tasks start in the order they were created, so frames keep their order.
+        self._chat_locks: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+
+    async def start(self, handler: FrameHandler) -> None:
+        await super().start(handler)
+        self._watch_task = asyncio.create_task(self._watch())
+
+    async def close(self) -> None:
+        await super().close()
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            self._watch_task = None
+        for chat_id in list(self._deltas):
+            self._schedule_insert(chat_id, self._take_deltas(chat_id))
+        if self._inserts:
+            await asyncio.gather(*self._inserts, return_exceptions=True)
+
+    def _chat_lock(self, chat_id: str) -> asyncio.Lock:
+        lock = self._chat_locks.get(chat_id)
+        if lock is None:
+            lock = self._chat_locks[chat_id] = asyncio.Lock()
+        return lock
+
+    def _take_deltas(self, chat_id: str) -> list[dict]:
+        timer = self._timers.pop(chat_id, None)
+        if timer is not None:
+            timer.cancel()
+        pending = self._deltas.pop(chat_id, None)
+        return [pending] if pending is not None else []
+
+    def _flush_deltas(self, chat_id: str) -> None:
+        self._timers.pop(chat_id, None)
+        self._schedule_insert(chat_id, self._take_deltas(chat_id))
+
+    def _schedule_insert(self, chat_id: str, events: list[dict]) -> None:
+        if not events:
+            return
+
+        task = asyncio.get_running_loop().create_task(self._insert(chat_id, events))
+        self._inserts.add(task)
+        task.add_done_callback(self._inserts.discard)
+
+    async def _insert(self, chat_id: str, events: list[dict]) -> None:
+        async with self._chat_lock(chat_id):
+            created_at = datetime.utcnow()
+            try:
+                await self.collection.insert_many([{**event, "created_at": created_at} for event in events])
+            except PyMongoError as e:
+                logger.warning("Could not publish %d frames to chat %s: %s", len(events), chat_id, e)
+            except Exception:
+                logger.exception("Could not publish %d frames to chat %s", len(events), chat_id)
+
+    async def _broadcast(self, event: dict) -> None:
+        chat_id, frame = event["chat_id"], event["frame"]
+
+        if frame.get("type") == "delta" and self.delta_flush_seconds > 0:
+            pending = self._deltas.get(chat_id)
+            if pending is not None and pending["frame"].get("sender") == frame.get("sender"):
+                pending["frame"]["message"] += frame.get("message", "")
+                return
+            if pending is None:
+                self._deltas[chat_id] = {**event, "frame": dict(frame)}
+                self._timers[chat_id] = asyncio.get_running_loop().call_later(
+                    self.delta_flush_seconds, self._flush_deltas, chat_id
+                )
+                return
+
+        self._schedule_insert(chat_id, self._take_deltas(chat_id) + [event])
+
+    async def _watch(self) -> None:
+        pipeline = [{"$match": {"operationType": "insert", "fullDocument.origin": {"$ne": self.origin}}}]
+        resume_after = None
+        while True:
+            try:
+                async with self.collection.watch(pipeline, resume_after=resume_after) as stream:
+                    async for change in stream:
+                        resume_after = stream.resume_token
+                        await self._receive(change["fullDocument"])
+            except asyncio.CancelledError:
+                raise
+            except PyMongoError as e:
+                logger.warning("Broker change stream failed, retrying: %s", e)
+                await asyncio.sleep(self.RETRY_SECONDS)
+
+
+def create_broker(mongo_conn: AsyncIOMotorClient) -> Broker:
+    """
+    Creates the broker selected by `BROKER_BACKEND`: "memory", "socket" or "mongo".
+
+    Args:
+    ----
+    mongo_conn : AsyncIOMotorClient
+        The application's MongoDB client, used by the "mongo" backend.
+
+    Returns:
+    -------
+    Broker
+        The broker, not started yet.
+    """
+    settings = get_settings()
+
+    if settings.BROKER_BACKEND == "socket":
+        return LocalSocketBroker(settings.BROKER_SOCKET_DIRECTORY)
+    if settings.BROKER_BACKEND == "mongo":
+        return MongoChangeStreamBroker(mongo_conn, settings.MONGODB_DATABASE, settings.BROKER_DELTA_FLUSH_SECONDS)
+
+    return InProcessBroker()
@@ -0,0 +1,123 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class TTLCache:
+    """
+    A thread-safe, size-bounded LRU cache whose entries expire after a time to live.
+
+    Attributes:
+    ----------
+    maxsize : int
+        The maximum number of entries; the least recently used one is evicted first.
+
+    ttl : float
+        The default number of seconds an entry stays valid.
+
+    stats : dict
+        Cumulative hit, miss and eviction counters.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Returns the cached value of `key`, or None if it is missing or expired.
+
+        Args:
+        ----
+        key : Hashable
+            The cache key.
+
+        Returns:
+        -------
+        Optional[Any]
+            The cached value.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.stats["misses"] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Caches `value` under `key`, evicting the least recently used entry when full.
+
+        Args:
+        ----
+        key : Hashable
+            The cache key.
+
+        value : Any
+            The value to cache.
+
+        ttl : Optional[float]
+            The number of seconds this entry stays valid. Defaults to the cache's `ttl`.
+        """
+        if self.maxsize <= 0:
+            return
+
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        """
+        Removes `key` from the cache and returns its value, if any.
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+
+        return entry[1] if entry is not None else None
+
+    def pop_where(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """
+        Removes every entry for which `predicate(key, value)` is true.
+
+        Args:
+        ----
+        predicate : Callable[[Hashable, Any], bool]
+            Selects the entries to remove.
+
+        Returns:
+        -------
+        int
+            The number of removed entries.
+        """
+        with self._lock:
+            keys = [key for key, (_, value) in self._entries.items() if predicate(key, value)]
+            for key in keys:
+                del self._entries[key]
+
+        return len(keys)
+
+    def clear(self) -> None:
+        """
+        Removes every entry from the cache.
+        """
+        with self._lock:
+            self._entries.clear()
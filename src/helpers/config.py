@@ -1,3 +1,4 @@
+from functools import lru_cache
 from pydantic_settings import BaseSettings
 from pathlib import Path
 
@@ -19,11 +20,230 @@ class Settings(BaseSettings):
     MONGODB_DATABASE : str
         The name of the MongoDB database.
 
+    CHECKPOINT_DATABASE : str
+        The name of the MongoDB database that stores the LangGraph checkpoints.
+
+    MONGODB_MAX_POOL_SIZE : int
+        The maximum number of pooled connections each MongoDB client keeps open.
+
+    MONGODB_MIN_POOL_SIZE : int
+        The minimum number of pooled connections each MongoDB client keeps warm.
+
+    MONGODB_CONNECT_TIMEOUT_MS : int
+        How long to wait for a new MongoDB connection to be established.
+
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS : int
+        How long to wait for a suitable MongoDB server before failing an operation.
+
+    MONGODB_SOCKET_TIMEOUT_MS : int
+        How long to wait for a reply on an open MongoDB connection.
+
+    CHECKPOINT_SNAPSHOT_INTERVAL : int
+        Write a full checkpoint snapshot at least every this many checkpoints and store the
+        ones in between as deltas. 1 stores every checkpoint as a snapshot.
+
+    CHECKPOINT_CODEC : str
+        The codec used to compress stored checkpoint blobs: "zstd" or "identity".
+
+    CHECKPOINT_ZSTD_LEVEL : int
+        The zstd compression level of checkpoint blobs.
+
+    CHECKPOINT_ZSTD_DICTIONARY : str
+        The path of a zstd dictionary trained on the checkpoints. Empty disables it.
+
+    CHECKPOINT_RETENTION_ENABLED : bool
+        Whether the checkpoint retention job runs in the background. Every worker may have it
+        on: a lease in the `leases` collection lets only one of them run the passes.
+
+    CHECKPOINT_RETENTION_KEEP : int
+        The number of most recent checkpoints kept per conversation thread.
+
+    CHECKPOINT_RETENTION_INTERVAL_SECONDS : int
+        The delay between two runs of the background retention job.
+
+    MESSAGE_WRITE_BEHIND : bool
+        Whether chat messages are buffered and inserted in batches instead of one insert each.
+
+    MESSAGE_BATCH_SIZE : int
+        The number of buffered messages that triggers a batch insert.
+
+    MESSAGE_BATCH_DELAY_MS : int
+        The longest a message stays buffered before its batch is inserted.
+
+    MESSAGE_WRITE_CONCERN : str
+        The write concern of message inserts: a number of acknowledging nodes or "majority".
+
+    ENSURE_INDEXES : bool
+        Whether the collection indexes are created at startup.
+
+    EXPLAIN_HOT_QUERIES : bool
+        Whether the hot queries are explained at startup to report collection scans. Off by
+        default, since every worker would run the explains on every start; turn it on in
+        staging or for a one-off check after changing a query or an index.
+
+    BROKER_BACKEND : str
+        How chat frames reach the connections held by other workers: "memory" (single worker),
+        "socket" (workers of one host) or "mongo" (any number of nodes, needs a replica set).
+
+    BROKER_SOCKET_DIRECTORY : str
+        The directory holding the Unix sockets of the "socket" broker backend.
+
+    BROKER_DELTA_FLUSH_SECONDS : float
+        How long the "mongo" broker backend merges the streamed reply deltas of a chat into
+        one event, so a streamed reply costs a few inserts rather than one per token. 0
+        publishes every delta.
+
+    WEBSOCKET_SEND_QUEUE_SIZE : int
+        The number of frames queued for a chat connection before it is evicted as a slow consumer.
+
+    WEBSOCKET_SEND_TIMEOUT_SECONDS : float
+        How long sending one frame to a chat connection may take before the connection is dropped.
+
     SECRET_KEY : str
         The secret key used for signing tokens.
 
     ALGORITHM : str
         The algorithm used for token signing.
+
+    AUTH_TOKEN_CACHE_SIZE : int
+        The maximum number of verified access tokens kept in memory. 0 disables the cache.
+
+    AUTH_TOKEN_CACHE_TTL_SECONDS : int
+        How long a verified access token is served from memory, capped by its expiry. The cache
+        is per process, so it is also how long other workers may keep serving a user's old
+        profile claims after the user is changed or deleted.
+
+    PASSWORD_HASH_EXECUTOR : str
+        Where bcrypt runs off the event loop: "thread" or "process".
+
+    PASSWORD_HASH_WORKERS : int
+        The number of workers hashing and verifying passwords.
+
+    PASSWORD_HASH_MAX_PENDING : int
+        The number of password jobs allowed in flight before new ones are rejected with a 429.
+
+    LLM_PROVIDER : str
+        The chat model answering as Harry: "gemini", or "fake" for a local model with a
+        configurable latency, used by tests and load tests.
+
+    MODEL_NAME : str
+        The name of the Gemini model used to generate Harry's answers.
+
+    GOOGLE_API_KEY : str
+        The API key used to access the Gemini models.
+
+    LLM_EXECUTOR_WORKERS : int
+        The maximum number of threads used to run sync-only LLM and checkpoint work
+        off the event loop.
+
+    LLM_TIMEOUT_SECONDS : float
+        The longest a single model call may take before a fallback reply is given.
+
+    LLM_MAX_RETRIES : int
+        The number of times the model client retries a failed call.
+
+    LLM_MAX_CONCURRENCY : int
+        The maximum number of model calls in flight in this process.
+
+    LLM_MAX_CONCURRENCY_PER_USER : int
+        The maximum number of model calls in flight for a single user. 0 disables the limit.
+
+    LLM_HEDGE : bool
+        Whether a second call is started when a non-streamed call is slower than the p95 latency,
+        keeping the first reply.
+
+    LLM_CIRCUIT_FAILURE_THRESHOLD : int
+        The number of consecutive failed model calls after which calls are refused with a
+        fallback reply.
+
+    LLM_CIRCUIT_RESET_SECONDS : float
+        How long calls are refused before a probe call is let through.
+
+    LLM_WARMUP : bool
+        Whether the LLM stack is loaded in the background at startup, with readiness reported
+        once it is. Otherwise it is loaded by the first chat turn.
+
+    TURN_DEADLINE_SECONDS : float
+        How long after a turn starts its reply is due; past it, Harry answers with a fallback
+        reply. Time spent queued behind earlier turns does not count.
+
+    FAKE_LLM_LATENCY_SECONDS : float
+        The delay before the first token of the fake model.
+
+    FAKE_LLM_TOKENS_PER_SECOND : float
+        The rate the fake model produces tokens at.
+
+    STREAM_RESPONSES : bool
+        Whether Harry's replies are streamed to the chat token by token.
+
+    RESPONSE_CACHE_ENABLED : bool
+        Whether Harry's replies to context-free prompts (greetings, canned questions) are cached.
+
+    RESPONSE_CACHE_SIZE : int
+        The maximum number of cached replies.
+
+    RESPONSE_CACHE_TTL_SECONDS : int
+        How long a cached reply is served.
+
+    RESPONSE_CACHE_MAX_TURNS : int
+        Replies are only cached and served while the conversation has at most this many user turns.
+
+    RESPONSE_CACHE_EMBEDDING_MODEL : str
+        The local sentence-transformers model used to match near-duplicate prompts on the CPU.
+        Empty only matches prompts that are equal once normalized.
+
+    RESPONSE_CACHE_SIMILARITY : float
+        The minimum cosine similarity between two prompts for them to share a cached reply.
+
+    TURN_COALESCE : bool
+        Whether the messages sent to a chat while Harry is answering are answered together
+        in a single turn instead of one turn each.
+
+    TURN_COALESCE_WINDOW_SECONDS : float
+        How long a turn waits for more messages to coalesce before calling the LLM. 0 only
+        coalesces the messages that arrived while the previous turn was running.
+
+    TURN_MAX_PENDING : int
+        The most messages of a chat waiting for Harry's answer. Further messages are refused
+        with an error frame until a turn picks the waiting ones up. 0 disables the limit.
+
+    TRACING_ENABLED : bool
+        Whether the stages of requests and turns are timed into the `/metrics` histograms and
+        exported as OpenTelemetry spans when opentelemetry-api is installed.
+
+    SLOW_TURN_SECONDS : float
+        Turns taking longer than this are logged with the duration of each stage. 0 disables the log.
+
+    LOOP_MONITOR_ENABLED : bool
+        Whether the event-loop lag is measured and the stack of a blocked loop is sampled.
+
+    LOOP_MONITOR_INTERVAL_SECONDS : float
+        How often the loop lag is measured.
+
+    LOOP_STALL_THRESHOLD_SECONDS : float
+        How long the loop must be blocked, beyond the interval, before its stack is sampled.
+
+    LOOP_MONITOR_MAX_STALLS : int
+        The number of most recent stalls kept for `/debug/loop`.
+
+    DEBUG_ENDPOINTS_ENABLED : bool
+        Whether the `/debug` routes are served. They expose stacks and chat IDs, so keep it off
+        outside trusted networks.
+
+    CONTEXT_MAX_TURNS : int
+        The number of most recent turns kept in the conversation state. 0 disables the limit.
+
+    CONTEXT_MAX_TOKENS : int
+        The approximate token budget of the messages kept in the conversation state. 0 disables the limit.
+
+    CONTEXT_SUMMARIZE : bool
+        Whether turns falling out of the context window are folded into a rolling summary
+        instead of being dropped.
+
+    CONTEXT_COMPACT_RATIO : float
+        The share of `CONTEXT_MAX_TURNS` and `CONTEXT_MAX_TOKENS` the context window is compacted
+        down to once it exceeds them, so the summary is updated once every few turns rather
+        than on every turn. 1 compacts to the limits exactly.
     """
     
     APP_NAME: str
@@ -31,20 +251,96 @@ class Settings(BaseSettings):
 
     MONGODB_URL: str
     MONGODB_DATABASE: str
+    CHECKPOINT_DATABASE: str = "checkpoints"
+
+    MONGODB_MAX_POOL_SIZE: int = 100
+    MONGODB_MIN_POOL_SIZE: int = 0
+    MONGODB_CONNECT_TIMEOUT_MS: int = 5000
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS: int = 5000
+    MONGODB_SOCKET_TIMEOUT_MS: int = 30000
+
+    CHECKPOINT_SNAPSHOT_INTERVAL: int = 20
+    CHECKPOINT_CODEC: str = "zstd"
+    CHECKPOINT_ZSTD_LEVEL: int = 3
+    CHECKPOINT_ZSTD_DICTIONARY: str = ""
+
+    CHECKPOINT_RETENTION_ENABLED: bool = True
+    CHECKPOINT_RETENTION_KEEP: int = 10
+    CHECKPOINT_RETENTION_INTERVAL_SECONDS: int = 3600
+
+    MESSAGE_WRITE_BEHIND: bool = True
+    MESSAGE_BATCH_SIZE: int = 100
+    MESSAGE_BATCH_DELAY_MS: int = 50
+    MESSAGE_WRITE_CONCERN: str = "1"
+
+    ENSURE_INDEXES: bool = True
+    EXPLAIN_HOT_QUERIES: bool = False
+    
+    BROKER_BACKEND: str = "memory"
+    BROKER_SOCKET_DIRECTORY: str = "/tmp/harry-broker"
+    BROKER_DELTA_FLUSH_SECONDS: float = 0.1
+    WEBSOCKET_SEND_QUEUE_SIZE: int = 256
+    WEBSOCKET_SEND_TIMEOUT_SECONDS: float = 5.0
     
     SECRET_KEY: str
     ALGORITHM: str
+    AUTH_TOKEN_CACHE_SIZE: int = 10000
+    AUTH_TOKEN_CACHE_TTL_SECONDS: int = 300
+    PASSWORD_HASH_EXECUTOR: str = "thread"
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_PENDING: int = 64
 
+    LLM_PROVIDER: str = "gemini"
     MODEL_NAME: str
     GOOGLE_API_KEY: str
 
+    LLM_EXECUTOR_WORKERS: int = 8
+    LLM_TIMEOUT_SECONDS: float = 30.0
+    LLM_MAX_RETRIES: int = 2
+    LLM_MAX_CONCURRENCY: int = 64
+    LLM_MAX_CONCURRENCY_PER_USER: int = 2
+    LLM_HEDGE: bool = False
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    LLM_CIRCUIT_RESET_SECONDS: float = 30.0
+    LLM_WARMUP: bool = True
+    TURN_DEADLINE_SECONDS: float = 60.0
+    FAKE_LLM_LATENCY_SECONDS: float = 0.5
+    FAKE_LLM_TOKENS_PER_SECOND: float = 50.0
+    STREAM_RESPONSES: bool = True
+    RESPONSE_CACHE_ENABLED: bool = False
+    RESPONSE_CACHE_SIZE: int = 1000
+    RESPONSE_CACHE_TTL_SECONDS: int = 3600
+    RESPONSE_CACHE_MAX_TURNS: int = 1
+    RESPONSE_CACHE_EMBEDDING_MODEL: str = ""
+    RESPONSE_CACHE_SIMILARITY: float = 0.92
+    TURN_COALESCE: bool = True
+    TURN_COALESCE_WINDOW_SECONDS: float = 0.0
+    TURN_MAX_PENDING: int = 8
+
+    TRACING_ENABLED: bool = True
+    SLOW_TURN_SECONDS: float = 10.0
+    LOOP_MONITOR_ENABLED: bool = True
+    LOOP_MONITOR_INTERVAL_SECONDS: float = 0.1
+    LOOP_STALL_THRESHOLD_SECONDS: float = 0.1
+    LOOP_MONITOR_MAX_STALLS: int = 50
+    DEBUG_ENDPOINTS_ENABLED: bool = False
+
+    CONTEXT_MAX_TURNS: int = 20
+    CONTEXT_MAX_TOKENS: int = 0
+    CONTEXT_SUMMARIZE: bool = True
+    CONTEXT_COMPACT_RATIO: float = 0.5
+
     class Config:
         env_file = ".env"  # Relative path from the script's location
 
 
+@lru_cache(maxsize=1)
 def get_settings() -> Settings:
     """
-    Creates an instance of the Settings class and loads environment variables.
+    Returns the settings of the process, loading the environment variables and `.env` once.
+
+    Every later call returns the same instance, so reading settings on the request path costs
+    a cache lookup instead of a parse and validation of `.env`.
 
     Returns:
     -------
@@ -52,3 +348,57 @@ def get_settings() -> Settings:
         The settings instance containing the loaded environment variables.
     """
     return Settings()
+
+
+def reload_settings() -> Settings:
+    """
+    Reloads the environment variables and `.env`, e.g. in tests or after the file changed.
+
+    Only later calls to `get_settings` see the new values; modules and objects that already
+    read their settings, such as the database clients, keep theirs until they are rebuilt.
+
+    Returns:
+    -------
+    Settings
+        The new settings instance.
+    """
+    get_settings.cache_clear()
+    return get_settings()
+
+
+async def settings_dependency() -> Settings:
+    """
+    FastAPI dependency returning the cached settings, e.g. `Depends(settings_dependency)`.
+
+    It is a coroutine so FastAPI calls it on the event loop; a plain function dependency
+    would be run in the threadpool on every request.
+
+    Returns:
+    -------
+    Settings
+        The settings instance.
+    """
+    return get_settings()
+
+
+def get_mongo_client_options(settings: Settings) -> dict:
+    """
+    Builds the connection pool options shared by every MongoDB client of the application.
+
+    Args:
+    ----
+    settings : Settings
+        The application settings.
+
+    Returns:
+    -------
+    dict
+        Keyword arguments accepted by both `pymongo.MongoClient` and `AsyncIOMotorClient`.
+    """
+    return {
+        "maxPoolSize": settings.MONGODB_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGODB_MIN_POOL_SIZE,
+        "connectTimeoutMS": settings.MONGODB_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": settings.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        "socketTimeoutMS": settings.MONGODB_SOCKET_TIMEOUT_MS,
+    }
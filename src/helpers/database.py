@@ -1,43 +1,43 @@
-from helpers.config import get_settings
+from functools import lru_cache
+from helpers.config import get_settings, get_mongo_client_options
 from motor.motor_asyncio import AsyncIOMotorClient
 from models import UserModel, ChatModel, MessageModel
 from controllers import UserController, ChatController, MessageController
 
-settings = get_settings()
-mongo_conn = AsyncIOMotorClient(settings.MONGODB_URL)
-db_client = mongo_conn[settings.MONGODB_DATABASE]
-
-
-user_model = UserModel(db_client)
-user_controller = UserController(user_model)
-
-chat_model = ChatModel(db_client)
-chat_controller = ChatController(chat_model)
-
-message_model = MessageModel(db_client)
-message_controller = MessageController(message_model)
+# The client, models and controllers are created on first use rather than at import time, so
+# importing the app stays cheap and the Motor client is built inside the running event loop.
 
+@lru_cache(maxsize=None)
 def get_mongo_conn():
-    return mongo_conn
+    settings = get_settings()
+    return AsyncIOMotorClient(settings.MONGODB_URL, **get_mongo_client_options(settings))
+
+def _get_db_client():
+    return get_mongo_conn()[get_settings().MONGODB_DATABASE]
 
 def get_db():
-    return db_client[settings.MONGODB_DATABASE]
+    return _get_db_client()[get_settings().MONGODB_DATABASE]
 
+@lru_cache(maxsize=None)
 def get_user_model():
-    return user_model
+    return UserModel(_get_db_client())
 
+@lru_cache(maxsize=None)
 def get_chat_model():
-    return chat_model
+    return ChatModel(_get_db_client())
 
+@lru_cache(maxsize=None)
 def get_message_model():
-    return message_model
+    return MessageModel(_get_db_client())
 
+@lru_cache(maxsize=None)
 def get_user_controller():
-    return user_controller
+    return UserController(get_user_model())
 
+@lru_cache(maxsize=None)
 def get_chat_controller():
-    return chat_controller
+    return ChatController(get_chat_model())
 
+@lru_cache(maxsize=None)
 def get_message_controller():
-    return message_controller
-    
+    return MessageController(get_message_model())
@@ -0,0 +1,114 @@
+import json
+from typing import Iterable, Optional, Union
+from enums import ChatProtocol
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the standard library encoder is used without it.
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; without it only the JSON protocol is offered.
+    msgpack = None
+
+
+def supported_protocols() -> list[ChatProtocol]:
+    """
+    Returns the wire protocols this process can speak, the preferred one first.
+
+    Returns:
+    -------
+    list[ChatProtocol]
+        The supported protocols.
+    """
+    if msgpack is None:
+        return [ChatProtocol.JSON]
+
+    return [ChatProtocol.MSGPACK, ChatProtocol.JSON]
+
+
+def negotiate_protocol(requested: Iterable[str]) -> Optional[ChatProtocol]:
+    """
+    Picks the wire protocol of a chat connection among the subprotocols the client requested.
+
+    Args:
+    ----
+    requested : Iterable[str]
+        The subprotocols of the client's `Sec-WebSocket-Protocol` header.
+
+    Returns:
+    -------
+    Optional[ChatProtocol]
+        The preferred protocol both sides support, or None if the client requested none of
+        them, in which case JSON is used without confirming a subprotocol.
+    """
+    requested = set(requested)
+    for protocol in supported_protocols():
+        if protocol.value in requested:
+            return protocol
+
+    return None
+
+
+def encode_frame(frame: dict, protocol: ChatProtocol) -> Union[str, bytes]:
+    """
+    Encodes a frame for the wire: JSON as text, MessagePack as bytes.
+
+    Args:
+    ----
+    frame : dict
+        The frame to encode.
+
+    protocol : ChatProtocol
+        The protocol of the connection.
+
+    Returns:
+    -------
+    Union[str, bytes]
+        The text or binary WebSocket message.
+    """
+    if protocol is ChatProtocol.MSGPACK:
+        return msgpack.packb(frame)
+
+    if orjson is not None:
+        return orjson.dumps(frame).decode()
+
+    return json.dumps(frame, separators=(",", ":"), ensure_ascii=False)
+
+
+class EncodedFrame:
+    """
+    A frame encoded at most once per protocol, however many connections it is sent to.
+
+    Attributes:
+    ----------
+    frame : dict
+        The frame.
+    """
+
+    __slots__ = ("frame", "_encoded")
+
+    def __init__(self, frame: dict):
+        self.frame = frame
+        self._encoded: dict[ChatProtocol, Union[str, bytes]] = {}
+
+    def encode(self, protocol: ChatProtocol) -> Union[str, bytes]:
+        """
+        Returns the frame encoded for `protocol`, encoding it on first use.
+
+        Args:
+        ----
+        protocol : ChatProtocol
+            The protocol of the connection.
+
+        Returns:
+        -------
+        Union[str, bytes]
+            The text or binary WebSocket message.
+        """
+        encoded = self._encoded.get(protocol)
+        if encoded is None:
+            encoded = self._encoded[protocol] = encode_frame(self.frame, protocol)
+
+        return encoded
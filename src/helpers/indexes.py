@@ -0,0 +1,152 @@
+import logging
+from typing import Any
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from helpers.config import get_settings
+from enums import DataBaseEnum
+
+logger = logging.getLogger(__name__)
+
+# Indexes of the application database, keyed by collection.
+APP_INDEXES = {
+    DataBaseEnum.USER_COLLECTION.value: [
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    DataBaseEnum.CHAT_COLLECTION.value: [
+        IndexModel([("session_id", ASCENDING), ("user_id", ASCENDING)], name="session_id_user_id", unique=True),
+        IndexModel([("user_id", ASCENDING)], name="user_id"),
+    ],
+    DataBaseEnum.MESSAGE_COLLECTION.value: [
+        IndexModel([("chat_id", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)], name="chat_id_timestamp_id"),
+    ],
+    DataBaseEnum.BROKER_COLLECTION.value: [
+        IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=60),
+    ],
+}
+
+# Indexes of the checkpoints database, keyed by collection.
+CHECKPOINT_INDEXES = {
+    DataBaseEnum.CHECKPOINT_COLLECTION.value: [
+        IndexModel(
+            [("thread_id", ASCENDING), ("checkpoint_ns", ASCENDING), ("checkpoint_id", DESCENDING)],
+            name="thread_id_checkpoint_ns_checkpoint_id",
+            unique=True,
+        ),
+    ],
+    DataBaseEnum.CHECKPOINT_WRITES_COLLECTION.value: [
+        IndexModel(
+            [
+                ("thread_id", ASCENDING),
+                ("checkpoint_ns", ASCENDING),
+                ("checkpoint_id", ASCENDING),
+                ("task_id", ASCENDING),
+                ("idx", ASCENDING),
+            ],
+            name="thread_id_checkpoint_ns_checkpoint_id_task_id_idx",
+            unique=True,
+        ),
+    ],
+}
+
+# Representative shapes of the hot queries, used to check their plans with explain.
+APP_HOT_QUERIES = [
+    (DataBaseEnum.USER_COLLECTION.value, {"username": ""}, None),
+    (DataBaseEnum.USER_COLLECTION.value, {"email": ""}, None),
+    (DataBaseEnum.CHAT_COLLECTION.value, {"session_id": ""}, None),
+    (DataBaseEnum.CHAT_COLLECTION.value, {"session_id": "", "user_id": ""}, None),
+    (DataBaseEnum.CHAT_COLLECTION.value, {"user_id": ""}, None),
+    (DataBaseEnum.MESSAGE_COLLECTION.value, {"chat_id": ""}, [("timestamp", ASCENDING)]),
+    (DataBaseEnum.MESSAGE_COLLECTION.value, {"chat_id": ""}, [("timestamp", DESCENDING), ("_id", DESCENDING)]),
+]
+
+CHECKPOINT_HOT_QUERIES = [
+    (
+        DataBaseEnum.CHECKPOINT_COLLECTION.value,
+        {"thread_id": "", "checkpoint_ns": ""},
+        [("checkpoint_id", DESCENDING)],
+    ),
+    (
+        DataBaseEnum.CHECKPOINT_WRITES_COLLECTION.value,
+        {"thread_id": "", "checkpoint_ns": "", "checkpoint_id": ""},
+        None,
+    ),
+]
+
+
+async def _create_indexes(db: AsyncIOMotorDatabase, indexes: dict) -> None:
+    for collection_name, models in indexes.items():
+        try:
+            await db[collection_name].create_indexes(models)
+        except OperationFailure as e:
+            # Existing duplicates or a conflicting index definition; keep serving and report it.
+            logger.warning("Could not create indexes on %s.%s: %s", db.name, collection_name, e)
+
+
+async def ensure_indexes(mongo_conn: AsyncIOMotorClient) -> None:
+    """
+    Idempotently creates the indexes of the application and checkpoints databases.
+
+    Creating an index that already exists with the same definition is a no-op, so this is
+    safe to run on every startup.
+
+    Args:
+    ----
+    mongo_conn : AsyncIOMotorClient
+        The application's MongoDB client.
+    """
+    settings = get_settings()
+
+    await _create_indexes(mongo_conn[settings.MONGODB_DATABASE], APP_INDEXES)
+    await _create_indexes(mongo_conn[settings.CHECKPOINT_DATABASE], CHECKPOINT_INDEXES)
+
+
+def _has_collection_scan(plan: Any) -> bool:
+    if isinstance(plan, dict):
+        if plan.get("stage") == "COLLSCAN":
+            return True
+        return any(_has_collection_scan(value) for value in plan.values())
+
+    if isinstance(plan, list):
+        return any(_has_collection_scan(value) for value in plan)
+
+    return False
+
+
+async def _explain_queries(db: AsyncIOMotorDatabase, queries: list) -> list[str]:
+    scans = []
+    for collection_name, query, sort in queries:
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+
+        explanation = await cursor.explain()
+        if _has_collection_scan(explanation.get("queryPlanner", {}).get("winningPlan")):
+            fields = ", ".join(query)
+            logger.warning("Collection scan on %s.%s for query on (%s)", db.name, collection_name, fields)
+            scans.append(f"{db.name}.{collection_name}({fields})")
+
+    return scans
+
+
+async def report_collection_scans(mongo_conn: AsyncIOMotorClient) -> list[str]:
+    """
+    Explains the hot queries of the application and reports the ones that scan a whole collection.
+
+    Args:
+    ----
+    mongo_conn : AsyncIOMotorClient
+        The application's MongoDB client.
+
+    Returns:
+    -------
+    list[str]
+        The queries whose winning plan contains a collection scan, as "db.collection(fields)".
+    """
+    settings = get_settings()
+
+    scans = await _explain_queries(mongo_conn[settings.MONGODB_DATABASE], APP_HOT_QUERIES)
+    scans += await _explain_queries(mongo_conn[settings.CHECKPOINT_DATABASE], CHECKPOINT_HOT_QUERIES)
+
+    return scans
@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+import weakref
+from collections import deque
+from typing import Any, Optional
+from starlette.requests import HTTPConnection
+from helpers.config import get_settings
+from helpers.tracing import Histogram, register_histogram, register_metrics
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, of the loop lag histogram buckets.
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# The stack samples taken during one stall, the first one when the threshold is crossed.
+SAMPLES_PER_STALL = 3
+
+# The frames kept of each stack sample, innermost last.
+STACK_DEPTH = 30
+
+# Counters of the event-loop monitor, since the process started.
+loop_monitor_metrics = {
+    "lag_seconds_last": 0.0,
+    "lag_seconds_max": 0.0,
+    "stalls": 0,
+    "stall_seconds_total": 0.0,
+}
+register_metrics("loop", loop_monitor_metrics)
+
+loop_lag_histogram = Histogram(LAG_BUCKETS)
+register_histogram("loop_lag_seconds", loop_lag_histogram, "How late the event loop ran a timer due now.")
+
+# What each running task is doing (route, chat ID...), to attribute the stalls it causes.
+_task_tags: "weakref.WeakKeyDictionary[asyncio.Task, dict]" = weakref.WeakKeyDictionary()
+
+
+def tag_current_task(**tags: Any) -> None:
+    """
+    Attaches tags to the running task, e.g. `tag_current_task(route="turn", chat_id=chat_id)`,
+    so the loop stalls it causes are reported with them.
+
+    Args:
+    ----
+    **tags : Any
+        The tags, merged into those already attached to the task.
+    """
+    task = asyncio.current_task()
+    if task is not None:
+        _task_tags.setdefault(task, {}).update(tags)
+
+
+async def tag_request(connection: HTTPConnection) -> None:
+    """
+    App-wide dependency tagging the task serving a request or WebSocket with its route template
+    and, when the path has one, its chat ID.
+    """
+    route = connection.scope.get("route")
+    tag_current_task(
+        route=getattr(route, "path", connection.url.path),
+        chat_id=connection.path_params.get("chat_id"),
+    )
+
+
+def _task_info(loop: asyncio.AbstractEventLoop) -> dict:
+    try:
+        task = asyncio.current_task(loop)
+    except RuntimeError:
+        task = None
+    if task is None:
+        return {"task": None}
+    return {"task": task.get_name(), **_task_tags.get(task, {})}
+
+
+class LoopMonitor:
+    """
+    Measures the event-loop lag continuously and samples the stack of the loop thread whenever
+    it is blocked for longer than a threshold.
+
+    A heartbeat task sleeps `interval` seconds and records how late it woke up. A daemon thread
+    watches the heartbeat; once it is `interval + threshold` seconds overdue, the thread takes
+    stack samples of the loop thread and notes the task that is running, with its tags. The
+    stall is closed, with how late the heartbeat ran, when the loop gets back to it.
+
+    Attributes:
+    ----------
+    interval : float
+        The time between two heartbeats, in seconds.
+
+    threshold : float
+        How long the loop must be blocked beyond `interval` before it is sampled.
+
+    stalls : deque
+        The most recent stalls, oldest first.
+    """
+
+    def __init__(self, interval: float, threshold: float, max_stalls: int):
+        self.interval = interval
+        self.threshold = threshold
+        self.stalls: deque = deque(maxlen=max_stalls)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = time.monotonic()
+        self._stall: Optional[dict] = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """
+        Starts the heartbeat on the running loop and the watchdog thread.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+        self._heartbeat = asyncio.create_task(self._beat(), name="loop-monitor")
+        self._watchdog = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        """
+        Stops the heartbeat and the watchdog thread.
+        """
+        self._stopped.set()
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            try:
+                await self._heartbeat
+            except asyncio.CancelledError:
+                pass
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1)
+
+    async def _beat(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(now - expected, 0.0)
+
+            loop_lag_histogram.observe(lag)
+            loop_monitor_metrics["lag_seconds_last"] = lag
+            loop_monitor_metrics["lag_seconds_max"] = max(loop_monitor_metrics["lag_seconds_max"], lag)
+
+            with self._lock:
+                self._last_beat = now
+                stall, self._stall = self._stall, None
+            if stall is not None:
+                stall["blocked_seconds"] = round(lag, 3)
+                loop_monitor_metrics["stall_seconds_total"] += lag
+                logger.warning(
+                    "Event loop blocked for %.3fs by task %s (route=%s, chat_id=%s) in:\n%s",
+                    stall["blocked_seconds"],
+                    stall["task"],
+                    stall.get("route"),
+                    stall.get("chat_id"),
+                    stall["samples"][0] if stall["samples"] else "(no sample)",
+                )
+
+    def _watch(self) -> None:
+        poll = min(self.interval, self.threshold) / 2
+        while not self._stopped.wait(poll):
+            with self._lock:
+                overdue = time.monotonic() - self._last_beat
+                if overdue <= self.interval + self.threshold:
+                    continue
+
+                stall = self._stall
+                if stall is None:
+                    stall = self._stall = {
+                        "started_at": time.time() - overdue + self.interval,
+                        "blocked_seconds": None,
+                        **_task_info(self._loop),
+                        "samples": [],
+                    }
+                    self.stalls.append(stall)
+                    loop_monitor_metrics["stalls"] += 1
+                elif len(stall["samples"]) >= SAMPLES_PER_STALL or \
+                        overdue < self.interval + self.threshold * (len(stall["samples"]) + 1):
+                    continue
+
+                stack = self._sample()
+                if stack:
+                    stall["samples"].append(stack)
+
+    def _sample(self) -> Optional[str]:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return None
+        return "".join(traceback.format_stack(frame, limit=STACK_DEPTH))
+
+    def snapshot(self) -> dict:
+        """
+        Returns the lag counters and the recent stalls, most recent first.
+
+        Returns:
+        -------
+        dict
+            The counters and stalls. A stall whose `blocked_seconds` is None is still going on.
+        """
+        with self._lock:
+            stalls = [dict(stall, samples=list(stall["samples"])) for stall in reversed(self.stalls)]
+        return {
+            "interval_seconds": self.interval,
+            "threshold_seconds": self.threshold,
+            **loop_monitor_metrics,
+            "recent_stalls": stalls,
+        }
+
+
+def create_loop_monitor() -> Optional[LoopMonitor]:
+    """
+    Builds the loop monitor configured by the settings, or None when it is disabled.
+    """
+    settings = get_settings()
+    if not settings.LOOP_MONITOR_ENABLED:
+        return None
+    return LoopMonitor(
+        settings.LOOP_MONITOR_INTERVAL_SECONDS,
+        settings.LOOP_STALL_THRESHOLD_SECONDS,
+        settings.LOOP_MONITOR_MAX_STALLS,
+    )
@@ -0,0 +1,296 @@
+import contextvars
+import functools
+import inspect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional
+from helpers.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # opentelemetry-api is optional; without it spans only feed the histograms.
+    otel_trace = None
+
+# Upper bounds, in seconds, of the stage duration histogram buckets.
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """
+    A Prometheus-style histogram of durations: cumulative bucket counts, a sum and a count.
+    """
+
+    def __init__(self, buckets: tuple = DURATION_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, error: bool = False) -> None:
+        with self._lock:
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+            if error:
+                self.errors += 1
+
+
+# Duration histograms of the traced stages, by stage name, since the process started.
+stage_histograms: dict[str, Histogram] = {}
+_histograms_lock = threading.Lock()
+
+# Named metric dicts exposed by `/metrics`, registered by the modules owning them.
+_metric_groups: dict[str, dict] = {}
+
+# Other histograms exposed by `/metrics`, by metric name, with their help text.
+_histograms: dict[str, tuple[str, Histogram]] = {}
+
+# The stages timed within the current turn, when a turn is being broken down.
+_breakdown: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("stage_breakdown", default=None)
+
+_tracer = otel_trace.get_tracer("harry") if otel_trace is not None else None
+
+
+def _histogram(name: str) -> Histogram:
+    histogram = stage_histograms.get(name)
+    if histogram is None:
+        with _histograms_lock:
+            histogram = stage_histograms.setdefault(name, Histogram())
+    return histogram
+
+
+@contextmanager
+def _otel_span(name: str, current: bool, attributes: dict) -> Iterator[None]:
+    if _tracer is None:
+        yield
+        return
+
+    if current:
+        with _tracer.start_as_current_span(name, attributes=attributes):
+            yield
+        return
+
+    otel_span = _tracer.start_span(name, attributes=attributes)
+    try:
+        yield
+    except BaseException as e:
+        otel_span.record_exception(e)
+        otel_span.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR))
+        raise
+    finally:
+        otel_span.end()
+
+
+@contextmanager
+def span(name: str, current: bool = True, **attributes: Any) -> Iterator[None]:
+    """
+    Times a stage, e.g. `with span("checkpoint.put", chat_id=chat_id): ...`.
+
+    The duration is recorded in the stage's histogram and in the breakdown of the current turn,
+    and, when opentelemetry-api is installed, the stage is exported as an OpenTelemetry span
+    through the configured tracer provider.
+
+    Args:
+    ----
+    name : str
+        The stage name, dotted by component.
+
+    current : bool
+        Whether the OpenTelemetry span becomes the parent of the spans started within the
+        block. Must be False when the block spans the yields of a generator.
+
+    **attributes : Any
+        Attributes of the OpenTelemetry span, e.g. the chat ID.
+    """
+    if not get_settings().TRACING_ENABLED:
+        yield
+        return
+
+    with _otel_span(name, current, attributes):
+        started = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            _histogram(name).observe(elapsed, error)
+            breakdown = _breakdown.get()
+            if breakdown is not None:
+                breakdown.append((name, elapsed))
+
+
+def traced(name: str) -> Callable:
+    """
+    Decorates a function, coroutine function or (async) generator function so every call runs
+    in a `span`. A generator is timed until it is exhausted or closed.
+
+    Args:
+    ----
+    name : str
+        The stage name.
+
+    Returns:
+    -------
+    Callable
+        The decorator.
+    """
+    def decorator(func: Callable) -> Callable:
+        if inspect.isasyncgenfunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with span(name, current=False):
+                    async for item in func(*args, **kwargs):
+                        yield item
+        elif inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with span(name, current=False):
+                    yield from func(*args, **kwargs)
+        elif inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with span(name):
+                    return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def stage_breakdown(label: str, slow_seconds: float) -> Iterator[list]:
+    """
+    Collects the stages timed within the block, including those run by the tasks and executor
+    jobs it starts, and logs them if the block took longer than `slow_seconds`.
+
+    Args:
+    ----
+    label : str
+        What the block is, for the log, e.g. "turn of chat 42".
+
+    slow_seconds : float
+        The duration above which the breakdown is logged. 0 never logs.
+
+    Yields:
+    ------
+    list
+        The `(stage, seconds)` pairs, in the order the stages finished.
+    """
+    stages: list = []
+    token = _breakdown.set(stages)
+    started = time.perf_counter()
+    try:
+        yield stages
+    finally:
+        _breakdown.reset(token)
+        elapsed = time.perf_counter() - started
+        if slow_seconds and elapsed > slow_seconds:
+            logger.warning(
+                "Slow %s took %.3fs: %s",
+                label,
+                elapsed,
+                ", ".join(f"{stage}={seconds:.3f}s" for stage, seconds in stages),
+            )
+
+
+def register_metrics(group: str, metrics: dict) -> None:
+    """
+    Exposes a dict of numeric metrics on `/metrics`, as `harry_<group>_<key>`.
+
+    Args:
+    ----
+    group : str
+        The metric name prefix, e.g. "gateway".
+
+    metrics : dict
+        The live metrics dict; its current values are read on every scrape.
+    """
+    _metric_groups[group] = metrics
+
+
+def register_histogram(name: str, histogram: Histogram, help: str) -> None:
+    """
+    Exposes a histogram on `/metrics` as `harry_<name>`.
+
+    Args:
+    ----
+    name : str
+        The metric name without prefix, e.g. "loop_lag_seconds".
+
+    histogram : Histogram
+        The live histogram.
+
+    help : str
+        The description of the metric.
+    """
+    _histograms[name] = (help, histogram)
+
+
+def _series(name: str, **labels: str) -> str:
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+def _render_histogram(lines: list[str], name: str, histogram: Histogram, **labels: str) -> None:
+    with histogram._lock:
+        counts, total, count = list(histogram.counts), histogram.sum, histogram.count
+    for bound, bucket_count in zip(histogram.buckets, counts):
+        lines.append(f"{_series(name + '_bucket', **labels, le=str(bound))} {bucket_count}")
+    lines.append(f"{_series(name + '_bucket', **labels, le='+Inf')} {count}")
+    lines.append(f"{_series(name + '_sum', **labels)} {total}")
+    lines.append(f"{_series(name + '_count', **labels)} {count}")
+
+
+def render_prometheus() -> str:
+    """
+    Renders the stage histograms and the registered histograms and metrics in the Prometheus
+    text format.
+
+    Returns:
+    -------
+    str
+        The exposition text.
+    """
+    lines = [
+        "# HELP harry_stage_duration_seconds Duration of the traced stages.",
+        "# TYPE harry_stage_duration_seconds histogram",
+    ]
+    for stage, histogram in sorted(stage_histograms.items()):
+        _render_histogram(lines, "harry_stage_duration_seconds", histogram, stage=stage)
+
+    lines += [
+        "# HELP harry_stage_errors_total Traced stages that raised.",
+        "# TYPE harry_stage_errors_total counter",
+    ]
+    for stage, histogram in sorted(stage_histograms.items()):
+        lines.append(f"{_series('harry_stage_errors_total', stage=stage)} {histogram.errors}")
+
+    for name, (help, histogram) in sorted(_histograms.items()):
+        lines += [f"# HELP harry_{name} {help}", f"# TYPE harry_{name} histogram"]
+        _render_histogram(lines, f"harry_{name}", histogram)
+
+    for group, metrics in sorted(_metric_groups.items()):
+        for key, value in list(metrics.items()):
+            if isinstance(value, (int, float)):
+                name = f"harry_{group}_{key}"
+                lines.append(f"# TYPE {name} untyped")
+                lines.append(f"{name} {float(value)}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class TurnScheduler:
+    """
+    Runs the turns of each key (e.g. chat ID) one at a time, in order, while turns of different
+    keys run in parallel.
+
+    Every key has at most one worker task, started when the first item is submitted and
+    finished once its queue is empty. When `coalesce` is set, the items submitted while a turn
+    is running (or within `coalesce_window` seconds of the first one) are run as one turn.
+
+    At most `max_pending` items wait for the turns of a key; further ones are refused until
+    a turn takes them, so neither the queue nor a coalesced turn grows without bound.
+
+    Attributes:
+    ----------
+    coalesce : bool
+        Whether the pending items of a key are merged into a single turn.
+
+    coalesce_window : float
+        How long to wait for more items before starting a coalesced turn.
+
+    max_pending : int
+        The most items waiting for the turns of a key. 0 disables the limit.
+    """
+
+    def __init__(
+        self,
+        run_turn: Callable[[str, list[Any]], Awaitable[None]],
+        coalesce: bool = False,
+        coalesce_window: float = 0.0,
+        max_pending: int = 0,
+    ):
+        self.coalesce = coalesce
+        self.coalesce_window = coalesce_window
+        self.max_pending = max_pending
+        self._run_turn = run_turn
+        self._pending: dict[str, list[Any]] = {}
+        self._workers: dict[str, asyncio.Task] = {}
+
+    def submit(self, key: str, item: Any) -> bool:
+        """
+        Queues an item for the next turn of `key`, starting the key's worker if it is idle.
+
+        Args:
+        ----
+        key : str
+            The key whose turns must not overlap.
+
+        item : Any
+            The input of the turn.
+
+        Returns:
+        -------
+        bool
+            False if the item was refused because `max_pending` items of `key` are waiting.
+        """
+        if self.is_full(key):
+            return False
+
+        self._pending.setdefault(key, []).append(item)
+        if key not in self._workers:
+            self._workers[key] = asyncio.create_task(self._drain(key))
+        return True
+
+    def is_full(self, key: str) -> bool:
+        """
+        Returns whether `max_pending` items of `key` are waiting, so new ones would be refused.
+        """
+        return self.max_pending > 0 and len(self._pending.get(key, ())) >= self.max_pending
+
+    def is_busy(self, key: str) -> bool:
+        """
+        Returns whether a turn of `key` is running or queued.
+        """
+        return key in self._workers
+
+    async def _drain(self, key: str) -> None:
+        try:
+            while self._pending.get(key):
+                if self.coalesce:
+                    if self.coalesce_window > 0:
+                        await asyncio.sleep(self.coalesce_window)
+                    batch, self._pending[key] = self._pending[key], []
+                else:
+                    batch = [self._pending[key].pop(0)]
+
+                try:
+                    await self._run_turn(key, batch)
+                except Exception:
+                    logger.exception("Turn of %s failed", key)
+        finally:
+            del self._workers[key]
+            if not self._pending.get(key):
+                self._pending.pop(key, None)
+
+    async def close(self) -> None:
+        """
+        Cancels the running turns and drops the queued ones.
+        """
+        workers = list(self._workers.values())
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self._pending.clear()
@@ -0,0 +1,165 @@
+import asyncio
+import logging
+from typing import Optional
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import WriteConcern
+from pymongo.errors import BulkWriteError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+def parse_write_concern(value: str) -> WriteConcern:
+    """
+    Parses a write concern setting: a number of acknowledging nodes, or a tag such as "majority".
+
+    Args:
+    ----
+    value : str
+        The setting, e.g. "0", "1" or "majority".
+
+    Returns:
+    -------
+    WriteConcern
+        The write concern.
+    """
+    return WriteConcern(w=int(value) if value.isdigit() else value)
+
+
+class WriteBehindSink:
+    """
+    Buffers documents and inserts them in batches with `insert_many`, off the request path.
+
+    A batch is written as soon as `max_batch` documents are buffered, or `max_delay` seconds
+    after the first document of the batch was added, whichever comes first. `flush` writes
+    everything still buffered and must be awaited on shutdown.
+
+    Write errors are retried up to `MAX_ATTEMPTS` times. A batch that still fails, or that
+    fails with an error other than a MongoDB one (e.g. a document that cannot be encoded), is
+    dropped and logged with its chat IDs; flushes never raise.
+
+    Attributes:
+    ----------
+    collection : AsyncIOMotorCollection
+        The collection documents are inserted into, with the sink's write concern.
+
+    metrics : dict
+        Cumulative counters of the sink.
+    """
+
+    MAX_ATTEMPTS = 3
+    RETRY_SECONDS = 0.2
+
+    def __init__(
+        self,
+        collection: AsyncIOMotorCollection,
+        max_batch: int,
+        max_delay: float,
+        write_concern: Optional[WriteConcern] = None,
+    ):
+        self.collection = collection.with_options(write_concern=write_concern) if write_concern else collection
+        self.max_batch = max(1, max_batch)
+        self.max_delay = max_delay
+        self.metrics = {"buffered": 0, "batches": 0, "inserted": 0, "dropped": 0}
+        self._buffer: list[dict] = []
+        # The batches taken from the buffer whose insert has not returned yet.
+        self._in_flight: list[list[dict]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: set[asyncio.Task] = set()
+        self._lock = asyncio.Lock()
+
+    def add(self, document: dict) -> None:
+        """
+        Buffers a document for insertion.
+
+        Args:
+        ----
+        document : dict
+            The document to insert.
+        """
+        self._buffer.append(document)
+        self.metrics["buffered"] = len(self._buffer)
+
+        if len(self._buffer) >= self.max_batch:
+            self._schedule_flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self._schedule_flush)
+
+    def has_pending(self, field: str, value: object) -> bool:
+        """
+        Returns whether a document not written yet, buffered or being inserted, has `field`
+        equal to `value`.
+        """
+        if any(document.get(field) == value for document in self._buffer):
+            return True
+        return any(document.get(field) == value for batch in self._in_flight for document in batch)
+
+    def _schedule_flush(self) -> None:
+        task = asyncio.get_running_loop().create_task(self.flush())
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def flush(self) -> None:
+        """
+        Writes every buffered document.
+        """
+        async with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+            while self._buffer:
+                batch, self._buffer = self._buffer[:self.max_batch], self._buffer[self.max_batch:]
+                self.metrics["buffered"] = len(self._buffer)
+                self._in_flight.append(batch)
+                try:
+                    await self._insert(batch)
+                finally:
+                    self._in_flight.remove(batch)
+
+    async def _insert(self, batch: list[dict]) -> None:
+        for attempt in range(1, self.MAX_ATTEMPTS + 1):
+            try:
+                await self.collection.insert_many(batch, ordered=False)
+                break
+            except BulkWriteError as e:
+                # The _ids are assigned on the first attempt, so documents that made it then
+                # come back as duplicates on a retry.
+                errors = e.details.get("writeErrors", [])
+                if not e.details.get("writeConcernErrors") and all(
+                    error["code"] == DUPLICATE_KEY_ERROR for error in errors
+                ):
+                    break
+                failure = e
+            except PyMongoError as e:
+                failure = e
+            except Exception as e:
+                # Not a transient error, so retrying would fail the same way.
+                self._drop(batch, e)
+                return
+
+            if attempt == self.MAX_ATTEMPTS:
+                self._drop(batch, failure)
+                return
+
+            await asyncio.sleep(self.RETRY_SECONDS * attempt)
+
+        self.metrics["batches"] += 1
+        self.metrics["inserted"] += len(batch)
+
+    def _drop(self, batch: list[dict], error: Exception) -> None:
+        chat_ids = sorted({str(document.get("chat_id")) for document in batch})
+        logger.error(
+            "Dropping %d buffered documents of %s (chats %s): %r",
+            len(batch), self.collection.name, ", ".join(chat_ids), error,
+        )
+        self.metrics["dropped"] += len(batch)
+
+    async def close(self) -> None:
+        """
+        Flushes the buffer and waits for the flushes in progress.
+        """
+        await self.flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
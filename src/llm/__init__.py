@@ -1 +1,48 @@
-from .harry import get_harry_answer
\ No newline at end of file
+import importlib
+
+# The public names of the package and the submodule defining each. Submodules are imported on
+# first access, so importing `llm` does not pull in LangChain, LangGraph or the Gemini SDK.
+_exports = {
+    "get_harry_answer": "harry",
+    "aget_harry_answer": "harry",
+    "astream_harry_answer": "harry",
+    "init_graph": "harry",
+    "get_graph": "harry",
+    "get_sync_graph": "harry",
+    "swap_graph": "harry",
+    "reset_graph": "harry",
+    "get_response_cache": "harry",
+    "get_gateway": "harry",
+    "get_llm": "harry",
+    "MongoDBSaver": "mongo_db_saver",
+    "AsyncMongoDBSaver": "mongo_db_saver",
+    "init_checkpointer": "checkpointer",
+    "get_checkpointer": "checkpointer",
+    "get_sync_checkpointer": "checkpointer",
+    "close_checkpointer": "checkpointer",
+    "run_retention": "retention",
+    "retention_loop": "retention",
+    "retention_metrics": "retention",
+    "ResponseCache": "response_cache",
+    "response_cache_metrics": "response_cache",
+    "response_cache_hit_rate": "response_cache",
+    "LLMGateway": "gateway",
+    "CircuitBreaker": "gateway",
+    "LLMUnavailableError": "gateway",
+    "gateway_metrics": "gateway",
+    "FakeChatModel": "fake",
+    "warmup": "lifecycle",
+    "is_warm": "lifecycle",
+    "shutdown_llm": "lifecycle",
+}
+
+__all__ = list(_exports)
+
+
+def __getattr__(name: str):
+    if name not in _exports:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(f"{__name__}.{_exports[name]}"), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,93 @@
+import threading
+from typing import Optional
+from helpers import get_settings, get_mongo_client_options, get_mongo_conn
+from llm.codecs import create_codec_registry
+from llm.mongo_db_saver import AsyncMongoDBSaver, MongoDBSaver
+
+_checkpointer: Optional[AsyncMongoDBSaver] = None
+_sync_checkpointer: Optional[MongoDBSaver] = None
+_checkpointer_lock = threading.Lock()
+
+
+def init_checkpointer() -> AsyncMongoDBSaver:
+    """
+    Creates the process-wide async checkpointer.
+
+    The checkpointer runs on the application's Motor client, so it shares the connection
+    pool opened at startup and closed at shutdown with `app.mongo_conn`. Calling it again
+    returns the checkpointer that already exists.
+
+    Returns:
+    -------
+    AsyncMongoDBSaver
+        The shared checkpointer.
+    """
+    global _checkpointer
+
+    with _checkpointer_lock:
+        if _checkpointer is None:
+            settings = get_settings()
+            _checkpointer = AsyncMongoDBSaver(
+                get_mongo_conn(),
+                settings.CHECKPOINT_DATABASE,
+                settings.CHECKPOINT_SNAPSHOT_INTERVAL,
+                create_codec_registry(),
+            )
+
+    return _checkpointer
+
+
+def get_checkpointer() -> AsyncMongoDBSaver:
+    """
+    Returns the shared async checkpointer, creating it if the startup hook has not run yet.
+
+    Returns:
+    -------
+    AsyncMongoDBSaver
+        The shared checkpointer.
+    """
+    if _checkpointer is None:
+        return init_checkpointer()
+
+    return _checkpointer
+
+
+def get_sync_checkpointer() -> MongoDBSaver:
+    """
+    Returns the shared sync checkpointer used by `get_harry_answer`.
+
+    Its pymongo connection pool is only opened the first time a sync turn runs.
+
+    Returns:
+    -------
+    MongoDBSaver
+        The shared sync checkpointer.
+    """
+    global _sync_checkpointer
+
+    if _sync_checkpointer is None:
+        with _checkpointer_lock:
+            if _sync_checkpointer is None:
+                settings = get_settings()
+                _sync_checkpointer = MongoDBSaver.from_pool(
+                    url=settings.MONGODB_URL,
+                    db_name=settings.CHECKPOINT_DATABASE,
+                    snapshot_interval=settings.CHECKPOINT_SNAPSHOT_INTERVAL,
+                    codecs=create_codec_registry(),
+                    **get_mongo_client_options(settings),
+                )
+
+    return _sync_checkpointer
+
+
+def close_checkpointer() -> None:
+    """
+    Releases the shared checkpointers and closes the sync connection pool if it was opened.
+    """
+    global _checkpointer, _sync_checkpointer
+
+    with _checkpointer_lock:
+        if _sync_checkpointer is not None:
+            _sync_checkpointer.close()
+        _checkpointer = None
+        _sync_checkpointer = None
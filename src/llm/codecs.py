@@ -0,0 +1,188 @@
+import argparse
+import logging
+from pathlib import Path
+from typing import Iterable, Optional
+from pymongo import MongoClient
+from helpers import get_settings, get_mongo_client_options
+from enums import DataBaseEnum
+
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional; without it checkpoints are stored uncompressed.
+    zstandard = None
+
+
+class CheckpointCodec:
+    """
+    Encodes the serialized checkpoint and write blobs before they are stored.
+
+    The codec's `name` is stored next to every blob so readers always pick the right codec.
+    The base class stores blobs as they are.
+    """
+
+    name = "identity"
+
+    def encode(self, data: bytes) -> bytes:
+        return data
+
+    def decode(self, data: bytes) -> bytes:
+        return data
+
+
+class ZstdCodec(CheckpointCodec):
+    """
+    Compresses blobs with zstd, optionally primed with a dictionary trained on our checkpoints.
+
+    Checkpoints are mostly short natural-language messages wrapped in the same LangChain
+    envelopes, which a trained dictionary compresses far better than zstd alone.
+    """
+
+    def __init__(self, level: int = 3, dictionary: Optional[bytes] = None):
+        if zstandard is None:
+            raise RuntimeError("The zstandard package is required to use the zstd checkpoint codec")
+
+        if dictionary:
+            zstd_dictionary = zstandard.ZstdCompressionDict(dictionary)
+            self.name = f"zstd:{zstd_dictionary.dict_id()}"
+            self._compressor = zstandard.ZstdCompressor(level=level, dict_data=zstd_dictionary)
+            self._decompressor = zstandard.ZstdDecompressor(dict_data=zstd_dictionary)
+        else:
+            self.name = "zstd"
+            self._compressor = zstandard.ZstdCompressor(level=level)
+            self._decompressor = zstandard.ZstdDecompressor()
+
+    def encode(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def decode(self, data: bytes) -> bytes:
+        return self._decompressor.decompress(data)
+
+
+class CodecRegistry:
+    """
+    The codec used to write new blobs, plus every codec able to read stored ones.
+
+    Attributes:
+    ----------
+    writer : CheckpointCodec
+        The codec applied to new blobs.
+    """
+
+    def __init__(self, writer: CheckpointCodec, readers: Iterable[CheckpointCodec] = ()):
+        self.writer = writer
+        self._readers = {codec.name: codec for codec in (CheckpointCodec(), writer, *readers)}
+
+    def reader(self, name: Optional[str]) -> CheckpointCodec:
+        """
+        Returns the codec that decodes blobs stored with the given codec name.
+
+        Args:
+        ----
+        name : Optional[str]
+            The codec name stored with the blob. Legacy documents have none.
+
+        Returns:
+        -------
+        CheckpointCodec
+            The matching codec.
+
+        Raises:
+        ------
+        ValueError
+            If the codec (or its dictionary) is not available in this process.
+        """
+        name = name or CheckpointCodec.name
+        if name not in self._readers and name == "zstd" and zstandard is not None:
+            self._readers[name] = ZstdCodec()
+
+        if name not in self._readers:
+            raise ValueError(f"Checkpoint codec {name!r} is not available; check CHECKPOINT_ZSTD_DICTIONARY")
+
+        return self._readers[name]
+
+
+def create_codec_registry() -> CodecRegistry:
+    """
+    Builds the codec registry configured by `CHECKPOINT_CODEC`, `CHECKPOINT_ZSTD_LEVEL` and
+    `CHECKPOINT_ZSTD_DICTIONARY`.
+
+    Falls back to storing blobs uncompressed, with a warning, when zstandard is not installed.
+
+    Returns:
+    -------
+    CodecRegistry
+        The registry.
+    """
+    settings = get_settings()
+
+    if settings.CHECKPOINT_CODEC != "zstd":
+        return CodecRegistry(CheckpointCodec())
+
+    if zstandard is None:
+        logger.warning("zstandard is not installed; checkpoints will be stored uncompressed")
+        return CodecRegistry(CheckpointCodec())
+
+    dictionary = None
+    if settings.CHECKPOINT_ZSTD_DICTIONARY:
+        dictionary = Path(settings.CHECKPOINT_ZSTD_DICTIONARY).read_bytes()
+
+    return CodecRegistry(
+        ZstdCodec(settings.CHECKPOINT_ZSTD_LEVEL, dictionary),
+        # Blobs written with plain zstd before a dictionary was configured stay readable.
+        [ZstdCodec(settings.CHECKPOINT_ZSTD_LEVEL)],
+    )
+
+
+def train_dictionary(samples: list[bytes], size: int = 112640) -> bytes:
+    """
+    Trains a zstd dictionary on a sample of serialized checkpoint blobs.
+
+    Args:
+    ----
+    samples : list[bytes]
+        Serialized (uncompressed) checkpoint and write blobs.
+
+    size : int
+        The target size of the dictionary in bytes.
+
+    Returns:
+    -------
+    bytes
+        The dictionary, to be saved to the file named by `CHECKPOINT_ZSTD_DICTIONARY`.
+    """
+    if zstandard is None:
+        raise RuntimeError("The zstandard package is required to train a checkpoint dictionary")
+
+    return zstandard.train_dictionary(size, samples).as_bytes()
+
+
+def _sample_blobs(limit: int) -> list[bytes]:
+    settings = get_settings()
+    registry = create_codec_registry()
+    client = MongoClient(settings.MONGODB_URL, **get_mongo_client_options(settings))
+    try:
+        db = client[settings.CHECKPOINT_DATABASE]
+        samples = []
+        pipeline = [{"$sample": {"size": limit}}]
+        for doc in db[DataBaseEnum.CHECKPOINT_COLLECTION.value].aggregate(pipeline):
+            samples.append(registry.reader(doc.get("codec")).decode(doc["checkpoint"]))
+        for doc in db[DataBaseEnum.CHECKPOINT_WRITES_COLLECTION.value].aggregate(pipeline):
+            samples.append(registry.reader(doc.get("codec")).decode(doc["value"]))
+    finally:
+        client.close()
+
+    return samples
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train a zstd dictionary on the stored checkpoints.")
+    parser.add_argument("output", help="Where to write the dictionary.")
+    parser.add_argument("--samples", type=int, default=5000, help="Number of documents to sample per collection.")
+    parser.add_argument("--size", type=int, default=112640, help="Target dictionary size in bytes.")
+    args = parser.parse_args()
+
+    dictionary = train_dictionary(_sample_blobs(args.samples), args.size)
+    Path(args.output).write_bytes(dictionary)
+    print(f"Wrote a {len(dictionary)} byte dictionary to {args.output}")
@@ -0,0 +1,70 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+from helpers import get_settings
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_llm_executor() -> ThreadPoolExecutor:
+    """
+    Returns the bounded thread pool used to run sync-only LLM and checkpoint work.
+
+    The pool is created on first use and sized by `LLM_EXECUTOR_WORKERS`, so a burst of
+    turns can never spawn more threads than configured.
+
+    Returns:
+    -------
+    ThreadPoolExecutor
+        The shared executor.
+    """
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                settings = get_settings()
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.LLM_EXECUTOR_WORKERS,
+                    thread_name_prefix="harry-llm",
+                )
+
+    return _executor
+
+
+async def run_in_executor(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    Runs a blocking callable in the LLM executor without blocking the event loop.
+
+    The caller's context variables are copied into the worker thread so callbacks and
+    tracing keep working across the hop.
+
+    Args:
+    ----
+    func : Callable
+        The blocking callable to run.
+
+    Returns:
+    -------
+    Any
+        Whatever `func` returns.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_llm_executor(), partial(context.run, func, *args, **kwargs))
+
+
+def shutdown_llm_executor() -> None:
+    """
+    Shuts down the LLM executor, waiting for running jobs to finish.
+    """
+    global _executor
+
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
@@ -0,0 +1,100 @@
+import asyncio
+import random
+import time
+from typing import Any, AsyncIterator, Iterator, Optional
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    A local stand-in for Gemini with a controllable latency, token rate and failure rate.
+
+    It answers every prompt with `reply`, split into whitespace-separated tokens, so the graph,
+    streaming, the gateway and load tests can run without network access or an API key.
+
+    Attributes:
+    ----------
+    reply : str
+        The reply to every prompt.
+
+    latency_seconds : float
+        The delay before the first token.
+
+    tokens_per_second : float
+        The rate tokens are produced at after the first one. 0 produces them all at once.
+
+    failure_rate : float
+        The probability that a call raises instead of answering.
+    """
+
+    reply: str = "Blimey, that's a good question! Hermione would know, but I reckon it has something to do with magic."
+    latency_seconds: float = 0.5
+    tokens_per_second: float = 50.0
+    failure_rate: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def _tokens(self) -> list[str]:
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise RuntimeError("Fake chat model failure")
+
+        words = self.reply.split(" ")
+        return [word if i == 0 else f" {word}" for i, word in enumerate(words)]
+
+    def _token_delay(self) -> float:
+        return 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        tokens = self._tokens()
+        time.sleep(self.latency_seconds + self._token_delay() * (len(tokens) - 1))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        tokens = self._tokens()
+        await asyncio.sleep(self.latency_seconds + self._token_delay() * (len(tokens) - 1))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        tokens = self._tokens()
+        time.sleep(self.latency_seconds)
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(self._token_delay())
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        tokens = self._tokens()
+        await asyncio.sleep(self.latency_seconds)
+        for i, token in enumerate(tokens):
+            if i:
+                await asyncio.sleep(self._token_delay())
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
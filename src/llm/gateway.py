@@ -0,0 +1,360 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.runnables import Runnable, RunnableConfig
+from helpers import get_settings, register_metrics
+from llm.prompts import fallback_replies
+
+logger = logging.getLogger(__name__)
+
+# Current load and cumulative counters of the LLM gateway since the process started.
+gateway_metrics = {
+    "calls": 0,
+    "in_flight": 0,
+    "failures": 0,
+    "timeouts": 0,
+    "fallbacks": 0,
+    "hedges": 0,
+    "hedge_wins": 0,
+    "circuit_opens": 0,
+}
+register_metrics("gateway", gateway_metrics)
+
+
+class CircuitBreaker:
+    """
+    Stops calling the model after `failure_threshold` consecutive failures.
+
+    Once open, calls are refused for `reset_seconds`; then a single probe call is let through
+    (half-open) and its outcome closes or re-opens the circuit. A probe that ends without an
+    outcome, e.g. cancelled, is released so the next call probes again.
+
+    Attributes:
+    ----------
+    state : str
+        "closed", "open" or "half-open".
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """
+        Returns whether a call may go through now.
+        """
+        with self._lock:
+            if self.state == "closed":
+                return True
+
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self.state = "half-open"
+                return True
+
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == "half-open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    gateway_metrics["circuit_opens"] += 1
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+    def release_probe(self) -> None:
+        """
+        Gives up the half-open probe without an outcome, so the next call is let through as a
+        new probe.
+        """
+        with self._lock:
+            if self.state == "half-open":
+                # _opened_at is left as is, so the reset delay has already passed.
+                self.state = "open"
+
+
+def fallback_reply() -> AIMessage:
+    """
+    Returns a short in-character reply for when the model cannot answer.
+
+    The message is flagged with `response_metadata["fallback"]`, so it is never cached or
+    stored as Harry's answer.
+
+    Returns:
+    -------
+    AIMessage
+        The fallback reply.
+    """
+    return AIMessage(content=random.choice(fallback_replies), response_metadata={"fallback": True})
+
+
+class LLMUnavailableError(Exception):
+    """
+    Raised by Harry's graph when the gateway answered with a fallback reply, so the turn shows
+    it to the user without storing it in the chat or the checkpoint.
+
+    Attributes:
+    ----------
+    reply : str
+        The in-character fallback reply.
+    """
+
+    def __init__(self, reply: str):
+        super().__init__("The model could not answer")
+        self.reply = reply
+
+
+class LLMGateway:
+    """
+    Guards the calls to the chat model with concurrency limits, deadlines, hedging and a
+    circuit breaker, and answers with a fallback reply instead of failing.
+
+    The per-call options are read from the run's `configurable`:
+    - `user_id`: calls of one user share `max_per_user` slots;
+    - `deadline`: the `time.time()` by which the reply is due, e.g. set when the user's
+      message was received;
+    - `streaming`: hedging is disabled while tokens are streamed to the client.
+
+    Attributes:
+    ----------
+    timeout : float
+        The longest a call may take when no earlier deadline applies.
+
+    hedge : bool
+        Whether a second, identical call is started when the first one is slower than the
+        p95 latency of recent calls; the first reply wins.
+
+    breaker : CircuitBreaker
+        The circuit breaker of the upstream model.
+    """
+
+    HEDGE_MIN_SAMPLES = 20
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_per_user: int,
+        timeout: float,
+        hedge: bool,
+        breaker: CircuitBreaker,
+    ):
+        self.timeout = timeout
+        self.hedge = hedge
+        self.breaker = breaker
+        self.max_per_user = max_per_user
+        self._global = asyncio.Semaphore(max_concurrency)
+        self._users: dict[str, list] = {}
+        self._latencies: deque = deque(maxlen=200)
+
+    def hedge_delay(self) -> Optional[float]:
+        """
+        Returns the p95 latency of recent successful calls, or None until enough were seen.
+        """
+        if len(self._latencies) < self.HEDGE_MIN_SAMPLES:
+            return None
+
+        latencies = sorted(self._latencies)
+        return latencies[int(len(latencies) * 0.95) - 1]
+
+    @asynccontextmanager
+    async def _user_slot(self, user_id: Optional[str]) -> AsyncIterator[None]:
+        if user_id is None or self.max_per_user <= 0:
+            yield
+            return
+
+        slot = self._users.setdefault(user_id, [asyncio.Semaphore(self.max_per_user), 0])
+        slot[1] += 1
+        try:
+            async with slot[0]:
+                yield
+        finally:
+            slot[1] -= 1
+            if slot[1] == 0:
+                del self._users[user_id]
+
+    async def _call(self, runnable: Runnable, input: Any, config: Optional[RunnableConfig], hedge: bool) -> BaseMessage:
+        started = time.perf_counter()
+        delay = self.hedge_delay() if hedge else None
+
+        if delay is None:
+            result = await runnable.ainvoke(input, config)
+        else:
+            result = await self._hedged_call(runnable, input, config, delay)
+
+        self._latencies.append(time.perf_counter() - started)
+        return result
+
+    async def _hedged_call(self, runnable: Runnable, input: Any, config: Optional[RunnableConfig], delay: float) -> BaseMessage:
+        first = asyncio.create_task(runnable.ainvoke(input, config))
+        pending = {first}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                gateway_metrics["hedges"] += 1
+                pending.add(asyncio.create_task(runnable.ainvoke(input, config)))
+
+            error: Optional[BaseException] = None
+            while done or pending:
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            gateway_metrics["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def ainvoke(self, runnable: Runnable, input: Any, config: Optional[RunnableConfig] = None) -> BaseMessage:
+        """
+        Calls `runnable` within the limits of the gateway.
+
+        Args:
+        ----
+        runnable : Runnable
+            The chain ending with the chat model.
+
+        input : Any
+            The input of the chain.
+
+        config : Optional[RunnableConfig]
+            The run's config, forwarded to the chain.
+
+        Returns:
+        -------
+        BaseMessage
+            The model's reply, or a fallback reply if the circuit is open, the deadline passed
+            or the call failed.
+        """
+        configurable = (config or {}).get("configurable", {})
+        timeout = self.timeout
+        if configurable.get("deadline") is not None:
+            timeout = min(timeout, configurable["deadline"] - time.time())
+
+        gateway_metrics["calls"] += 1
+        if timeout <= 0 or not self.breaker.allow():
+            gateway_metrics["fallbacks"] += 1
+            return fallback_reply()
+
+        probe = self.breaker.state == "half-open"
+        called = False
+
+        async def guarded_call() -> BaseMessage:
+            nonlocal called
+            async with self._global, self._user_slot(configurable.get("user_id")):
+                called = True
+                gateway_metrics["in_flight"] += 1
+                try:
+                    return await self._call(runnable, input, config, self.hedge and not configurable.get("streaming"))
+                finally:
+                    gateway_metrics["in_flight"] -= 1
+
+        try:
+            result = await asyncio.wait_for(guarded_call(), timeout)
+        except asyncio.TimeoutError:
+            gateway_metrics["timeouts"] += 1
+            gateway_metrics["fallbacks"] += 1
+            # Timing out while queued for a slot says nothing about the health of the model,
+            # unless it was the half-open probe, which must not hold the circuit half-open.
+            if called or probe:
+                self.breaker.record_failure()
+            return fallback_reply()
+        except Exception:
+            logger.exception("LLM call failed")
+            gateway_metrics["failures"] += 1
+            gateway_metrics["fallbacks"] += 1
+            self.breaker.record_failure()
+            return fallback_reply()
+        except BaseException:
+            # Cancelled, e.g. the client went away: the probe says nothing about the model.
+            if probe:
+                self.breaker.release_probe()
+            raise
+
+        self.breaker.record_success()
+        return result
+
+    def invoke(self, runnable: Runnable, input: Any, config: Optional[RunnableConfig] = None) -> BaseMessage:
+        """
+        Calls `runnable` synchronously behind the circuit breaker.
+
+        The sync path relies on the model client's own timeout and has no concurrency limits.
+
+        Args:
+        ----
+        runnable : Runnable
+            The chain ending with the chat model.
+
+        input : Any
+            The input of the chain.
+
+        config : Optional[RunnableConfig]
+            The run's config, forwarded to the chain.
+
+        Returns:
+        -------
+        BaseMessage
+            The model's reply, or a fallback reply.
+        """
+        gateway_metrics["calls"] += 1
+        if not self.breaker.allow():
+            gateway_metrics["fallbacks"] += 1
+            return fallback_reply()
+
+        probe = self.breaker.state == "half-open"
+        try:
+            result = runnable.invoke(input, config)
+        except Exception:
+            logger.exception("LLM call failed")
+            gateway_metrics["failures"] += 1
+            gateway_metrics["fallbacks"] += 1
+            self.breaker.record_failure()
+            return fallback_reply()
+        except BaseException:
+            if probe:
+                self.breaker.release_probe()
+            raise
+
+        self.breaker.record_success()
+        return result
+
+
+def create_gateway() -> LLMGateway:
+    """
+    Builds the LLM gateway configured by the `LLM_*` settings.
+
+    Returns:
+    -------
+    LLMGateway
+        The gateway.
+    """
+    settings = get_settings()
+
+    return LLMGateway(
+        settings.LLM_MAX_CONCURRENCY,
+        settings.LLM_MAX_CONCURRENCY_PER_USER,
+        settings.LLM_TIMEOUT_SECONDS,
+        settings.LLM_HEDGE,
+        CircuitBreaker(settings.LLM_CIRCUIT_FAILURE_THRESHOLD, settings.LLM_CIRCUIT_RESET_SECONDS),
+    )
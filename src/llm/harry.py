@@ -1,54 +1,642 @@
 import os
-from langchain.schema import AIMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
+import threading
+from typing import AsyncIterator, Optional, Tuple
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, RemoveMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 from langgraph.graph import START, MessagesState, StateGraph, END
-from helpers import get_settings
-from llm.mongo_db_saver import MongoDBSaver
-from llm.prompts import harry_prompt
+from langgraph.graph.state import CompiledStateGraph
+from helpers import get_settings, span, traced
+from llm.checkpointer import get_checkpointer, get_sync_checkpointer
+from llm.fake import FakeChatModel
+from llm.gateway import LLMGateway, LLMUnavailableError, create_gateway
+from llm.prompts import harry_prompt, summary_prompt
+from llm.response_cache import ResponseCache, create_response_cache, response_cache_metrics
 
 settings = get_settings()
 os.environ["GOOGLE_API_KEY"] =  settings.GOOGLE_API_KEY
-llm = ChatGoogleGenerativeAI(
-    model=settings.MODEL_NAME,
-    temperature=0.7,
-    max_tokens=None,
-    timeout=None,
-    max_retries=2,
-)
 
 
-harry = llm
+def create_chat_model() -> BaseChatModel:
+    """
+    Creates the chat model selected by `LLM_PROVIDER`: Gemini, or a local fake model for
+    tests and load tests.
 
+    The Gemini client is imported here rather than at module load, since its SDK alone takes
+    about a second to import.
 
-def call_llm(state: MessagesState):
-    chain = harry_prompt | harry
-    result = chain.invoke(state["messages"])
-    return {"messages": [AIMessage(content=result.content, name="harry potter")]}
+    Returns:
+    -------
+    BaseChatModel
+        The chat model.
+    """
+    if settings.LLM_PROVIDER == "fake":
+        return FakeChatModel(
+            latency_seconds=settings.FAKE_LLM_LATENCY_SECONDS,
+            tokens_per_second=settings.FAKE_LLM_TOKENS_PER_SECOND,
+        )
 
+    from langchain_google_genai import ChatGoogleGenerativeAI
 
+    return ChatGoogleGenerativeAI(
+        model=settings.MODEL_NAME,
+        temperature=0.7,
+        max_tokens=None,
+        timeout=settings.LLM_TIMEOUT_SECONDS,
+        max_retries=settings.LLM_MAX_RETRIES,
+    )
 
-def create_graph(checkpointer):
 
-    workflow = StateGraph(state_schema=MessagesState)
-    workflow.add_node("harry", call_llm)
-    workflow.add_edge(START, "harry")
+_chain: Optional[Runnable] = None
+_summary_chain: Optional[Runnable] = None
+_graph: Optional[CompiledStateGraph] = None
+_sync_graph: Optional[CompiledStateGraph] = None
+_response_cache: Optional[ResponseCache] = None
+_response_cache_ready = False
+_graph_lock = threading.Lock()
+_init_lock = threading.Lock()
+_gateway: Optional[LLMGateway] = None
+_llm: Optional[BaseChatModel] = None
+
+
+def get_llm() -> BaseChatModel:
+    """
+    Returns the shared chat model answering as Harry, creating it on first use.
+
+    Returns:
+    -------
+    BaseChatModel
+        The chat model.
+    """
+    global _llm
+
+    if _llm is None:
+        with _init_lock:
+            if _llm is None:
+                _llm = create_chat_model()
+
+    return _llm
+
+
+def build_chain(prompt: Optional[ChatPromptTemplate] = None, model: Optional[BaseChatModel] = None) -> Runnable:
+    """
+    Builds the prompt | model chain that answers as Harry.
+
+    Args:
+    ----
+    prompt : Optional[ChatPromptTemplate]
+        The prompt to use. Defaults to `harry_prompt`.
+
+    model : Optional[BaseChatModel]
+        The chat model to use. Defaults to the configured Gemini model.
+
+    Returns:
+    -------
+    Runnable
+        The chain.
+    """
+    return (prompt or harry_prompt) | (model or get_llm())
+
+
+def build_summary_chain(model: Optional[BaseChatModel] = None) -> Runnable:
+    """
+    Builds the chain that folds old turns into the rolling conversation summary.
+
+    Args:
+    ----
+    model : Optional[BaseChatModel]
+        The chat model to use. Defaults to the configured Gemini model.
+
+    Returns:
+    -------
+    Runnable
+        The chain.
+    """
+    return summary_prompt | (model or get_llm())
+
+
+class HarryState(MessagesState):
+    """
+    The conversation state: the messages inside the context window, plus a rolling summary
+    of the turns that fell out of it.
+    """
+
+    summary: str
+
+
+def count_tokens(message: BaseMessage) -> int:
+    """
+    Roughly estimates the number of tokens of a message (about four characters per token).
+
+    Args:
+    ----
+    message : BaseMessage
+        The message to measure.
+
+    Returns:
+    -------
+    int
+        The estimated number of tokens.
+    """
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    return len(content) // 4 + 4
+
+
+def find_context_start(messages: list[BaseMessage], max_turns: int, max_tokens: int) -> int:
+    """
+    Finds where the context window starts under a last-N-turns and/or token budget policy.
+
+    The window always starts on a user message and always keeps the latest one.
+
+    Args:
+    ----
+    messages : list[BaseMessage]
+        The conversation, oldest first.
+
+    max_turns : int
+        The number of most recent turns to keep. 0 disables the limit.
+
+    max_tokens : int
+        The approximate token budget of the window. 0 disables the limit.
+
+    Returns:
+    -------
+    int
+        The index of the first message kept in the window.
+    """
+    human_indexes = [i for i, message in enumerate(messages) if isinstance(message, HumanMessage)]
+    if not human_indexes:
+        return 0
+
+    start = 0
+    if max_turns > 0 and len(human_indexes) > max_turns:
+        start = human_indexes[-max_turns]
+
+    if max_tokens > 0:
+        tokens = 0
+        budget_start = len(messages)
+        for i in range(len(messages) - 1, start - 1, -1):
+            tokens += count_tokens(messages[i])
+            if tokens > max_tokens:
+                break
+            budget_start = i
+
+        candidates = [i for i in human_indexes if i >= budget_start]
+        start = max(start, candidates[0] if candidates else human_indexes[-1])
+
+    return start
+
+
+def _low_water(limit: int) -> int:
+    if limit <= 0:
+        return 0
+    return max(1, int(limit * settings.CONTEXT_COMPACT_RATIO))
+
+
+def _overflow(state: HarryState) -> list[BaseMessage]:
+    messages = state["messages"]
+    if find_context_start(messages, settings.CONTEXT_MAX_TURNS, settings.CONTEXT_MAX_TOKENS) == 0:
+        return []
+
+    # Once over the limits, compact well below them, so the next turns need no summary call.
+    start = find_context_start(
+        messages, _low_water(settings.CONTEXT_MAX_TURNS), _low_water(settings.CONTEXT_MAX_TOKENS)
+    )
+    return messages[:start]
+
+
+def _compaction(dropped: list[BaseMessage], summary: Optional[str]) -> dict:
+    update = {"messages": [RemoveMessage(id=message.id) for message in dropped]}
+    if summary is not None:
+        update["summary"] = summary
+    return update
+
+
+def _summary_input(state: HarryState, dropped: list[BaseMessage]) -> dict:
+    return {"messages": dropped, "summary": state.get("summary") or "Nothing yet."}
+
+
+def _llm_input(state: HarryState) -> list[BaseMessage]:
+    if state.get("summary"):
+        return [SystemMessage(content=f"Summary of the earlier conversation: {state['summary']}")] + state["messages"]
+    return state["messages"]
+
+
+def _cacheable_prompt(state: HarryState, config: RunnableConfig, response_cache: Optional[ResponseCache]) -> Optional[str]:
+    if response_cache is None:
+        return None
+
+    if (config or {}).get("configurable", {}).get("bypass_cache"):
+        response_cache_metrics["bypassed"] += 1
+        return None
+
+    # Only replies that do not depend on earlier turns can be shared between conversations.
+    messages = state["messages"]
+    if state.get("summary") or sum(isinstance(message, HumanMessage) for message in messages) > settings.RESPONSE_CACHE_MAX_TURNS:
+        return None
+
+    if not messages or not isinstance(messages[-1], HumanMessage) or not isinstance(messages[-1].content, str):
+        return None
+
+    return messages[-1].content
+
+
+def _reply(content: str) -> dict:
+    return {"messages": [AIMessage(content=content, name="harry potter")]}
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """
+    Returns the shared response cache, creating it on first use, or None if it is disabled.
+
+    Returns:
+    -------
+    Optional[ResponseCache]
+        The shared response cache.
+    """
+    global _response_cache, _response_cache_ready
+
+    if not _response_cache_ready:
+        with _init_lock:
+            if not _response_cache_ready:
+                _response_cache = create_response_cache()
+                _response_cache_ready = True
+
+    return _response_cache
+
+
+def get_gateway() -> LLMGateway:
+    """
+    Returns the shared LLM gateway that guards every call to the model answering as Harry.
+
+    Returns:
+    -------
+    LLMGateway
+        The shared gateway.
+    """
+    global _gateway
+
+    if _gateway is None:
+        with _init_lock:
+            if _gateway is None:
+                _gateway = create_gateway()
+
+    return _gateway
+
+
+def create_graph(
+    checkpointer,
+    chain: Optional[Runnable] = None,
+    summary_chain: Optional[Runnable] = None,
+    response_cache: Optional[ResponseCache] = None,
+):
+
+    chain = chain or build_chain()
+    summary_chain = summary_chain or build_summary_chain()
+    gateway = get_gateway()
+
+    def compact_context(state: HarryState):
+        dropped = _overflow(state)
+        if not dropped:
+            return None
+
+        summary = None
+        if settings.CONTEXT_SUMMARIZE:
+            with span("harry.summarize"):
+                result = gateway.invoke(summary_chain, _summary_input(state, dropped))
+            # Without a summary, the old turns stay in the window until the next compaction.
+            if result.response_metadata.get("fallback"):
+                return None
+            summary = result.content
+        return _compaction(dropped, summary)
+
+    async def acompact_context(state: HarryState, config: RunnableConfig):
+        dropped = _overflow(state)
+        if not dropped:
+            return None
+
+        summary = None
+        if settings.CONTEXT_SUMMARIZE:
+            with span("harry.summarize"):
+                result = await gateway.ainvoke(summary_chain, _summary_input(state, dropped), config)
+            if result.response_metadata.get("fallback"):
+                return None
+            summary = result.content
+        return _compaction(dropped, summary)
+
+    def call_llm(state: HarryState, config: RunnableConfig):
+        prompt = _cacheable_prompt(state, config, response_cache)
+        if prompt is not None:
+            with span("harry.cache_lookup"):
+                cached = response_cache.lookup(prompt)
+            if cached is not None:
+                return _reply(cached)
+
+        with span("harry.llm"):
+            result = gateway.invoke(chain, _llm_input(state))
+        # A fallback is not Harry's answer: failing the run keeps it out of the checkpoint.
+        if result.response_metadata.get("fallback"):
+            raise LLMUnavailableError(result.content)
+        if prompt is not None:
+            response_cache.store(prompt, result.content)
+        return _reply(result.content)
+
+    async def acall_llm(state: HarryState, config: RunnableConfig):
+        prompt = _cacheable_prompt(state, config, response_cache)
+        if prompt is not None:
+            with span("harry.cache_lookup"):
+                cached = await response_cache.alookup(prompt)
+            if cached is not None:
+                return _reply(cached)
+
+        with span("harry.llm"):
+            result = await gateway.ainvoke(chain, _llm_input(state), config)
+        if result.response_metadata.get("fallback"):
+            raise LLMUnavailableError(result.content)
+        if prompt is not None:
+            await response_cache.astore(prompt, result.content)
+        return _reply(result.content)
+
+    workflow = StateGraph(state_schema=HarryState)
+    workflow.add_node("compact", RunnableLambda(compact_context, afunc=acompact_context))
+    workflow.add_node("harry", RunnableLambda(call_llm, afunc=acall_llm))
+    workflow.add_edge(START, "compact")
+    workflow.add_edge("compact", "harry")
     workflow.add_edge("harry", END)
 
     app = workflow.compile(checkpointer=checkpointer)
     return app
 
-def get_harry_answer(query: str, thread_id: str):
 
-    with MongoDBSaver.from_conn_info(
-         url = settings.MONGODB_URL, db_name="checkpoints"
-    ) as checkpointer:
-        graph = create_graph(checkpointer=checkpointer)
-        config = {"configurable": {"thread_id": thread_id}}
-        res = graph.invoke({"messages": [("human", query)]}, config)
+def init_graph() -> CompiledStateGraph:
+    """
+    Compiles the Harry graph once against the shared async checkpointer.
+
+    The compiled graph holds no per-request state, so the same instance is shared by every
+    thread and task. Calling it again returns the graph that already exists.
+
+    Returns:
+    -------
+    CompiledStateGraph
+        The shared compiled graph.
+    """
+    global _chain, _summary_chain, _graph
+
+    with _graph_lock:
+        if _chain is None:
+            _chain = build_chain()
+            _summary_chain = build_summary_chain()
+        if _graph is None:
+            _graph = create_graph(
+                checkpointer=get_checkpointer(),
+                chain=_chain,
+                summary_chain=_summary_chain,
+                response_cache=get_response_cache(),
+            )
+
+    return _graph
+
+
+def get_graph() -> CompiledStateGraph:
+    """
+    Returns the shared compiled graph, compiling it if the startup hook has not run yet.
+
+    Returns:
+    -------
+    CompiledStateGraph
+        The shared compiled graph.
+    """
+    graph = _graph
+    if graph is None:
+        return init_graph()
+
+    return graph
+
+
+def get_sync_graph() -> CompiledStateGraph:
+    """
+    Returns the compiled graph used by the sync `get_harry_answer`.
+
+    It shares the chain of the async graph but checkpoints through the pymongo saver, and is
+    only compiled the first time a sync turn runs.
+
+    Returns:
+    -------
+    CompiledStateGraph
+        The shared sync compiled graph.
+    """
+    global _chain, _summary_chain, _sync_graph
+
+    graph = _sync_graph
+    if graph is None:
+        with _graph_lock:
+            if _chain is None:
+                _chain = build_chain()
+                _summary_chain = build_summary_chain()
+            if _sync_graph is None:
+                _sync_graph = create_graph(
+                    checkpointer=get_sync_checkpointer(),
+                    chain=_chain,
+                    summary_chain=_summary_chain,
+                    response_cache=get_response_cache(),
+                )
+            graph = _sync_graph
+
+    return graph
+
+
+def swap_graph(prompt: Optional[ChatPromptTemplate] = None, model: Optional[BaseChatModel] = None) -> CompiledStateGraph:
+    """
+    Hot-swaps the shared graph for one built with a new prompt and/or model.
+
+    The replacement is fully compiled before it is published, so turns already running keep
+    the graph they started with and new turns pick up the new one. Cached replies are dropped.
+
+    Args:
+    ----
+    prompt : Optional[ChatPromptTemplate]
+        The new prompt. Defaults to `harry_prompt`.
+
+    model : Optional[BaseChatModel]
+        The new chat model. Defaults to the configured Gemini model.
+
+    Returns:
+    -------
+    CompiledStateGraph
+        The newly published graph.
+    """
+    global _chain, _summary_chain, _graph, _sync_graph
+
+    chain = build_chain(prompt, model)
+    summary_chain = build_summary_chain(model)
+    response_cache = get_response_cache()
+    graph = create_graph(
+        checkpointer=get_checkpointer(), chain=chain, summary_chain=summary_chain, response_cache=response_cache
+    )
+    with _graph_lock:
+        _chain = chain
+        _summary_chain = summary_chain
+        _graph = graph
+        _sync_graph = None
+
+    if response_cache is not None:
+        response_cache.clear()
+
+    return graph
+
+
+def reset_graph() -> None:
+    """
+    Drops the shared graph so the next turn compiles it again, e.g. after the checkpointer is closed.
+    """
+    global _chain, _summary_chain, _graph, _sync_graph
+
+    with _graph_lock:
+        _chain = None
+        _summary_chain = None
+        _graph = None
+        _sync_graph = None
+
+
+@traced("harry.answer")
+def get_harry_answer(query: str, thread_id: str, bypass_cache: bool = False):
+
+    graph = get_sync_graph()
+    config = {"configurable": {"thread_id": thread_id, "bypass_cache": bypass_cache}}
+    res = graph.invoke({"messages": [("human", query)]}, config)
 
     return res["messages"][-1].content
 
 
+@traced("harry.answer")
+async def aget_harry_answer(
+    query: str,
+    thread_id: str,
+    bypass_cache: bool = False,
+    user_id: Optional[str] = None,
+    deadline: Optional[float] = None,
+) -> str:
+    """
+    Asynchronously generates Harry's answer to a query within a conversation thread.
+
+    The graph runs through `ainvoke`, so both the Gemini call and the checkpoint I/O are
+    awaited natively instead of blocking the event loop.
+
+    Args:
+    ----
+    query : str
+        The user's message.
+
+    thread_id : str
+        The conversation thread, usually the chat ID.
+
+    bypass_cache : bool
+        Always ask the model, even if the response cache holds a reply to this query.
+
+    user_id : Optional[str]
+        The user asking, whose concurrent model calls are limited by the LLM gateway.
+
+    deadline : Optional[float]
+        The `time.time()` by which the reply is due; past it, the model is not waited for.
+
+    Returns:
+    -------
+    str
+        Harry's reply.
+
+    Raises:
+    ------
+    LLMUnavailableError
+        If the model could not answer. The error carries a fallback reply, which is not stored
+        in the thread.
+    """
+
+    graph = get_graph()
+    config = {
+        "configurable": {
+            "thread_id": thread_id,
+            "bypass_cache": bypass_cache,
+            "user_id": user_id,
+            "deadline": deadline,
+        }
+    }
+    res = await graph.ainvoke({"messages": [("human", query)]}, config)
+
+    return res["messages"][-1].content
+
+
+@traced("harry.answer")
+async def astream_harry_answer(
+    query: str,
+    thread_id: str,
+    bypass_cache: bool = False,
+    user_id: Optional[str] = None,
+    deadline: Optional[float] = None,
+) -> AsyncIterator[Tuple[str, str]]:
+    """
+    Streams Harry's answer to a query as it is being generated.
+
+    The graph runs through `astream` in "messages" mode to forward the model's tokens as
+    they arrive, and in "values" mode to pick up the final reply stored in the checkpoint.
+
+    Args:
+    ----
+    query : str
+        The user's message.
+
+    thread_id : str
+        The conversation thread, usually the chat ID.
+
+    bypass_cache : bool
+        Always ask the model, even if the response cache holds a reply to this query.
+
+    user_id : Optional[str]
+        The user asking, whose concurrent model calls are limited by the LLM gateway.
+
+    deadline : Optional[float]
+        The `time.time()` by which the reply is due; past it, the model is not waited for.
+
+    Yields:
+    ------
+    Tuple[str, str]
+        `("delta", text)` for every generated chunk, then a single `("end", reply)` with
+        the complete reply.
+
+    Raises:
+    ------
+    LLMUnavailableError
+        If the model could not answer, possibly after some deltas were yielded. The error
+        carries a fallback reply, which is not stored in the thread.
+    """
+
+    graph = get_graph()
+    config = {
+        "configurable": {
+            "thread_id": thread_id,
+            "bypass_cache": bypass_cache,
+            "user_id": user_id,
+            "deadline": deadline,
+            "streaming": True,
+        }
+    }
+    final_state = None
 
+    async for mode, payload in graph.astream(
+        {"messages": [("human", query)]}, config, stream_mode=["messages", "values"]
+    ):
+        if mode == "values":
+            final_state = payload
+            continue
 
+        chunk, metadata = payload
+        if (
+            metadata.get("langgraph_node") == "harry"
+            and isinstance(chunk, AIMessageChunk)
+            and isinstance(chunk.content, str)
+            and chunk.content
+        ):
+            yield "delta", chunk.content
 
+    yield "end", final_state["messages"][-1].content
@@ -0,0 +1,59 @@
+import importlib
+import logging
+import sys
+import time
+from llm.executor import run_in_executor, shutdown_llm_executor
+
+logger = logging.getLogger(__name__)
+
+_warm = False
+
+
+def _load() -> float:
+    started = time.perf_counter()
+
+    harry = importlib.import_module("llm.harry")
+    harry.get_llm()
+    harry.init_graph()
+
+    return time.perf_counter() - started
+
+
+async def warmup() -> None:
+    """
+    Imports the LLM stack and compiles Harry's graph ahead of the first chat turn.
+
+    The imports and the client construction run in the LLM executor, so the event loop keeps
+    serving health checks and the other routes meanwhile. Without a warmup, the first turn
+    pays for them instead.
+    """
+    global _warm
+
+    if _warm:
+        return
+
+    elapsed = await run_in_executor(_load)
+    _warm = True
+    logger.info("LLM stack ready in %.2fs", elapsed)
+
+
+def is_warm() -> bool:
+    """
+    Returns whether the LLM stack was loaded, by the startup warmup or by the first chat turn.
+    """
+    return _warm
+
+
+def shutdown_llm() -> None:
+    """
+    Releases the graphs, checkpointers and the LLM executor, without importing the parts of
+    the LLM stack that were never loaded.
+    """
+    global _warm
+
+    shutdown_llm_executor()
+    if "llm.harry" in sys.modules:
+        sys.modules["llm.harry"].reset_graph()
+    if "llm.checkpointer" in sys.modules:
+        sys.modules["llm.checkpointer"].close_checkpointer()
+    _warm = False
@@ -1,5 +1,7 @@
+import threading
+from collections import OrderedDict
 from contextlib import asynccontextmanager, contextmanager
-from typing import Any, AsyncIterator, Dict, Iterator, Optional, Sequence, Tuple
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
 from langchain_core.runnables import RunnableConfig
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 from pymongo import MongoClient, UpdateOne
@@ -14,49 +16,47 @@ from langgraph.checkpoint.base import (
     CheckpointTuple,
     get_checkpoint_id,
 )
+from enums import DataBaseEnum
+from helpers.tracing import traced
+from llm.codecs import CodecRegistry, CheckpointCodec
+from llm.executor import run_in_executor
 
 
-class MongoDBSaver(BaseCheckpointSaver):
-    """A checkpoint saver that stores checkpoints in a MongoDB database."""
+# Number of conversation threads whose latest checkpoint is remembered to write deltas.
+MAX_TRACKED_THREADS = 10000
 
-    client: MongoClient
-    db: MongoDatabase
 
-    def __init__(
-        self,
-        client: MongoClient,
-        db_name: str,
-    ) -> None:
-        super().__init__()
-        self.client = client
-        self.db = self.client[db_name]
+class BaseMongoDBSaver(BaseCheckpointSaver):
+    """Shared query building and (de)serialization for the MongoDB checkpoint savers.
 
-    @classmethod
-    @contextmanager
-    def from_conn_info(
-        cls, *, url: str, db_name: str
-    ) -> Iterator["MongoDBSaver"]:
-        client = None
-        try:
-            client = MongoClient(url)
-            yield MongoDBSaver(client, db_name)
-        finally:
-            if client:
-                client.close()
+    Subclasses only perform the database I/O, so the sync and async savers read and write
+    exactly the same documents.
 
-    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
-        """Get a checkpoint tuple from the database.
+    Checkpoints are stored either as full snapshots or, when `snapshot_interval` is greater
+    than 1, as deltas: the checkpoint without its message list, plus the messages appended
+    (and the number dropped from the front) since the parent checkpoint. Every delta points
+    at the snapshot its chain starts from, and a new snapshot is written at least every
+    `snapshot_interval` checkpoints. Documents without a `storage` field are legacy snapshots.
 
-        This method retrieves a checkpoint tuple from the MongoDB database based on the
-        provided config. If the config contains a "checkpoint_id" key, the checkpoint with
-        the matching thread ID and checkpoint ID is retrieved. Otherwise, the latest checkpoint
-        for the given thread ID is retrieved.
+    Serialized blobs go through the `codecs` registry (e.g. zstd) before being stored, and
+    each document records the codec it was written with; documents without one are raw.
+    """
+
+    def __init__(self, *, snapshot_interval: int = 1, codecs: Optional[CodecRegistry] = None) -> None:
+        super().__init__()
+        self.snapshot_interval = snapshot_interval
+        self.codecs = codecs or CodecRegistry(CheckpointCodec())
+        self._heads: OrderedDict = OrderedDict()
+        self._heads_lock = threading.Lock()
+
+    def _get_tuple_query(self, config: RunnableConfig) -> Tuple[str, str, Dict[str, Any]]:
+        """Build the query used to look up a single checkpoint.
 
         Args:
             config (RunnableConfig): The config to use for retrieving the checkpoint.
 
         Returns:
-            Optional[CheckpointTuple]: The retrieved checkpoint tuple, or None if no matching checkpoint was found.
+            Tuple[str, str, Dict[str, Any]]: The thread ID, checkpoint namespace and query.
         """
         thread_id = config["configurable"]["thread_id"]
         checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
@@ -69,62 +69,243 @@ class MongoDBSaver(BaseCheckpointSaver):
         else:
             query = {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}
 
-        result = self.db["checkpoints"].find(query).sort("checkpoint_id", -1).limit(1)
-        for doc in result:
-            config_values = {
-                "thread_id": thread_id,
-                "checkpoint_ns": checkpoint_ns,
-                "checkpoint_id": doc["checkpoint_id"],
-            }
-            checkpoint = self.serde.loads_typed((doc["type"], doc["checkpoint"]))
-            serialized_writes = self.db["checkpoint_writes"].find(config_values)
-            pending_writes = [
-                (
-                    doc["task_id"],
-                    doc["channel"],
-                    self.serde.loads_typed((doc["type"], doc["value"])),
-                )
-                for doc in serialized_writes
-            ]
-            return CheckpointTuple(
-                {"configurable": config_values},
-                checkpoint,
-                self.serde.loads(doc["metadata"]),
-                (
-                    {
-                        "configurable": {
-                            "thread_id": thread_id,
-                            "checkpoint_ns": checkpoint_ns,
-                            "checkpoint_id": doc["parent_checkpoint_id"],
-                        }
-                    }
-                    if doc.get("parent_checkpoint_id")
-                    else None
-                ),
-                pending_writes,
+        return thread_id, checkpoint_ns, query
+
+    def _load_checkpoint_tuple(
+        self,
+        doc: Dict[str, Any],
+        serialized_writes: List[Dict[str, Any]],
+        chain: Sequence[Dict[str, Any]] = (),
+    ) -> CheckpointTuple:
+        """Turn a checkpoint document and its writes into a checkpoint tuple.
+
+        Args:
+            doc (Dict[str, Any]): The checkpoint document.
+            serialized_writes (List[Dict[str, Any]]): The pending write documents of the checkpoint.
+            chain (Sequence[Dict[str, Any]]): The documents matched by `_chain_query` when the checkpoint is a delta.
+
+        Returns:
+            CheckpointTuple: The deserialized checkpoint tuple.
+        """
+        config_values = {
+            "thread_id": doc["thread_id"],
+            "checkpoint_ns": doc["checkpoint_ns"],
+            "checkpoint_id": doc["checkpoint_id"],
+        }
+        checkpoint = self._restore_checkpoint(doc, chain)
+        pending_writes = [
+            (
+                write["task_id"],
+                write["channel"],
+                self._loads(write, "type", "value"),
             )
+            for write in serialized_writes
+        ]
+        return CheckpointTuple(
+            {"configurable": config_values},
+            checkpoint,
+            self.serde.loads(doc["metadata"]),
+            self._parent_config(doc),
+            pending_writes,
+        )
 
-    def list(
+    def _load_listed_tuple(self, doc: Dict[str, Any], chain: Sequence[Dict[str, Any]] = ()) -> CheckpointTuple:
+        """Turn a checkpoint document returned by a listing into a checkpoint tuple.
+
+        Args:
+            doc (Dict[str, Any]): The checkpoint document.
+            chain (Sequence[Dict[str, Any]]): The documents matched by `_chain_query` when the checkpoint is a delta.
+
+        Returns:
+            CheckpointTuple: The deserialized checkpoint tuple, without pending writes.
+        """
+        checkpoint = self._restore_checkpoint(doc, chain)
+        return CheckpointTuple(
+            {
+                "configurable": {
+                    "thread_id": doc["thread_id"],
+                    "checkpoint_ns": doc["checkpoint_ns"],
+                    "checkpoint_id": doc["checkpoint_id"],
+                }
+            },
+            checkpoint,
+            self.serde.loads(doc["metadata"]),
+            self._parent_config(doc),
+        )
+
+    @staticmethod
+    def _chain_query(doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Build the query that fetches the documents needed to rebuild a delta checkpoint.
+
+        Args:
+            doc (Dict[str, Any]): The checkpoint document.
+
+        Returns:
+            Optional[Dict[str, Any]]: The query, or None if the document is a snapshot.
+        """
+        if doc.get("storage") != "delta":
+            return None
+
+        return {
+            "thread_id": doc["thread_id"],
+            "checkpoint_ns": doc["checkpoint_ns"],
+            "checkpoint_id": {"$gte": doc["snapshot_id"], "$lt": doc["checkpoint_id"]},
+        }
+
+    def _restore_checkpoint(self, doc: Dict[str, Any], chain: Sequence[Dict[str, Any]]) -> Checkpoint:
+        """Deserialize a checkpoint, replaying its delta chain from the nearest snapshot if needed.
+
+        Args:
+            doc (Dict[str, Any]): The checkpoint document.
+            chain (Sequence[Dict[str, Any]]): The documents matched by `_chain_query`.
+
+        Returns:
+            Checkpoint: The full checkpoint.
+        """
+        checkpoint = self._loads(doc, "type", "checkpoint")
+        if doc.get("storage") != "delta":
+            return checkpoint
+
+        by_id = {link["checkpoint_id"]: link for link in chain}
+        deltas = []
+        current = doc
+        while current.get("storage") == "delta":
+            deltas.append(current)
+            current = by_id.get(current.get("parent_checkpoint_id"))
+            if current is None:
+                raise ValueError(f"Checkpoint {doc['checkpoint_id']} is missing part of its delta chain")
+
+        snapshot = self._loads(current, "type", "checkpoint")
+        messages = list(snapshot["channel_values"].get("messages", []))
+        for delta in reversed(deltas):
+            messages = messages[delta["drop"]:] + list(self._loads(delta, "delta_type", "delta"))
+
+        checkpoint["channel_values"]["messages"] = messages
+        return checkpoint
+
+    def _dumps(self, value: Any) -> Tuple[str, bytes]:
+        type_, serialized = self.serde.dumps_typed(value)
+        return type_, self.codecs.writer.encode(serialized)
+
+    def _loads(self, doc: Dict[str, Any], type_field: str, data_field: str) -> Any:
+        data = self.codecs.reader(doc.get("codec")).decode(doc[data_field])
+        return self.serde.loads_typed((doc[type_field], data))
+
+    @staticmethod
+    def _message_keys(messages: Any) -> Optional[Tuple[Tuple[str, int], ...]]:
+        # Messages are keyed by ID and content, so a message replaced under the same ID
+        # is not mistaken for the one already stored.
+        if not isinstance(messages, list):
+            return None
+
+        keys = []
+        for message in messages:
+            message_id = getattr(message, "id", None)
+            if message_id is None:
+                return None
+            keys.append((message_id, hash(str(message.content))))
+
+        return tuple(keys)
+
+    @staticmethod
+    def _dropped_prefix(parent_keys: Tuple[Any, ...], keys: Tuple[Any, ...]) -> Optional[int]:
+        """Find how many messages were dropped from the front of the parent's list.
+
+        Returns:
+            Optional[int]: The number of dropped messages, or None if the new list is not
+            the parent's list minus a prefix plus appended messages.
+        """
+        if not parent_keys:
+            return 0
+
+        drop = parent_keys.index(keys[0]) if keys and keys[0] in parent_keys else len(parent_keys)
+        kept = parent_keys[drop:]
+        if keys[:len(kept)] != kept:
+            return None
+
+        return drop
+
+    def _plan_delta(
         self,
-        config: Optional[RunnableConfig],
-        *,
-        filter: Optional[Dict[str, Any]] = None,
-        before: Optional[RunnableConfig] = None,
-        limit: Optional[int] = None,
-    ) -> Iterator[CheckpointTuple]:
-        """List checkpoints from the database.
+        thread_key: Tuple[str, str],
+        parent_id: Optional[str],
+        checkpoint_id: str,
+        messages: Any,
+    ) -> Optional[Tuple[str, int, int, List[Any]]]:
+        """Decide whether a checkpoint can be stored as a delta of its parent.
 
-        This method retrieves a list of checkpoint tuples from the MongoDB database based
-        on the provided config. The checkpoints are ordered by checkpoint ID in descending order (newest first).
+        Deltas are only written when the parent is the last checkpoint this saver wrote for
+        the thread; anything else (another process, a fork, a restart) starts a new snapshot.
+
+        Returns:
+            Optional[Tuple[str, int, int, List[Any]]]: The snapshot ID, depth in the chain,
+            number of dropped messages and appended messages, or None to write a snapshot.
+        """
+        keys = self._message_keys(messages)
+        plan = None
+
+        with self._heads_lock:
+            head = self._heads.get(thread_key)
+            if (
+                self.snapshot_interval > 1
+                and keys is not None
+                and head is not None
+                and head["checkpoint_id"] == parent_id
+                and head["depth"] + 1 < self.snapshot_interval
+            ):
+                drop = self._dropped_prefix(head["message_keys"], keys)
+                if drop is not None:
+                    kept = len(head["message_keys"]) - drop
+                    plan = (head["snapshot_id"], head["depth"] + 1, drop, messages[kept:])
+
+            self._heads[thread_key] = {
+                "checkpoint_id": checkpoint_id,
+                "message_keys": keys or (),
+                "snapshot_id": plan[0] if plan else checkpoint_id,
+                "depth": plan[1] if plan else 0,
+            }
+            self._heads.move_to_end(thread_key)
+            if len(self._heads) > MAX_TRACKED_THREADS:
+                self._heads.popitem(last=False)
+
+        return plan
+
+    @staticmethod
+    def _parent_config(doc: Dict[str, Any]) -> Optional[RunnableConfig]:
+        if not doc.get("parent_checkpoint_id"):
+            return None
+
+        return {
+            "configurable": {
+                "thread_id": doc["thread_id"],
+                "checkpoint_ns": doc["checkpoint_ns"],
+                "checkpoint_id": doc["parent_checkpoint_id"],
+            }
+        }
+
+    @staticmethod
+    def _writes_query(doc: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "thread_id": doc["thread_id"],
+            "checkpoint_ns": doc["checkpoint_ns"],
+            "checkpoint_id": doc["checkpoint_id"],
+        }
+
+    def _list_query(
+        self,
+        config: Optional[RunnableConfig],
+        filter: Optional[Dict[str, Any]],
+        before: Optional[RunnableConfig],
+    ) -> Dict[str, Any]:
+        """Build the query used to list checkpoints.
 
         Args:
             config (RunnableConfig): The config to use for listing the checkpoints.
-            filter (Optional[Dict[str, Any]]): Additional filtering criteria for metadata. Defaults to None.
-            before (Optional[RunnableConfig]): If provided, only checkpoints before the specified checkpoint ID are returned. Defaults to None.
-            limit (Optional[int]): The maximum number of checkpoints to return. Defaults to None.
+            filter (Optional[Dict[str, Any]]): Additional filtering criteria for metadata.
+            before (Optional[RunnableConfig]): If provided, only checkpoints before the specified checkpoint ID are matched.
 
-        Yields:
-            Iterator[CheckpointTuple]: An iterator of checkpoint tuples.
+        Returns:
+            Dict[str, Any]: The query.
         """
         query = {}
         if config is not None:
@@ -140,95 +321,95 @@ class MongoDBSaver(BaseCheckpointSaver):
         if before is not None:
             query["checkpoint_id"] = {"$lt": before["configurable"]["checkpoint_id"]}
 
-        result = self.db["checkpoints"].find(query).sort("checkpoint_id", -1)
+        return query
 
-        if limit is not None:
-            result = result.limit(limit)
-        for doc in result:
-            checkpoint = self.serde.loads_typed((doc["type"], doc["checkpoint"]))
-            yield CheckpointTuple(
-                {
-                    "configurable": {
-                        "thread_id": doc["thread_id"],
-                        "checkpoint_ns": doc["checkpoint_ns"],
-                        "checkpoint_id": doc["checkpoint_id"],
-                    }
-                },
-                checkpoint,
-                self.serde.loads(doc["metadata"]),
-                (
-                    {
-                        "configurable": {
-                            "thread_id": doc["thread_id"],
-                            "checkpoint_ns": doc["checkpoint_ns"],
-                            "checkpoint_id": doc["parent_checkpoint_id"],
-                        }
-                    }
-                    if doc.get("parent_checkpoint_id")
-                    else None
-                ),
-            )
-
-    def put(
+    def _dump_checkpoint(
         self,
         config: RunnableConfig,
         checkpoint: Checkpoint,
         metadata: CheckpointMetadata,
-        new_versions: ChannelVersions,
-    ) -> RunnableConfig:
-        """Save a checkpoint to the database.
-
-        This method saves a checkpoint to the MongoDB database. The checkpoint is associated
-        with the provided config and its parent config (if any).
+    ) -> Tuple[Dict[str, Any], Dict[str, Any], RunnableConfig]:
+        """Serialize a checkpoint into the upsert query and document that store it.
 
         Args:
             config (RunnableConfig): The config to associate with the checkpoint.
             checkpoint (Checkpoint): The checkpoint to save.
             metadata (CheckpointMetadata): Additional metadata to save with the checkpoint.
-            new_versions (ChannelVersions): New channel versions as of this write.
 
         Returns:
-            RunnableConfig: Updated configuration after storing the checkpoint.
+            Tuple[Dict[str, Any], Dict[str, Any], RunnableConfig]: The upsert query, the document
+            and the config pointing at the stored checkpoint.
         """
         thread_id = config["configurable"]["thread_id"]
         checkpoint_ns = config["configurable"]["checkpoint_ns"]
         checkpoint_id = checkpoint["id"]
-        type_, serialized_checkpoint = self.serde.dumps_typed(checkpoint)
-        doc = {
-            "parent_checkpoint_id": config["configurable"].get("checkpoint_id"),
-            "type": type_,
-            "checkpoint": serialized_checkpoint,
-            "metadata": self.serde.dumps(metadata),
-        }
+        parent_checkpoint_id = config["configurable"].get("checkpoint_id")
+        channel_values = checkpoint["channel_values"]
+
+        plan = self._plan_delta(
+            (thread_id, checkpoint_ns), parent_checkpoint_id, checkpoint_id, channel_values.get("messages")
+        )
+        if plan is None:
+            type_, serialized_checkpoint = self._dumps(checkpoint)
+            doc = {
+                "parent_checkpoint_id": parent_checkpoint_id,
+                "type": type_,
+                "checkpoint": serialized_checkpoint,
+                "metadata": self.serde.dumps(metadata),
+                "storage": "snapshot",
+                "snapshot_id": checkpoint_id,
+                "depth": 0,
+            }
+        else:
+            snapshot_id, depth, drop, appended = plan
+            stripped = {
+                **checkpoint,
+                "channel_values": {key: value for key, value in channel_values.items() if key != "messages"},
+            }
+            type_, serialized_checkpoint = self._dumps(stripped)
+            delta_type, serialized_delta = self._dumps(appended)
+            doc = {
+                "parent_checkpoint_id": parent_checkpoint_id,
+                "type": type_,
+                "checkpoint": serialized_checkpoint,
+                "metadata": self.serde.dumps(metadata),
+                "storage": "delta",
+                "snapshot_id": snapshot_id,
+                "depth": depth,
+                "drop": drop,
+                "delta_type": delta_type,
+                "delta": serialized_delta,
+            }
+        doc["codec"] = self.codecs.writer.name
         upsert_query = {
             "thread_id": thread_id,
             "checkpoint_ns": checkpoint_ns,
             "checkpoint_id": checkpoint_id,
         }
-        # Perform your operations here
-        self.db["checkpoints"].update_one(upsert_query, {"$set": doc}, upsert=True)
-        return {
+        next_config = {
             "configurable": {
                 "thread_id": thread_id,
                 "checkpoint_ns": checkpoint_ns,
                 "checkpoint_id": checkpoint_id,
             }
         }
+        return upsert_query, doc, next_config
 
-    def put_writes(
+    def _dump_writes(
         self,
         config: RunnableConfig,
         writes: Sequence[Tuple[str, Any]],
         task_id: str,
-    ) -> None:
-        """Store intermediate writes linked to a checkpoint.
-
-        This method saves intermediate writes associated with a checkpoint to the MongoDB database.
+    ) -> List[UpdateOne]:
+        """Serialize intermediate writes into bulk upsert operations.
 
         Args:
             config (RunnableConfig): Configuration of the related checkpoint.
             writes (Sequence[Tuple[str, Any]]): List of writes to store, each as (channel, value) pair.
             task_id (str): Identifier for the task creating the writes.
+
+        Returns:
+            List[UpdateOne]: One upsert per write.
         """
         thread_id = config["configurable"]["thread_id"]
         checkpoint_ns = config["configurable"]["checkpoint_ns"]
@@ -242,7 +423,7 @@ class MongoDBSaver(BaseCheckpointSaver):
                 "task_id": task_id,
                 "idx": idx,
             }
-            type_, serialized_value = self.serde.dumps_typed(value)
+            type_, serialized_value = self._dumps(value)
             operations.append(
                 UpdateOne(
                     upsert_query,
@@ -251,9 +432,395 @@ class MongoDBSaver(BaseCheckpointSaver):
                             "channel": channel,
                             "type": type_,
                             "value": serialized_value,
+                            "codec": self.codecs.writer.name,
                         }
                     },
                     upsert=True,
                 )
             )
-        self.db["checkpoint_writes"].bulk_write(operations)
+        return operations
+
+
+class MongoDBSaver(BaseMongoDBSaver):
+    """A checkpoint saver that stores checkpoints in a MongoDB database."""
+
+    client: MongoClient
+    db: MongoDatabase
+
+    def __init__(
+        self,
+        client: MongoClient,
+        db_name: str,
+        snapshot_interval: int = 1,
+        codecs: Optional[CodecRegistry] = None,
+    ) -> None:
+        super().__init__(snapshot_interval=snapshot_interval, codecs=codecs)
+        self.client = client
+        self.db = self.client[db_name]
+        self.checkpoints = self.db[DataBaseEnum.CHECKPOINT_COLLECTION.value]
+        self.checkpoint_writes = self.db[DataBaseEnum.CHECKPOINT_WRITES_COLLECTION.value]
+
+    @classmethod
+    @contextmanager
+    def from_conn_info(
+        cls, *, url: str, db_name: str
+    ) -> Iterator["MongoDBSaver"]:
+        client = None
+        try:
+            client = MongoClient(url)
+            yield MongoDBSaver(client, db_name)
+        finally:
+            if client:
+                client.close()
+
+    @classmethod
+    def from_pool(
+        cls,
+        *,
+        url: str,
+        db_name: str,
+        snapshot_interval: int = 1,
+        codecs: Optional[CodecRegistry] = None,
+        **client_options: Any,
+    ) -> "MongoDBSaver":
+        """Create a saver that owns a long-lived, pooled MongoClient.
+
+        Unlike `from_conn_info`, the client is not closed when a turn ends; it is meant to be
+        created once per process and released with `close`.
+
+        Args:
+            url (str): The MongoDB connection URL.
+            db_name (str): The database that stores the checkpoints.
+            snapshot_interval (int): Write a full snapshot at least every this many checkpoints. 1 disables deltas.
+            codecs (Optional[CodecRegistry]): The codecs used to encode and decode blobs. Defaults to raw blobs.
+            **client_options: Pool size and timeout options passed to `MongoClient`.
+
+        Returns:
+            MongoDBSaver: The pooled saver.
+        """
+        return cls(MongoClient(url, **client_options), db_name, snapshot_interval, codecs)
+
+    def close(self) -> None:
+        """Close the underlying MongoClient and its connection pool."""
+        self.client.close()
+
+    def _find_chain(self, doc: Dict[str, Any]) -> List[Dict[str, Any]]:
+        query = self._chain_query(doc)
+        if query is None:
+            return []
+
+        return list(self.checkpoints.find(query, {"metadata": 0}))
+
+    @traced("checkpoint.get")
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Get a checkpoint tuple from the database.
+
+        This method retrieves a checkpoint tuple from the MongoDB database based on the
+        provided config. If the config contains a "checkpoint_id" key, the checkpoint with
+        the matching thread ID and checkpoint ID is retrieved. Otherwise, the latest checkpoint
+        for the given thread ID is retrieved.
+
+        Args:
+            config (RunnableConfig): The config to use for retrieving the checkpoint.
+
+        Returns:
+            Optional[CheckpointTuple]: The retrieved checkpoint tuple, or None if no matching checkpoint was found.
+        """
+        _, _, query = self._get_tuple_query(config)
+
+        result = self.checkpoints.find(query).sort("checkpoint_id", -1).limit(1)
+        for doc in result:
+            serialized_writes = list(self.checkpoint_writes.find(self._writes_query(doc)))
+            return self._load_checkpoint_tuple(doc, serialized_writes, self._find_chain(doc))
+
+    @traced("checkpoint.list")
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        """List checkpoints from the database.
+
+        This method retrieves a list of checkpoint tuples from the MongoDB database based
+        on the provided config. The checkpoints are ordered by checkpoint ID in descending order (newest first).
+
+        Args:
+            config (RunnableConfig): The config to use for listing the checkpoints.
+            filter (Optional[Dict[str, Any]]): Additional filtering criteria for metadata. Defaults to None.
+            before (Optional[RunnableConfig]): If provided, only checkpoints before the specified checkpoint ID are returned. Defaults to None.
+            limit (Optional[int]): The maximum number of checkpoints to return. Defaults to None.
+
+        Yields:
+            Iterator[CheckpointTuple]: An iterator of checkpoint tuples.
+        """
+        query = self._list_query(config, filter, before)
+
+        result = self.checkpoints.find(query).sort("checkpoint_id", -1)
+
+        if limit is not None:
+            result = result.limit(limit)
+        for doc in result:
+            yield self._load_listed_tuple(doc, self._find_chain(doc))
+
+    @traced("checkpoint.put")
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Save a checkpoint to the database.
+
+        This method saves a checkpoint to the MongoDB database. The checkpoint is associated
+        with the provided config and its parent config (if any).
+
+        Args:
+            config (RunnableConfig): The config to associate with the checkpoint.
+            checkpoint (Checkpoint): The checkpoint to save.
+            metadata (CheckpointMetadata): Additional metadata to save with the checkpoint.
+            new_versions (ChannelVersions): New channel versions as of this write.
+
+        Returns:
+            RunnableConfig: Updated configuration after storing the checkpoint.
+        """
+        upsert_query, doc, next_config = self._dump_checkpoint(config, checkpoint, metadata)
+        self.checkpoints.update_one(upsert_query, {"$set": doc}, upsert=True)
+        return next_config
+
+    @traced("checkpoint.put_writes")
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+    ) -> None:
+        """Store intermediate writes linked to a checkpoint.
+
+        This method saves intermediate writes associated with a checkpoint to the MongoDB database.
+
+        Args:
+            config (RunnableConfig): Configuration of the related checkpoint.
+            writes (Sequence[Tuple[str, Any]]): List of writes to store, each as (channel, value) pair.
+            task_id (str): Identifier for the task creating the writes.
+        """
+        operations = self._dump_writes(config, writes, task_id)
+        if operations:
+            self.checkpoint_writes.bulk_write(operations)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Get a checkpoint tuple from the database asynchronously.
+
+        The sync pymongo lookup runs in the bounded LLM executor so it never blocks
+        the event loop.
+
+        Args:
+            config (RunnableConfig): The config to use for retrieving the checkpoint.
+
+        Returns:
+            Optional[CheckpointTuple]: The retrieved checkpoint tuple, or None if no matching checkpoint was found.
+        """
+        return await run_in_executor(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        """List checkpoints from the database asynchronously.
+
+        The matching checkpoints are fetched in the bounded LLM executor and then yielded
+        newest first.
+
+        Args:
+            config (RunnableConfig): The config to use for listing the checkpoints.
+            filter (Optional[Dict[str, Any]]): Additional filtering criteria for metadata. Defaults to None.
+            before (Optional[RunnableConfig]): If provided, only checkpoints before the specified checkpoint ID are returned. Defaults to None.
+            limit (Optional[int]): The maximum number of checkpoints to return. Defaults to None.
+
+        Yields:
+            AsyncIterator[CheckpointTuple]: An async iterator of checkpoint tuples.
+        """
+        checkpoints = await run_in_executor(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for checkpoint in checkpoints:
+            yield checkpoint
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Save a checkpoint to the database asynchronously.
+
+        Args:
+            config (RunnableConfig): The config to associate with the checkpoint.
+            checkpoint (Checkpoint): The checkpoint to save.
+            metadata (CheckpointMetadata): Additional metadata to save with the checkpoint.
+            new_versions (ChannelVersions): New channel versions as of this write.
+
+        Returns:
+            RunnableConfig: Updated configuration after storing the checkpoint.
+        """
+        return await run_in_executor(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+    ) -> None:
+        """Store intermediate writes linked to a checkpoint asynchronously.
+
+        Args:
+            config (RunnableConfig): Configuration of the related checkpoint.
+            writes (Sequence[Tuple[str, Any]]): List of writes to store, each as (channel, value) pair.
+            task_id (str): Identifier for the task creating the writes.
+        """
+        await run_in_executor(self.put_writes, config, writes, task_id)
+
+
+class AsyncMongoDBSaver(BaseMongoDBSaver):
+    """A checkpoint saver that stores checkpoints in a MongoDB database through Motor.
+
+    Every operation is a native Motor coroutine, so checkpoint I/O runs on the event loop
+    without a thread hop. The saver only supports the async graph API (`ainvoke`, `astream`).
+    """
+
+    client: AsyncIOMotorClient
+    db: AsyncIOMotorDatabase
+
+    def __init__(
+        self,
+        client: AsyncIOMotorClient,
+        db_name: str,
+        snapshot_interval: int = 1,
+        codecs: Optional[CodecRegistry] = None,
+    ) -> None:
+        super().__init__(snapshot_interval=snapshot_interval, codecs=codecs)
+        self.client = client
+        self.db = self.client[db_name]
+        self.checkpoints = self.db[DataBaseEnum.CHECKPOINT_COLLECTION.value]
+        self.checkpoint_writes = self.db[DataBaseEnum.CHECKPOINT_WRITES_COLLECTION.value]
+
+    @classmethod
+    @asynccontextmanager
+    async def from_conn_info(
+        cls, *, url: str, db_name: str
+    ) -> AsyncIterator["AsyncMongoDBSaver"]:
+        client = None
+        try:
+            client = AsyncIOMotorClient(url)
+            yield AsyncMongoDBSaver(client, db_name)
+        finally:
+            if client:
+                client.close()
+
+    async def _find_chain(self, doc: Dict[str, Any]) -> List[Dict[str, Any]]:
+        query = self._chain_query(doc)
+        if query is None:
+            return []
+
+        return await self.checkpoints.find(query, {"metadata": 0}).to_list(length=None)
+
+    @traced("checkpoint.get")
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Get a checkpoint tuple from the database asynchronously.
+
+        If the config contains a "checkpoint_id" key, the checkpoint with the matching thread
+        ID and checkpoint ID is retrieved. Otherwise, the latest checkpoint for the given thread
+        ID is retrieved.
+
+        Args:
+            config (RunnableConfig): The config to use for retrieving the checkpoint.
+
+        Returns:
+            Optional[CheckpointTuple]: The retrieved checkpoint tuple, or None if no matching checkpoint was found.
+        """
+        _, _, query = self._get_tuple_query(config)
+
+        result = self.checkpoints.find(query).sort("checkpoint_id", -1).limit(1)
+        async for doc in result:
+            serialized_writes = await self.checkpoint_writes.find(self._writes_query(doc)).to_list(length=None)
+            return self._load_checkpoint_tuple(doc, serialized_writes, await self._find_chain(doc))
+
+    @traced("checkpoint.list")
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        """List checkpoints from the database asynchronously.
+
+        The checkpoints are ordered by checkpoint ID in descending order (newest first).
+
+        Args:
+            config (RunnableConfig): The config to use for listing the checkpoints.
+            filter (Optional[Dict[str, Any]]): Additional filtering criteria for metadata. Defaults to None.
+            before (Optional[RunnableConfig]): If provided, only checkpoints before the specified checkpoint ID are returned. Defaults to None.
+            limit (Optional[int]): The maximum number of checkpoints to return. Defaults to None.
+
+        Yields:
+            AsyncIterator[CheckpointTuple]: An async iterator of checkpoint tuples.
+        """
+        query = self._list_query(config, filter, before)
+
+        result = self.checkpoints.find(query).sort("checkpoint_id", -1)
+
+        if limit is not None:
+            result = result.limit(limit)
+        async for doc in result:
+            yield self._load_listed_tuple(doc, await self._find_chain(doc))
+
+    @traced("checkpoint.put")
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Save a checkpoint to the database asynchronously.
+
+        Args:
+            config (RunnableConfig): The config to associate with the checkpoint.
+            checkpoint (Checkpoint): The checkpoint to save.
+            metadata (CheckpointMetadata): Additional metadata to save with the checkpoint.
+            new_versions (ChannelVersions): New channel versions as of this write.
+
+        Returns:
+            RunnableConfig: Updated configuration after storing the checkpoint.
+        """
+        upsert_query, doc, next_config = self._dump_checkpoint(config, checkpoint, metadata)
+        await self.checkpoints.update_one(upsert_query, {"$set": doc}, upsert=True)
+        return next_config
+
+    @traced("checkpoint.put_writes")
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+    ) -> None:
+        """Store intermediate writes linked to a checkpoint asynchronously.
+
+        Args:
+            config (RunnableConfig): Configuration of the related checkpoint.
+            writes (Sequence[Tuple[str, Any]]): List of writes to store, each as (channel, value) pair.
+            task_id (str): Identifier for the task creating the writes.
+        """
+        operations = self._dump_writes(config, writes, task_id)
+        if operations:
+            await self.checkpoint_writes.bulk_write(operations)
@@ -21,3 +21,27 @@ harry_prompt = ChatPromptTemplate([
 
         MessagesPlaceholder(variable_name="messages")
 ])
+
+
+summary_prompt = ChatPromptTemplate([
+        ("system", """You keep the memory of a long conversation between a user and Harry Potter.
+        Write a compact summary of the conversation in the third person: who the user is, what they told Harry about themselves
+        (their name, house, favourite spells and so on), the topics discussed and any questions still left open.
+        Keep names and facts exact, drop greetings and small talk, and never write more than a short paragraph.
+"""),
+
+        MessagesPlaceholder(variable_name="messages"),
+
+        ("human", """Here is the summary of everything that came before the messages above:
+{summary}
+
+Update the summary so it also covers the messages above. Reply with the summary only."""),
+])
+
+
+# Replies sent in Harry's voice when the model cannot answer in time.
+fallback_replies = [
+    "Blimey, my owl seems to have got lost on the way 🦉 Could you ask me that again in a moment?",
+    "Sorry, Peeves is causing havoc in the corridors and I didn't catch that. Mind saying it again in a bit?",
+    "Hang on, Hermione's dragged me off to the library 📚 Give me a moment and ask me again?",
+]
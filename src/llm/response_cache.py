@@ -0,0 +1,251 @@
+import logging
+import re
+import threading
+import time
+from typing import Optional
+from helpers import get_settings, TTLCache, register_metrics
+from llm.executor import run_in_executor
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; without it only the exact-match tier is used.
+    np = None
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:  # sentence-transformers is optional; without it only the exact-match tier is used.
+    SentenceTransformer = None
+
+# Cumulative counters of the response cache since the process started.
+response_cache_metrics = {
+    "lookups": 0,
+    "exact_hits": 0,
+    "semantic_hits": 0,
+    "misses": 0,
+    "stores": 0,
+    "bypassed": 0,
+}
+register_metrics("response_cache", response_cache_metrics)
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    """
+    Normalizes a prompt for exact matching: case, punctuation and spacing are ignored.
+
+    Args:
+    ----
+    text : str
+        The prompt.
+
+    Returns:
+    -------
+    str
+        The normalized prompt.
+    """
+    return _WHITESPACE.sub(" ", _PUNCTUATION.sub(" ", text.lower())).strip()
+
+
+class VectorIndex:
+    """
+    A fixed-capacity in-memory index of unit vectors, searched by cosine similarity with NumPy.
+
+    When full, the oldest entry is overwritten. Expired entries are skipped by searches.
+    """
+
+    def __init__(self, capacity: int, ttl: float):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._vectors = None
+        self._expires = np.zeros(capacity)
+        self._responses: list[Optional[str]] = [None] * capacity
+        self._size = 0
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def add(self, vector, response: str) -> None:
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.capacity, len(vector)), dtype=np.float32)
+
+            self._vectors[self._next] = vector
+            self._expires[self._next] = time.monotonic() + self.ttl
+            self._responses[self._next] = response
+            self._next = (self._next + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+
+    def search(self, vector, threshold: float) -> Optional[str]:
+        with self._lock:
+            if self._size == 0:
+                return None
+
+            similarities = self._vectors[:self._size] @ vector
+            similarities[self._expires[:self._size] <= time.monotonic()] = -1.0
+            best = int(np.argmax(similarities))
+            if similarities[best] < threshold:
+                return None
+
+            return self._responses[best]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._size = 0
+            self._next = 0
+            self._responses = [None] * self.capacity
+
+
+class ResponseCache:
+    """
+    Caches Harry's replies to context-free prompts such as greetings and canned questions.
+
+    Lookups try an exact match on the normalized prompt first, then, if an embedding model is
+    configured, the most similar cached prompt above `threshold`. Entries expire after `ttl`.
+
+    Prompts that normalize to nothing, e.g. only emojis or punctuation, are never cached: they
+    would all share the empty key and get the reply to whichever of them came first.
+
+    Attributes:
+    ----------
+    threshold : float
+        The minimum cosine similarity of a semantic hit.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, threshold: float = 0.92, embedding_model: str = ""):
+        self.threshold = threshold
+        self._exact = TTLCache(maxsize, ttl)
+        self._model = None
+        self._index = None
+
+        if embedding_model:
+            if np is None or SentenceTransformer is None:
+                logger.warning("numpy and sentence-transformers are required for the semantic response cache")
+            else:
+                self._model = SentenceTransformer(embedding_model, device="cpu")
+                self._index = VectorIndex(maxsize, ttl)
+
+    def _embed(self, text: str):
+        return self._model.encode(text, normalize_embeddings=True).astype(np.float32)
+
+    def lookup(self, prompt: str) -> Optional[str]:
+        """
+        Returns the cached reply to `prompt`, or None. Prompts that normalize to nothing are not
+        looked up.
+
+        Args:
+        ----
+        prompt : str
+            The user's message.
+
+        Returns:
+        -------
+        Optional[str]
+            The cached reply.
+        """
+        key = normalize(prompt)
+        if not key:
+            return None
+
+        response_cache_metrics["lookups"] += 1
+
+        response = self._exact.get(key)
+        if response is not None:
+            response_cache_metrics["exact_hits"] += 1
+            return response
+
+        if self._index is not None:
+            response = self._index.search(self._embed(prompt), self.threshold)
+            if response is not None:
+                response_cache_metrics["semantic_hits"] += 1
+                return response
+
+        response_cache_metrics["misses"] += 1
+        return None
+
+    def store(self, prompt: str, response: str) -> None:
+        """
+        Caches the reply to `prompt`, unless the prompt normalizes to nothing.
+
+        Args:
+        ----
+        prompt : str
+            The user's message.
+
+        response : str
+            Harry's reply.
+        """
+        key = normalize(prompt)
+        if not key:
+            return
+
+        response_cache_metrics["stores"] += 1
+
+        self._exact.set(key, response)
+        if self._index is not None:
+            self._index.add(self._embed(prompt), response)
+
+    async def alookup(self, prompt: str) -> Optional[str]:
+        """
+        Like `lookup`, computing the embedding in the LLM executor.
+        """
+        if self._index is None:
+            return self.lookup(prompt)
+
+        return await run_in_executor(self.lookup, prompt)
+
+    async def astore(self, prompt: str, response: str) -> None:
+        """
+        Like `store`, computing the embedding in the LLM executor.
+        """
+        if self._index is None:
+            self.store(prompt, response)
+        else:
+            await run_in_executor(self.store, prompt, response)
+
+    def clear(self) -> None:
+        """
+        Drops every cached reply, e.g. when the prompt or model changes.
+        """
+        self._exact.clear()
+        if self._index is not None:
+            self._index.clear()
+
+
+def response_cache_hit_rate() -> float:
+    """
+    Returns the share of lookups answered from the cache since the process started.
+
+    Returns:
+    -------
+    float
+        The hit rate, between 0 and 1.
+    """
+    lookups = response_cache_metrics["lookups"]
+    if not lookups:
+        return 0.0
+
+    return (response_cache_metrics["exact_hits"] + response_cache_metrics["semantic_hits"]) / lookups
+
+
+def create_response_cache() -> Optional[ResponseCache]:
+    """
+    Builds the response cache configured by the `RESPONSE_CACHE_*` settings.
+
+    Returns:
+    -------
+    Optional[ResponseCache]
+        The cache, or None if `RESPONSE_CACHE_ENABLED` is off.
+    """
+    settings = get_settings()
+    if not settings.RESPONSE_CACHE_ENABLED:
+        return None
+
+    return ResponseCache(
+        settings.RESPONSE_CACHE_SIZE,
+        settings.RESPONSE_CACHE_TTL_SECONDS,
+        settings.RESPONSE_CACHE_SIMILARITY,
+        settings.RESPONSE_CACHE_EMBEDDING_MODEL,
+    )
@@ -0,0 +1,324 @@
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from helpers import get_settings, get_mongo_client_options, register_metrics
+from enums import DataBaseEnum
+
+logger = logging.getLogger(__name__)
+
+# Cumulative counters of the retention job since the process started.
+retention_metrics = {
+    "runs": 0,
+    "checkpoints_deleted": 0,
+    "writes_deleted": 0,
+    "bytes_reclaimed": 0,
+    "skipped": 0,
+    "last_run_seconds": 0.0,
+}
+register_metrics("retention", retention_metrics)
+
+# The lease that elects the one worker running the background retention job.
+RETENTION_LEASE = "checkpoint_retention"
+
+
+async def _delete(collection: AsyncIOMotorCollection, query: dict) -> int:
+    result = await collection.delete_many(query)
+    return result.deleted_count
+
+
+async def _average_size(db: AsyncIOMotorDatabase, collection: str) -> float:
+    # collStats reads the collection's metadata, so the estimate costs one command per pass.
+    try:
+        stats = await db.command("collStats", collection)
+    except PyMongoError as e:
+        logger.warning("Could not read the stats of %s: %s", collection, e)
+        return 0.0
+
+    return float(stats.get("avgObjSize", 0))
+
+
+async def acquire_lease(db: AsyncIOMotorDatabase, name: str, owner: str, ttl_seconds: float) -> bool:
+    """
+    Takes or renews a lease, so that only one worker among all processes runs a job.
+
+    The lease is a document of the `leases` collection. It is taken when it is free or has
+    expired, and renewed when `owner` already holds it. Otherwise the upsert collides with
+    the holder's document and the lease is refused.
+
+    Args:
+    ----
+    db : AsyncIOMotorDatabase
+        The database holding the lease.
+
+    name : str
+        The job the lease is for.
+
+    owner : str
+        What identifies the calling worker.
+
+    ttl_seconds : float
+        How long the lease is held without being renewed.
+
+    Returns:
+    -------
+    bool
+        Whether `owner` holds the lease.
+    """
+    now = datetime.now(timezone.utc)
+    try:
+        await db[DataBaseEnum.LEASE_COLLECTION.value].update_one(
+            {"_id": name, "$or": [{"owner": owner}, {"expires_at": {"$lte": now}}]},
+            {"$set": {"owner": owner, "expires_at": now + timedelta(seconds=ttl_seconds)}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        return False
+
+    return True
+
+
+async def prune_old_checkpoints(db: AsyncIOMotorDatabase, keep_last: int) -> dict:
+    """
+    Deletes all but the latest `keep_last` checkpoints of every (thread_id, checkpoint_ns),
+    together with their pending writes.
+
+    The snapshot and deltas that the kept checkpoints are rebuilt from are never deleted.
+
+    Args:
+    ----
+    db : AsyncIOMotorDatabase
+        The checkpoints database.
+
+    keep_last : int
+        The number of most recent checkpoints to keep per thread and namespace.
+
+    Returns:
+    -------
+    dict
+        The number of checkpoints and writes deleted.
+    """
+    checkpoints = db[DataBaseEnum.CHECKPOINT_COLLECTION.value]
+    writes = db[DataBaseEnum.CHECKPOINT_WRITES_COLLECTION.value]
+    stats = {"checkpoints_deleted": 0, "writes_deleted": 0}
+
+    pipeline = [
+        {"$group": {"_id": {"thread_id": "$thread_id", "checkpoint_ns": "$checkpoint_ns"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": keep_last}}},
+    ]
+    async for group in checkpoints.aggregate(pipeline, allowDiskUse=True):
+        thread = {"thread_id": group["_id"]["thread_id"], "checkpoint_ns": group["_id"]["checkpoint_ns"]}
+
+        oldest_kept = await (
+            checkpoints.find(thread, {"checkpoint_id": 1, "snapshot_id": 1})
+            .sort("checkpoint_id", -1)
+            .skip(keep_last - 1)
+            .limit(1)
+            .to_list(length=1)
+        )
+        if not oldest_kept:
+            continue
+
+        cutoff = oldest_kept[0].get("snapshot_id") or oldest_kept[0]["checkpoint_id"]
+        expired = {**thread, "checkpoint_id": {"$lt": cutoff}}
+        stats["checkpoints_deleted"] += await _delete(checkpoints, expired)
+        stats["writes_deleted"] += await _delete(writes, expired)
+
+    return stats
+
+
+async def prune_orphaned_writes(db: AsyncIOMotorDatabase) -> dict:
+    """
+    Deletes the pending writes whose checkpoint no longer exists.
+
+    Args:
+    ----
+    db : AsyncIOMotorDatabase
+        The checkpoints database.
+
+    Returns:
+    -------
+    dict
+        The number of writes deleted.
+    """
+    writes = db[DataBaseEnum.CHECKPOINT_WRITES_COLLECTION.value]
+    stats = {"writes_deleted": 0}
+
+    pipeline = [
+        {
+            "$group": {
+                "_id": {
+                    "thread_id": "$thread_id",
+                    "checkpoint_ns": "$checkpoint_ns",
+                    "checkpoint_id": "$checkpoint_id",
+                }
+            }
+        },
+        {
+            "$lookup": {
+                "from": DataBaseEnum.CHECKPOINT_COLLECTION.value,
+                "let": {"key": "$_id"},
+                "pipeline": [
+                    {
+                        "$match": {
+                            "$expr": {
+                                "$and": [
+                                    {"$eq": ["$thread_id", "$$key.thread_id"]},
+                                    {"$eq": ["$checkpoint_ns", "$$key.checkpoint_ns"]},
+                                    {"$eq": ["$checkpoint_id", "$$key.checkpoint_id"]},
+                                ]
+                            }
+                        }
+                    },
+                    {"$limit": 1},
+                    {"$project": {"_id": 1}},
+                ],
+                "as": "checkpoint",
+            }
+        },
+        {"$match": {"checkpoint": {"$size": 0}}},
+    ]
+    async for orphan in writes.aggregate(pipeline, allowDiskUse=True):
+        stats["writes_deleted"] += await _delete(writes, orphan["_id"])
+
+    return stats
+
+
+async def migrate_legacy_checkpoints(db: AsyncIOMotorDatabase) -> int:
+    """
+    Marks checkpoints written before delta storage existed as explicit snapshots.
+
+    Legacy documents already load as snapshots, so this is optional; it makes every document
+    carry the same `storage`, `snapshot_id` and `depth` fields.
+
+    Args:
+    ----
+    db : AsyncIOMotorDatabase
+        The checkpoints database.
+
+    Returns:
+    -------
+    int
+        The number of migrated documents.
+    """
+    result = await db[DataBaseEnum.CHECKPOINT_COLLECTION.value].update_many(
+        {"storage": {"$exists": False}},
+        [{"$set": {"storage": "snapshot", "snapshot_id": "$checkpoint_id", "depth": 0}}],
+    )
+    return result.modified_count
+
+
+async def run_retention(db: AsyncIOMotorDatabase, keep_last: int) -> dict:
+    """
+    Runs one retention pass over the checkpoints database and updates `retention_metrics`.
+
+    The bytes reclaimed are estimated from the average document size of each collection,
+    read before the pass, times the number of documents deleted from it.
+
+    Args:
+    ----
+    db : AsyncIOMotorDatabase
+        The checkpoints database.
+
+    keep_last : int
+        The number of most recent checkpoints to keep per thread and namespace.
+
+    Returns:
+    -------
+    dict
+        What this pass deleted, and the estimated bytes it reclaimed.
+    """
+    started = time.perf_counter()
+    checkpoint_size = await _average_size(db, DataBaseEnum.CHECKPOINT_COLLECTION.value)
+    write_size = await _average_size(db, DataBaseEnum.CHECKPOINT_WRITES_COLLECTION.value)
+
+    stats = await prune_old_checkpoints(db, max(1, keep_last))
+    orphans = await prune_orphaned_writes(db)
+    stats["writes_deleted"] += orphans["writes_deleted"]
+    stats["bytes_reclaimed"] = int(stats["checkpoints_deleted"] * checkpoint_size + stats["writes_deleted"] * write_size)
+
+    retention_metrics["runs"] += 1
+    retention_metrics["checkpoints_deleted"] += stats["checkpoints_deleted"]
+    retention_metrics["writes_deleted"] += stats["writes_deleted"]
+    retention_metrics["bytes_reclaimed"] += stats["bytes_reclaimed"]
+    retention_metrics["last_run_seconds"] = time.perf_counter() - started
+
+    logger.info(
+        "Checkpoint retention deleted %d checkpoints and %d writes, about %d bytes",
+        stats["checkpoints_deleted"], stats["writes_deleted"], stats["bytes_reclaimed"],
+    )
+    return stats
+
+
+async def retention_loop(db: AsyncIOMotorDatabase, keep_last: int, interval_seconds: float) -> None:
+    """
+    Runs the retention job forever, every `interval_seconds`, until the task is cancelled.
+
+    Every worker starts this loop, but a pass only runs on the worker holding the retention
+    lease. The holder renews the lease at each pass and keeps it for two intervals, so another
+    worker takes over if it stops.
+
+    Args:
+    ----
+    db : AsyncIOMotorDatabase
+        The checkpoints database.
+
+    keep_last : int
+        The number of most recent checkpoints to keep per thread and namespace.
+
+    interval_seconds : float
+        The delay between two passes.
+    """
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    while True:
+        try:
+            if await acquire_lease(db, RETENTION_LEASE, owner, 2 * interval_seconds):
+                await run_retention(db, keep_last)
+            else:
+                retention_metrics["skipped"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Checkpoint retention failed")
+
+        await asyncio.sleep(interval_seconds)
+
+
+async def _main(keep_last: int, migrate: bool) -> None:
+    settings = get_settings()
+    client = AsyncIOMotorClient(settings.MONGODB_URL, **get_mongo_client_options(settings))
+    try:
+        if migrate:
+            migrated = await migrate_legacy_checkpoints(client[settings.CHECKPOINT_DATABASE])
+            print(f"Marked {migrated} legacy checkpoints as snapshots")
+        stats = await run_retention(client[settings.CHECKPOINT_DATABASE], keep_last)
+    finally:
+        client.close()
+
+    print(
+        f"Deleted {stats['checkpoints_deleted']} checkpoints and {stats['writes_deleted']} writes, "
+        f"about {stats['bytes_reclaimed']} bytes"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prune old LangGraph checkpoints and orphaned writes.")
+    parser.add_argument(
+        "--keep", type=int, default=get_settings().CHECKPOINT_RETENTION_KEEP,
+        help="Number of most recent checkpoints to keep per thread.",
+    )
+    parser.add_argument(
+        "--migrate", action="store_true",
+        help="Mark checkpoints written before delta storage as snapshots first.",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(args.keep, args.migrate))
@@ -1,17 +1,48 @@
+import asyncio
 from helpers import (get_db, get_user_controller, get_chat_controller, get_chat_model, get_message_controller, 
-                     get_message_model, get_user_model, get_mongo_conn)
-from fastapi import FastAPI
-from routes import register, login, chat, message
+                     get_message_model, get_user_model, get_mongo_conn, get_settings, ensure_indexes,
+                     report_collection_scans, shutdown_password_executor, create_broker, create_loop_monitor,
+                     tag_request)
+from fastapi import FastAPI, Depends
+from routes import register, login, chat, message, health, metrics, debug
+from routes.messages import manager, turns
+import llm
 
 
-app = FastAPI()
+# Tags the task serving each request with its route and chat ID, to attribute loop stalls.
+app = FastAPI(dependencies=[Depends(tag_request)])
 
 @app.on_event("startup")
 async def startup_db_client():
 
+    settings = get_settings()
+
+    app.loop_monitor = create_loop_monitor()
+    if app.loop_monitor is not None:
+        app.loop_monitor.start()
+
     app.mongo_conn = get_mongo_conn()
     app.db_client = get_db()
 
+    if settings.ENSURE_INDEXES:
+        await ensure_indexes(app.mongo_conn)
+    if settings.EXPLAIN_HOT_QUERIES:
+        app.collection_scans = await report_collection_scans(app.mongo_conn)
+
+    await manager.start_broker(create_broker(app.mongo_conn))
+
+    app.warmup_task = None
+    if settings.LLM_WARMUP:
+        app.warmup_task = asyncio.create_task(llm.warmup())
+
+    app.retention_task = None
+    if settings.CHECKPOINT_RETENTION_ENABLED:
+        app.retention_task = asyncio.create_task(llm.retention_loop(
+            app.mongo_conn[settings.CHECKPOINT_DATABASE],
+            settings.CHECKPOINT_RETENTION_KEEP,
+            settings.CHECKPOINT_RETENTION_INTERVAL_SECONDS,
+        ))
+
     app.user_model = get_user_model()
     app.user_controller = get_user_controller()
 
@@ -21,12 +52,29 @@ async def startup_db_client():
     app.message_model = get_message_model()
     app.message_controller = get_message_controller()
 
+    app.started = True
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    if app.retention_task is not None:
+        app.retention_task.cancel()
+    if app.warmup_task is not None:
+        app.warmup_task.cancel()
+
+    await turns.close()
+    await manager.close_broker()
+    await app.message_model.flush()
     app.mongo_conn.close()
+    shutdown_password_executor()
+    llm.shutdown_llm()
+    if app.loop_monitor is not None:
+        await app.loop_monitor.stop()
 
 
 app.include_router(register)
 app.include_router(login)
 app.include_router(chat)
-app.include_router(message)
\ No newline at end of file
+app.include_router(message)
+app.include_router(health)
+app.include_router(metrics)
+app.include_router(debug)
\ No newline at end of file
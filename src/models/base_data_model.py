@@ -11,9 +11,9 @@ class BaseDataModel:
 
     app_settings: Settings:
         Application-specific settings used for configuring various aspects of the
-        application.
+        application. This is the cached settings instance, not a fresh parse of `.env`.
     """
     
     def __init__(self, db_client: object):
         self.db_client : object = db_client
-        self.app_settings : Settings = get_settings
\ No newline at end of file
+        self.app_settings : Settings = get_settings()
@@ -1,7 +1,13 @@
 from models import BaseDataModel
+from helpers.write_behind import WriteBehindSink, parse_write_concern
+from helpers.tracing import register_metrics
 from motor.motor_asyncio import AsyncIOMotorClient
-from schemas import MessageInDB
+from bson import ObjectId
+from bson.errors import InvalidId
+from datetime import datetime
+from schemas import MessageInDB, MessagePage
 from enums import DataBaseEnum
+from typing import Optional
 
 class MessageModel(BaseDataModel):
     """
@@ -14,6 +20,9 @@ class MessageModel(BaseDataModel):
 
     collection : motor.AsyncIOMotorCollection
         The MongoDB collection used to store and retrieve message data.
+
+    sink : Optional[WriteBehindSink]
+        Buffers new messages and inserts them in batches, when `MESSAGE_WRITE_BEHIND` is set.
     """
     
     def __init__(self, db_client: AsyncIOMotorClient):  # type: ignore
@@ -29,10 +38,24 @@ class MessageModel(BaseDataModel):
         super().__init__(db_client=db_client)
         self.collection = self.db_client[DataBaseEnum.MESSAGE_COLLECTION.value]
 
+        settings = self.app_settings
+        self.sink: Optional[WriteBehindSink] = None
+        if settings.MESSAGE_WRITE_BEHIND:
+            self.sink = WriteBehindSink(
+                self.collection,
+                settings.MESSAGE_BATCH_SIZE,
+                settings.MESSAGE_BATCH_DELAY_MS / 1000,
+                parse_write_concern(settings.MESSAGE_WRITE_CONCERN),
+            )
+            register_metrics("message_sink", self.sink.metrics)
+
     async def create_message(self, message: MessageInDB) -> MessageInDB:
         """
         Inserts a new message document into the database.
 
+        With write-behind enabled the message is only buffered; it is inserted with the next
+        batch, and reads of its chat flush the buffer first.
+
         Args:
         ----
         message : MessageInDB
@@ -45,9 +68,30 @@ class MessageModel(BaseDataModel):
         """
 
         message_dict = message.dict()
-        await self.collection.insert_one(message_dict)
+        if self.sink is not None:
+            self.sink.add(message_dict)
+        else:
+            await self.collection.insert_one(message_dict)
         return message
 
+    async def flush(self, chat_id: Optional[str] = None):
+        """
+        Writes the buffered messages, or does nothing if none of them belongs to `chat_id`.
+
+        Args:
+        ----
+        chat_id : Optional[str]
+            Only flush if a message of this chat is not written yet. Flushes unconditionally if None.
+        """
+
+        if self.sink is None:
+            return
+
+        if chat_id is None:
+            await self.sink.close()
+        elif self.sink.has_pending("chat_id", chat_id):
+            await self.sink.flush()
+
     async def get_full_chat(self, chat_id: str) -> list[MessageInDB]:
         """
         Retrieves all messages associated with a given chat ID, ordered by the timestamp.
@@ -63,9 +107,74 @@ class MessageModel(BaseDataModel):
             A list of message objects representing the full chat conversation.
         """
         
+        await self.flush(chat_id)
         chat_cursor = self.collection.find({"chat_id": chat_id}).sort("timestamp", 1)
         messages = []
         async for message in chat_cursor:
             messages.append(MessageInDB(**message))
         
         return messages
+
+    async def get_chat_page(self, chat_id: str, limit: int, before: Optional[str] = None) -> MessagePage:
+        """
+        Retrieves one page of a chat's messages using keyset pagination on (timestamp, _id).
+
+        Without a cursor the most recent messages are returned; with a cursor, the messages
+        right before it. Each page is a single indexed range scan, however long the chat is.
+
+        Args:
+        ----
+        chat_id : str
+            The unique identifier of the chat whose messages are to be retrieved.
+
+        limit : int
+            The maximum number of messages in the page.
+
+        before : Optional[str]
+            The cursor of a previously returned page.
+
+        Returns:
+        -------
+        MessagePage
+            The page of messages, oldest first.
+
+        Raises:
+        ------
+        ValueError
+            If the cursor is malformed.
+        """
+
+        query = {"chat_id": chat_id}
+        if before is None:
+            await self.flush(chat_id)
+        else:
+            timestamp, object_id = self._decode_cursor(before)
+            query["$or"] = [
+                {"timestamp": {"$lt": timestamp}},
+                {"timestamp": timestamp, "_id": {"$lt": object_id}},
+            ]
+
+        chat_cursor = self.collection.find(query).sort([("timestamp", -1), ("_id", -1)]).limit(limit + 1)
+        documents = await chat_cursor.to_list(length=limit + 1)
+
+        has_more = len(documents) > limit
+        documents = documents[:limit]
+        documents.reverse()
+
+        return MessagePage(
+            messages=[MessageInDB(**document) for document in documents],
+            cursor=self._encode_cursor(documents[0]) if has_more else None,
+            has_more=has_more,
+        )
+
+    @staticmethod
+    def _encode_cursor(document: dict) -> str:
+        return f"{document['timestamp'].isoformat()}|{document['_id']}"
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> tuple[datetime, ObjectId]:
+        try:
+            timestamp, object_id = cursor.split("|")
+            return datetime.fromisoformat(timestamp), ObjectId(object_id)
+        except (AttributeError, ValueError, InvalidId) as e:
+            raise ValueError("Invalid history cursor") from e
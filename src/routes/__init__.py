@@ -1,4 +1,7 @@
 from .register import register
 from .login import login
 from .chats import chat
-from .messages import message
\ No newline at end of file
+from .messages import message
+from .health import health
+from .metrics import metrics
+from .debug import debug
\ No newline at end of file
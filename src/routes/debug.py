@@ -0,0 +1,23 @@
+from fastapi import APIRouter, status, Request, Depends, HTTPException
+from helpers import Settings, settings_dependency
+
+debug = APIRouter(prefix="/debug")
+
+
+@debug.get("/loop", status_code=status.HTTP_200_OK)
+async def get_loop(request: Request, settings: Settings = Depends(settings_dependency)) -> dict:
+    """
+    Reports the event-loop lag and the recent loop stalls. Served only when
+    `DEBUG_ENDPOINTS_ENABLED` is set.
+
+    - Returns a JSON object with the following fields:
+        - `lag_seconds_last`, `lag_seconds_max`: the lag of the last heartbeat and the worst one.
+        - `stalls`, `stall_seconds_total`: how many times, and for how long, the loop was blocked
+          longer than `LOOP_STALL_THRESHOLD_SECONDS`.
+        - `recent_stalls`: the most recent stalls first, each with when it started, how long it
+          lasted at least, the task running with its `route` and `chat_id`, and stack samples of the loop.
+    """
+    monitor = getattr(request.app, "loop_monitor", None)
+    if not settings.DEBUG_ENDPOINTS_ENABLED or monitor is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    return monitor.snapshot()
@@ -0,0 +1,47 @@
+import asyncio
+from fastapi import APIRouter, status, Request, Response, Depends
+from helpers import Settings, get_mongo_conn, settings_dependency
+import llm
+
+health = APIRouter()
+
+DATABASE_PING_TIMEOUT_SECONDS = 2
+
+
+@health.get("/healthz", status_code=status.HTTP_200_OK)
+async def healthz() -> dict:
+    """
+    Liveness probe: answers as long as the process is serving requests.
+
+    It checks no dependency, so a slow database or model never gets a healthy pod restarted.
+    """
+    return {"status": "ok"}
+
+
+@health.get("/readyz", status_code=status.HTTP_200_OK)
+async def readyz(request: Request, response: Response, settings: Settings = Depends(settings_dependency)) -> dict:
+    """
+    Readiness probe: answers 200 once the pod can take traffic, and 503 until then.
+
+    - Returns a JSON object with the following fields:
+        - `status`: "ready" or "starting".
+        - `checks`: whether startup finished, the database answers a ping and, when
+          `LLM_WARMUP` is set, the LLM stack is loaded.
+    """
+    checks = {"startup": getattr(request.app, "started", False), "database": False}
+
+    if checks["startup"]:
+        try:
+            await asyncio.wait_for(get_mongo_conn().admin.command("ping"), DATABASE_PING_TIMEOUT_SECONDS)
+            checks["database"] = True
+        except Exception:
+            pass
+
+    if settings.LLM_WARMUP:
+        checks["llm"] = llm.is_warm()
+
+    ready = all(checks.values())
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+
+    return {"status": "ready" if ready else "starting", "checks": checks}
@@ -1,60 +1,258 @@
 import json
+import time
 import asyncio
+import logging
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, WebSocketException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
-from schemas import CreateMessage, MessageInDB
+from schemas import CreateMessage, MessagePage
 from controllers import UserController, ChatController, MessageController
-from helpers import get_user_controller, get_chat_controller, get_message_controller
-from llm import get_harry_answer
-from enums import ChatSender
+from helpers import (get_user_controller, get_chat_controller, get_message_controller, get_settings, Broker,
+                     EncodedFrame, negotiate_protocol, TurnScheduler, span, stage_breakdown, register_metrics,
+                     tag_current_task)
+import llm
+from enums import ChatSender, ChatSettings, ChatProtocol
+from typing import Callable, Optional
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 message = APIRouter(prefix="/chats")
 
+# Cumulative counters of the chat connections since the process started.
+connection_metrics = {
+    "frames_queued": 0,
+    "slow_consumers_evicted": 0,
+    "failed_connections_pruned": 0,
+}
+register_metrics("connections", connection_metrics)
+
+
+class ConnectionWriter:
+    """
+    Sends the frames queued for one WebSocket connection, in order, from its own task.
+
+    Frames are queued as `EncodedFrame`s, so a frame broadcast to a chat is encoded once
+    per protocol and the same text or bytes are sent to every participant.
+
+    Broadcasts only enqueue frames, so a slow or half-dead client never delays the other
+    participants of a chat. A send that takes longer than `send_timeout` or fails calls
+    `on_failure`, and the writer stops.
+
+    Attributes:
+        websocket (WebSocket): The connection frames are sent to.
+        protocol (ChatProtocol): The wire protocol negotiated with the client.
+        queue (asyncio.Queue): The frames waiting to be sent.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        protocol: ChatProtocol,
+        on_failure: Callable[[], None],
+        queue_size: int,
+        send_timeout: float,
+    ):
+        self.websocket = websocket
+        self.protocol = protocol
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.send_timeout = send_timeout
+        self._on_failure = on_failure
+        self._task = asyncio.create_task(self._run())
+
+    def put(self, frame: EncodedFrame) -> bool:
+        """
+        Queues a frame without waiting.
+
+        Args:
+            frame (EncodedFrame): The frame to send.
+
+        Returns:
+            bool: False if the queue is full, i.e. the client is not keeping up.
+        """
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            return False
+
+        return True
+
+    async def _run(self):
+        while True:
+            data = (await self.queue.get()).encode(self.protocol)
+            send = self.websocket.send_bytes(data) if isinstance(data, bytes) else self.websocket.send_text(data)
+            try:
+                await asyncio.wait_for(send, self.send_timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                connection_metrics["failed_connections_pruned"] += 1
+                self._on_failure()
+                return
+
+    def close(self, code: Optional[int] = None):
+        """
+        Stops the writer, dropping the frames still queued, and optionally closes the connection.
+
+        Args:
+            code (Optional[int]): The WebSocket close code to send, if the connection should be closed.
+        """
+        if self._task is not asyncio.current_task():
+            self._task.cancel()
+
+        if code is not None:
+            self._task = asyncio.create_task(self._close(code))
+
+    async def _close(self, code: int):
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code), self.send_timeout)
+        except Exception:
+            pass
+
 
 class ConnectionManager:
     """
     Manages WebSocket connections and message broadcasting for active chats.
 
+    Frames sent to a chat go through the broker, which delivers them to the participants
+    connected to this worker and to the other workers, so a chat can span workers and nodes.
+    Every connection has its own bounded outbound queue drained by a `ConnectionWriter`;
+    connections whose queue overflows are evicted as slow consumers.
+
     Attributes:
         active_connections (dict[str, list[WebSocket]]): A dictionary storing lists of active WebSocket connections
         for each chat ID.
+        writers (dict[int, ConnectionWriter]): The writer of each connection, keyed by the connection's id().
+        broker (Optional[Broker]): The broker frames are published to. Without one, frames
+        only reach this worker's connections.
 
     Methods:
         connect(websocket, chat_id): Adds a new WebSocket connection to a chat.
         disconnect(websocket, chat_id): Removes a WebSocket connection from a chat.
+        start_broker(broker): Starts fanning frames out through a broker.
+        close_broker(): Stops the broker.
+        deliver_frame(chat_id, frame): Sends a frame to this worker's participants in a chat.
+        send_frame_to_chat(frame, chat_id): Broadcasts a raw frame to all participants in a chat.
         send_message_to_chat(message, sender, chat_id): Broadcasts a message to all participants in a chat.
-        send_history(history, chat_id): Sends the chat history to all participants in a chat.
+        send_history(page, websocket): Sends one page of the chat history to a single connection.
+        send_frame(frame, websocket): Sends a frame to a single connection.
     """
 
     def __init__(self):
         self.active_connections: dict[str, list[WebSocket]] = {}
+        self.writers: dict[int, ConnectionWriter] = {}
+        self.broker: Optional[Broker] = None
+
+    async def start_broker(self, broker: Broker):
+        """
+        Starts publishing frames through `broker` and delivering the ones it receives.
+
+        Args:
+            broker (Broker): The broker shared with the other workers.
+        """
+        await broker.start(self.deliver_frame)
+        self.broker = broker
+
+    async def close_broker(self):
+        """
+        Stops the broker; frames then only reach this worker's connections.
+        """
+        if self.broker is not None:
+            broker, self.broker = self.broker, None
+            await broker.close()
 
     async def connect(self, websocket: WebSocket, chat_id: str):
         """
         Accepts a WebSocket connection and adds it to the specified chat.
 
+        The wire protocol is negotiated from the subprotocols the client requested:
+        "harry.msgpack" for binary MessagePack frames, otherwise JSON text frames.
+
         Args:
             websocket (WebSocket): The WebSocket connection to manage.
             chat_id (str): The ID of the chat to connect to.
         """
-        await websocket.accept()
+        protocol = negotiate_protocol(websocket.scope.get("subprotocols", []))
+        await websocket.accept(subprotocol=protocol.value if protocol is not None else None)
+        self.writers[id(websocket)] = ConnectionWriter(
+            websocket,
+            protocol or ChatProtocol.JSON,
+            lambda: self.disconnect(websocket, chat_id, code=status.WS_1011_INTERNAL_ERROR),
+            settings.WEBSOCKET_SEND_QUEUE_SIZE,
+            settings.WEBSOCKET_SEND_TIMEOUT_SECONDS,
+        )
         if chat_id not in self.active_connections:
             self.active_connections[chat_id] = []
         self.active_connections[chat_id].append(websocket)
 
-    def disconnect(self, websocket: WebSocket, chat_id: str):
+    def disconnect(self, websocket: WebSocket, chat_id: str, code: Optional[int] = None):
         """
-        Removes a WebSocket connection from the specified chat.
+        Removes a WebSocket connection from the specified chat and stops its writer.
+
+        It is safe to call more than once and never raises, whatever state the connection is in.
 
         Args:
             websocket (WebSocket): The WebSocket connection to remove.
             chat_id (str): The ID of the chat to disconnect from.
+            code (Optional[int]): If given, the connection is also closed with this close code.
         """
-        self.active_connections[chat_id].remove(websocket)
-        if len(self.active_connections[chat_id]) == 0:
+        connections = self.active_connections.get(chat_id, [])
+        if any(connection is websocket for connection in connections):
+            connections[:] = [connection for connection in connections if connection is not websocket]
+        if chat_id in self.active_connections and len(connections) == 0:
             del self.active_connections[chat_id]
 
+        writer = self.writers.pop(id(websocket), None)
+        if writer is not None:
+            writer.close(code)
+
+    async def deliver_frame(self, chat_id: str, frame: dict):
+        """
+        Queues a frame for the participants of a chat connected to this worker.
+
+        Participants whose queue is full are evicted as slow consumers, so a client that
+        stops reading never holds up the others.
+
+        Args:
+            chat_id (str): The ID of the chat to send the frame to.
+            frame (dict): The frame to send.
+        """
+        encoded = EncodedFrame(frame)
+        for connection in list(self.active_connections.get(chat_id, [])):
+            self.send_frame(encoded, connection, chat_id)
+
+    def send_frame(self, frame: dict | EncodedFrame, websocket: WebSocket, chat_id: str):
+        """
+        Queues a frame for a single connection, evicting it if it is not keeping up.
+
+        Args:
+            frame (dict | EncodedFrame): The frame to send.
+            websocket (WebSocket): The connection to send the frame to.
+            chat_id (str): The ID of the chat the connection belongs to.
+        """
+        writer = self.writers.get(id(websocket))
+        if writer is None:
+            return
+
+        if writer.put(frame if isinstance(frame, EncodedFrame) else EncodedFrame(frame)):
+            connection_metrics["frames_queued"] += 1
+        else:
+            connection_metrics["slow_consumers_evicted"] += 1
+            self.disconnect(websocket, chat_id, code=status.WS_1013_TRY_AGAIN_LATER)
+
+    async def send_frame_to_chat(self, frame: dict, chat_id: str):
+        """
+        Sends a frame to all participants in a specific chat, on every worker.
+
+        Args:
+            frame (dict): The frame to send.
+            chat_id (str): The ID of the chat to send the frame to.
+        """
+        if self.broker is None:
+            await self.deliver_frame(chat_id, frame)
+        else:
+            await self.broker.publish(chat_id, frame)
+
     async def send_message_to_chat(self, message: str, sender: str, chat_id: str):
         """
         Sends a message to all participants in a specific chat.
@@ -64,26 +262,191 @@ class ConnectionManager:
             sender (str): The sender of the message ("USER" or "SYSTEM").
             chat_id (str): The ID of the chat to send the message to.
         """
-        if chat_id in self.active_connections:
-            for connection in self.active_connections[chat_id]:
-                response = {"sender": sender, "message": message}
-                await connection.send_json(json.dumps(response))
+        await self.send_frame_to_chat({"type": "message", "sender": sender, "message": message}, chat_id)
 
-    async def send_history(self, history: list[MessageInDB], chat_id: str):
+    def send_history(self, page: MessagePage, websocket: WebSocket, chat_id: str):
         """
-        Sends the chat history to all participants in a chat.
+        Sends one page of the chat history to a single connection as one batched frame.
 
         Args:
-            history (list[MessageInDB]): A list of messages from the chat history.
-            chat_id (str): The ID of the chat.
+            page (MessagePage): The page of messages to send, oldest first.
+            websocket (WebSocket): The connection that requested the history.
+            chat_id (str): The ID of the chat the connection belongs to.
         """
-        for message in history:
-            await self.send_message_to_chat(message.message, message.sender, chat_id)
+        frame = {
+            "type": "history",
+            "messages": [
+                {"sender": message.sender, "message": message.message, "timestamp": message.timestamp.isoformat()}
+                for message in page.messages
+            ],
+            "cursor": page.cursor,
+            "has_more": page.has_more,
+        }
+        self.send_frame(frame, websocket, chat_id)
 
 
 manager = ConnectionManager()
 
 
+async def stream_harry_answer(
+    query: str,
+    chat_id: str,
+    bypass_cache: bool = False,
+    user_id: Optional[str] = None,
+    deadline: Optional[float] = None,
+) -> str:
+    """
+    Streams Harry's reply to every participant in a chat as typed frames.
+
+    A "start" frame opens the reply, each generated chunk is sent as a "delta" frame and
+    an "end" frame carries the complete reply. If the reply fails, `run_harry_turn` closes it
+    with an "error" frame instead, and the deltas already sent must be discarded.
+
+    Args:
+        query (str): The user's message.
+        chat_id (str): The ID of the chat.
+        bypass_cache (bool): Always ask the model, even if the response cache holds a reply.
+        user_id (Optional[str]): The user asking, whose concurrent model calls are limited.
+        deadline (Optional[float]): The `time.time()` by which the reply is due.
+
+    Returns:
+        str: The complete reply.
+    """
+    sender = ChatSender.SYSTEM.value
+    output = ""
+
+    await manager.send_frame_to_chat({"type": "start", "sender": sender}, chat_id)
+    async for event, text in llm.astream_harry_answer(query, chat_id, bypass_cache, user_id, deadline):
+        if event == "delta":
+            await manager.send_frame_to_chat({"type": "delta", "sender": sender, "message": text}, chat_id)
+        else:
+            output = text
+    await manager.send_frame_to_chat({"type": "end", "sender": sender, "message": output}, chat_id)
+
+    return output
+
+
+TURN_ERROR_MESSAGE = "Harry could not answer this time, please try again."
+
+
+async def send_turn_error(chat_id: str, message: str, fallback: bool = False):
+    """
+    Tells the participants of a chat that the current turn failed, closing any reply that was
+    being streamed.
+
+    It never raises, so it cannot hide the error that failed the turn.
+
+    Args:
+        chat_id (str): The ID of the chat.
+        message (str): The text shown to the participants.
+        fallback (bool): Whether `message` is an in-character fallback reply given because the
+        model could not answer. It is marked with `"fallback": true` in the frame.
+    """
+    frame = {"type": "error", "sender": ChatSender.SYSTEM.value, "message": message}
+    if fallback:
+        frame["fallback"] = True
+
+    try:
+        await manager.send_frame_to_chat(frame, chat_id)
+    except Exception:
+        logger.exception("Could not send the turn error to chat %s", chat_id)
+
+
+async def run_harry_turn(chat_id: str, queries: list[tuple[str, bool, str]]):
+    """
+    Answers the user messages of one turn and stores Harry's reply.
+
+    Turns of the same chat never overlap, so they cannot fork its checkpoint chain; messages
+    sent while Harry is answering are coalesced into the next turn when `TURN_COALESCE` is set.
+    The reply is due `TURN_DEADLINE_SECONDS` after the turn starts, so messages that waited
+    for an earlier turn still get the full budget.
+
+    If the turn fails before the reply reached the chat, an "error" frame is sent instead,
+    so a streamed reply always ends with an "end" or an "error" frame. When the model could
+    not answer, the error frame carries Harry's fallback reply, which is neither stored in the
+    chat nor in the checkpoint.
+
+    Args:
+        chat_id (str): The ID of the chat.
+        queries (list[tuple[str, bool, str]]): The user messages answered by this turn, oldest
+        first, each with whether it asked to bypass the response cache and its sender.
+    """
+    query = "\n".join(text for text, _, _ in queries)
+    bypass_cache = any(bypass for _, bypass, _ in queries)
+    user_id = queries[-1][2]
+    deadline = time.time() + settings.TURN_DEADLINE_SECONDS
+    tag_current_task(route="turn", chat_id=chat_id)
+
+    # Whether the chat received Harry's complete reply, so a failure after it needs no error frame.
+    replied = False
+    try:
+        with stage_breakdown(f"turn of chat {chat_id}", settings.SLOW_TURN_SECONDS), span("turn", chat_id=chat_id):
+            # Loads the LLM stack off the event loop if the startup warmup has not finished yet.
+            await llm.warmup()
+
+            with span("turn.answer", chat_id=chat_id):
+                if settings.STREAM_RESPONSES:
+                    output = await stream_harry_answer(query, chat_id, bypass_cache, user_id, deadline)
+                    replied = True
+                else:
+                    output = await llm.aget_harry_answer(query, chat_id, bypass_cache, user_id, deadline)
+
+            harry_message = CreateMessage(
+                chat_id=chat_id,
+                sender=ChatSender.SYSTEM.value,
+                message=output
+            )
+
+            await get_message_controller().create_message(harry_message)
+            if not settings.STREAM_RESPONSES:
+                with span("turn.broadcast", chat_id=chat_id):
+                    await manager.send_message_to_chat(harry_message.message, ChatSender.SYSTEM.value, chat_id)
+                replied = True
+    except llm.LLMUnavailableError as e:
+        await send_turn_error(chat_id, e.reply, fallback=True)
+    except (Exception, asyncio.CancelledError):
+        if not replied:
+            await send_turn_error(chat_id, TURN_ERROR_MESSAGE)
+        raise
+
+
+turns = TurnScheduler(
+    run_harry_turn, settings.TURN_COALESCE, settings.TURN_COALESCE_WINDOW_SECONDS, settings.TURN_MAX_PENDING
+)
+
+TURN_BUSY_MESSAGE = "Harry is still answering your earlier messages, please wait."
+
+
+def parse_client_request(data: str) -> Optional[dict]:
+    """
+    Recognizes the structured requests among the texts received on the chat socket.
+
+    Requests are JSON objects with a "type":
+    - `{"type": "load_older", "cursor": "...", "limit": 50}` asks for older history;
+    - `{"type": "message", "message": "...", "bypass_cache": true}` is a chat message with options.
+
+    Any other text is a plain chat message.
+
+    Args:
+        data (str): The text received from the client.
+
+    Returns:
+        Optional[dict]: The request, or None if the text is a plain chat message.
+    """
+    if not data.startswith("{"):
+        return None
+
+    try:
+        request = json.loads(data)
+    except ValueError:
+        return None
+
+    if not isinstance(request, dict) or request.get("type") not in ("load_older", "message"):
+        return None
+
+    return request
+
+
 async def verify(chat_id: str, user_controller: UserController, chat_controller: ChatController, token: str = None):
     """
     Verifies the validity of the user's token and checks if they are authorized to access the specified chat.
@@ -94,6 +457,9 @@ async def verify(chat_id: str, user_controller: UserController, chat_controller:
         chat_controller (ChatController): The chat controller for managing chat operations.
         token (str, optional): The user's token for authentication. Defaults to None.
 
+    Returns:
+        The authenticated user.
+
     Raises:
         WebSocketException: If the token is invalid or the user is unauthorized.
     """
@@ -109,6 +475,8 @@ async def verify(chat_id: str, user_controller: UserController, chat_controller:
     if not await chat_controller.chat_exists(chat_id, current_user.username):
         raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="No such User or chat")
 
+    return current_user
+
 
 @message.websocket("/{chat_id}/send")
 async def send_message(
@@ -134,19 +502,49 @@ async def send_message(
     token = websocket.headers.get("Authorization")
 
     try:
-        await verify(chat_id, user_controller, chat_controller, token)
+        with span("ws.verify", chat_id=chat_id):
+            current_user = await verify(chat_id, user_controller, chat_controller, token)
     except Exception as e:
         raise e
 
-    await manager.connect(websocket, chat_id)
+    with span("ws.connect", chat_id=chat_id):
+        await manager.connect(websocket, chat_id)
 
-    history = await message_controller.get_full_chat(chat_id)
-    await manager.send_history(history, chat_id)
+    history = await message_controller.get_chat_page(chat_id)
+    manager.send_history(history, websocket, chat_id)
 
     try:
         while True:
             data = await websocket.receive_text()
 
+            request = parse_client_request(data)
+            if request is not None and request["type"] == "load_older":
+                try:
+                    page = await message_controller.get_chat_page(
+                        chat_id,
+                        limit=int(request.get("limit", ChatSettings.HISTORY_PAGE_SIZE.value)),
+                        before=request.get("cursor"),
+                    )
+                except (TypeError, ValueError):
+                    manager.send_frame({"type": "error", "message": "Invalid history request"}, websocket, chat_id)
+                    continue
+
+                manager.send_history(page, websocket, chat_id)
+                continue
+
+            bypass_cache = False
+            if request is not None:
+                data = request.get("message")
+                bypass_cache = bool(request.get("bypass_cache"))
+                if not isinstance(data, str) or not data:
+                    manager.send_frame({"type": "error", "message": "Invalid message"}, websocket, chat_id)
+                    continue
+
+            # Refused before it is stored, so the chat never shows a message Harry will not answer.
+            if turns.is_full(chat_id):
+                manager.send_frame({"type": "error", "message": TURN_BUSY_MESSAGE}, websocket, chat_id)
+                continue
+
             user_message = CreateMessage(
                 chat_id=chat_id,
                 sender=ChatSender.USER.value,
@@ -154,22 +552,13 @@ async def send_message(
             )
 
             await message_controller.create_message(user_message)
-            await manager.send_message_to_chat(user_message.message, ChatSender.USER.value, chat_id)
-
-            await asyncio.sleep(0)
-
-            output = get_harry_answer(data, chat_id)
-
-            harry_message = CreateMessage(
-                chat_id=chat_id,
-                sender=ChatSender.SYSTEM.value,
-                message=output
-            )
-
-            await message_controller.create_message(harry_message)
-            await manager.send_message_to_chat(harry_message.message, ChatSender.SYSTEM.value, chat_id)
+            with span("ws.broadcast", chat_id=chat_id):
+                await manager.send_message_to_chat(user_message.message, ChatSender.USER.value, chat_id)
 
-            await asyncio.sleep(0)
+            if not turns.submit(chat_id, (data, bypass_cache, current_user.username)):
+                manager.send_frame({"type": "error", "message": TURN_BUSY_MESSAGE}, websocket, chat_id)
 
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(websocket, chat_id)
@@ -0,0 +1,21 @@
+from fastapi import APIRouter, status
+from fastapi.responses import PlainTextResponse
+from helpers import render_prometheus
+
+metrics = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@metrics.get("/metrics", status_code=status.HTTP_200_OK, response_class=PlainTextResponse)
+async def get_metrics() -> PlainTextResponse:
+    """
+    Exposes the stage latency histograms and the process counters in the Prometheus text format.
+
+    - `harry_stage_duration_seconds{stage=...}`: the duration of every traced stage, e.g.
+      `user.current_user`, `chat.exists`, `message.create`, `checkpoint.get`, `harry.llm`,
+      `checkpoint.put` or `turn`.
+    - `harry_<group>_<counter>`: the counters of the connections, the password pool, the LLM
+      gateway, the response cache, the message sink and the checkpoint retention.
+    """
+    return PlainTextResponse(render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
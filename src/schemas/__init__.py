@@ -1,4 +1,4 @@
 from .auth import Token, TokenData
 from .chat import BaseChat, ChatInDB,  CreateChat
-from .message import BaseMessage, MessageInDB,  CreateMessage
+from .message import BaseMessage, MessageInDB,  CreateMessage, MessagePage
 from .user import BaseModel, RegisterUser, LoginUser, UserInDB
\ No newline at end of file
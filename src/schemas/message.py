@@ -51,3 +51,25 @@ class MessageInDB(BaseMessage):
     """
     
     id: Optional[str] = Field(default_factory=lambda: str(ObjectId()))
+
+
+class MessagePage(BaseModel):
+    """
+    MessagePage is a Pydantic model representing one page of a chat's history.
+
+    Attributes:
+    ----------
+    messages : list[MessageInDB]
+        The messages of the page, oldest first.
+
+    cursor : Optional[str]
+        An opaque cursor pointing at the oldest message of the page. Passing it back loads the
+        page of messages right before it. None when there are no older messages.
+
+    has_more : bool
+        Whether older messages exist before this page.
+    """
+
+    messages: list[MessageInDB] = Field(default_factory=list)
+    cursor: Optional[str] = None
+    has_more: bool = False
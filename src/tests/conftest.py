@@ -0,0 +1,19 @@
+import os
+
+# The settings are validated when the app modules are imported, so the required ones get test
+# values before any test module imports them. Values already in the environment win.
+for name, value in {
+    "APP_NAME": "harry-tests",
+    "APP_VERSION": "0",
+    "MONGODB_URL": "mongodb://localhost:27017",
+    "MONGODB_DATABASE": "harry_tests",
+    "SECRET_KEY": "test-secret",
+    "ALGORITHM": "HS256",
+    "MODEL_NAME": "gemini-1.5-flash",
+    "GOOGLE_API_KEY": "test-key",
+    "LLM_PROVIDER": "fake",
+    "TRACING_ENABLED": "false",
+}.items():
+    os.environ.setdefault(name, value)
+
+import helpers  # noqa: E402,F401  `helpers` must be imported before `models` and `controllers`.
@@ -0,0 +1,60 @@
+import asyncio
+import threading
+import pytest
+from fastapi import HTTPException
+from helpers import auth
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(auth.settings, "PASSWORD_HASH_EXECUTOR", "thread")
+    monkeypatch.setattr(auth.settings, "PASSWORD_HASH_WORKERS", 2)
+    monkeypatch.setattr(auth.settings, "PASSWORD_HASH_MAX_PENDING", 2)
+    monkeypatch.setattr(auth, "_password_executor", None)
+    yield
+    auth.shutdown_password_executor()
+
+
+def test_passwords_are_hashed_and_verified_in_the_pool(pool):
+    async def scenario():
+        hashed = await auth.aget_password_hash("alohomora")
+        return await auth.averify_password("alohomora", hashed), await auth.averify_password("wrong", hashed)
+
+    assert asyncio.run(scenario()) == (True, False)
+
+
+def test_jobs_past_the_pending_limit_are_rejected_with_429(pool):
+    release = threading.Event()
+
+    async def scenario():
+        jobs = [asyncio.create_task(auth._run_password_job(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        assert auth.password_hash_metrics["in_flight"] == 2
+
+        rejected = auth.password_hash_metrics["rejected"]
+        with pytest.raises(HTTPException) as error:
+            await auth._run_password_job(release.wait)
+        assert error.value.status_code == 429
+        assert error.value.headers == {"Retry-After": "1"}
+        assert auth.password_hash_metrics["rejected"] == rejected + 1
+
+        release.set()
+        assert await asyncio.gather(*jobs) == [True, True]
+
+    asyncio.run(scenario())
+    assert auth.password_hash_metrics["in_flight"] == 0
+
+
+def test_a_failed_job_releases_its_pending_slot(pool):
+    def fail():
+        raise ValueError("bcrypt failed")
+
+    async def scenario():
+        for _ in range(3):
+            with pytest.raises(ValueError):
+                await auth._run_password_job(fail)
+        assert auth.password_hash_metrics["in_flight"] == 0
+        # The slots are free again, so jobs are not rejected.
+        return await auth._run_password_job(lambda: "ok")
+
+    assert asyncio.run(scenario()) == "ok"
@@ -0,0 +1,145 @@
+import asyncio
+import shutil
+import tempfile
+from mongomock_motor import AsyncMongoMockClient
+from helpers.broker import LocalSocketBroker, MongoChangeStreamBroker
+from enums import DataBaseEnum
+
+
+def make_broker(delta_flush_seconds: float):
+    client = AsyncMongoMockClient()
+    broker = MongoChangeStreamBroker(client, "harry", delta_flush_seconds)
+    return broker, client["harry"][DataBaseEnum.BROKER_COLLECTION.value]
+
+
+async def stored_frames(collection):
+    return [doc["frame"] async for doc in collection.find().sort("_id", 1)]
+
+
+def delta(message: str, sender: str = "harry") -> dict:
+    return {"type": "delta", "sender": sender, "message": message}
+
+
+def test_deltas_are_merged_before_the_next_frame():
+    async def scenario():
+        broker, collection = make_broker(60)
+        delivered = []
+
+        async def handler(chat_id, frame):
+            delivered.append(frame)
+
+        broker._handler = handler
+        for token in ("Hel", "lo", "!"):
+            await broker.publish("chat", delta(token))
+        await broker.publish("chat", {"type": "end", "sender": "harry"})
+
+        assert len(delivered) == 4
+        await broker.close()
+        return await stored_frames(collection)
+
+    frames = asyncio.run(scenario())
+    assert [frame["type"] for frame in frames] == ["delta", "end"]
+    assert frames[0]["message"] == "Hello!"
+
+
+def test_pending_deltas_are_flushed_after_the_delay():
+    async def scenario():
+        broker, collection = make_broker(0.01)
+        await broker.publish("chat", delta("a"))
+        await broker.publish("chat", delta("b"))
+        await asyncio.sleep(0.1)
+        return await stored_frames(collection)
+
+    frames = asyncio.run(scenario())
+    assert frames == [delta("ab")]
+
+
+def test_sender_change_and_close_flush_deltas():
+    async def scenario():
+        broker, collection = make_broker(60)
+        await broker.publish("chat", delta("a", sender="harry"))
+        await broker.publish("chat", delta("b", sender="user"))
+        await broker.publish("other", delta("c"))
+        await broker.close()
+        return await stored_frames(collection)
+
+    frames = asyncio.run(scenario())
+    assert frames == [delta("a", sender="harry"), delta("b", sender="user"), delta("c")]
+
+
+def test_zero_delay_publishes_every_delta():
+    async def scenario():
+        broker, collection = make_broker(0)
+        for token in ("a", "b"):
+            await broker.publish("chat", delta(token))
+        await broker.close()
+        return await stored_frames(collection)
+
+    assert asyncio.run(scenario()) == [delta("a"), delta("b")]
+
+
+def test_slow_inserts_do_not_hold_up_the_publisher():
+    async def scenario():
+        broker, collection = make_broker(60)
+        release = asyncio.Event()
+        insert_many = collection.insert_many
+        delivered = []
+
+        async def slow_insert_many(documents, *args, **kwargs):
+            await release.wait()
+            return await insert_many(documents, *args, **kwargs)
+
+        async def handler(chat_id, frame):
+            delivered.append(frame["type"])
+
+        # The broker's own handle on the collection, so the patched insert is the one it calls.
+        broker.collection = collection
+        collection.insert_many = slow_insert_many
+        broker._handler = handler
+        for frame_type in ("start", "message", "end"):
+            await asyncio.wait_for(broker.publish("chat", {"type": frame_type, "sender": "harry"}), 1)
+
+        assert delivered == ["start", "message", "end"]
+        assert await stored_frames(collection) == []
+        release.set()
+        await broker.close()
+        return await stored_frames(collection)
+
+    assert [frame["type"] for frame in asyncio.run(scenario())] == ["start", "message", "end"]
+
+
+def test_frames_larger_than_a_datagram_reach_the_other_workers():
+    # Unix socket paths are limited to about 100 characters, hence a short directory.
+    directory = tempfile.mkdtemp(prefix="broker-", dir="/tmp")
+
+    async def scenario():
+        sender, receiver = LocalSocketBroker(directory), LocalSocketBroker(directory)
+        received = asyncio.Queue()
+
+        async def ignore(chat_id, frame):
+            pass
+
+        async def handler(chat_id, frame):
+            received.put_nowait(frame)
+
+        await sender.start(ignore)
+        await receiver.start(handler)
+        try:
+            reply = "Expecto patronum! " * 20_000
+            assert len(reply) > 3 * LocalSocketBroker.MAX_DATAGRAM_BYTES
+            await sender.publish("chat", {"type": "message", "sender": "harry", "message": "short"})
+            await sender.publish("chat", {"type": "end", "sender": "harry", "message": reply})
+
+            first = await asyncio.wait_for(received.get(), 1)
+            second = await asyncio.wait_for(received.get(), 1)
+        finally:
+            await sender.close()
+            await receiver.close()
+
+        assert first["message"] == "short"
+        assert second == {"type": "end", "sender": "harry", "message": reply}
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,20 @@
+import asyncio
+from helpers import get_settings, reload_settings, settings_dependency
+
+
+def test_settings_are_loaded_once_and_shared():
+    assert get_settings() is get_settings()
+    assert asyncio.run(settings_dependency()) is get_settings()
+
+
+def test_reload_picks_up_new_values(monkeypatch):
+    cached = get_settings()
+    monkeypatch.setenv("SLOW_TURN_SECONDS", str(cached.SLOW_TURN_SECONDS + 1))
+    try:
+        reloaded = reload_settings()
+
+        assert reloaded is not cached and get_settings() is reloaded
+        assert reloaded.SLOW_TURN_SECONDS == cached.SLOW_TURN_SECONDS + 1
+    finally:
+        monkeypatch.undo()
+        reload_settings()
@@ -0,0 +1,54 @@
+import json
+import pytest
+from enums import ChatProtocol
+from helpers import frames
+from helpers.frames import EncodedFrame, encode_frame, negotiate_protocol
+
+FRAME = {"type": "delta", "sender": "SYSTEM", "message": "Wingardium Leviósa ✨"}
+
+
+def test_msgpack_is_preferred_and_round_trips():
+    msgpack = pytest.importorskip("msgpack")
+
+    protocol = negotiate_protocol([ChatProtocol.JSON.value, ChatProtocol.MSGPACK.value])
+    data = encode_frame(FRAME, protocol)
+
+    assert protocol is ChatProtocol.MSGPACK
+    assert isinstance(data, bytes) and msgpack.unpackb(data) == FRAME
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_json_frames_round_trip_as_text(monkeypatch, use_orjson):
+    if use_orjson:
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(frames, "orjson", None)
+
+    protocol = negotiate_protocol([ChatProtocol.JSON.value])
+    data = encode_frame(FRAME, protocol)
+
+    assert protocol is ChatProtocol.JSON
+    assert isinstance(data, str) and json.loads(data) == FRAME
+
+
+def test_clients_without_a_known_subprotocol_get_json():
+    assert negotiate_protocol([]) is None
+    assert negotiate_protocol(["chat.v2"]) is None
+
+
+def test_msgpack_is_not_offered_without_msgpack(monkeypatch):
+    monkeypatch.setattr(frames, "msgpack", None)
+
+    assert negotiate_protocol([ChatProtocol.MSGPACK.value]) is None
+    assert negotiate_protocol([ChatProtocol.MSGPACK.value, ChatProtocol.JSON.value]) is ChatProtocol.JSON
+
+
+def test_a_frame_is_encoded_once_per_protocol(monkeypatch):
+    calls = []
+    monkeypatch.setattr(frames, "encode_frame", lambda frame, protocol: calls.append(protocol) or "{}")
+    encoded = EncodedFrame(FRAME)
+
+    for _ in range(3):
+        encoded.encode(ChatProtocol.JSON)
+
+    assert calls == [ChatProtocol.JSON]
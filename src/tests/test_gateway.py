@@ -0,0 +1,61 @@
+import asyncio
+import pytest
+from llm.fake import FakeChatModel
+from llm.gateway import CircuitBreaker, LLMGateway
+
+
+def make_gateway(breaker: CircuitBreaker) -> LLMGateway:
+    return LLMGateway(max_concurrency=4, max_per_user=0, timeout=5, hedge=False, breaker=breaker)
+
+
+def open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+    breaker.record_failure()
+    return breaker
+
+
+def test_a_failed_probe_reopens_the_circuit():
+    async def scenario():
+        breaker = open_breaker()
+        reply = await make_gateway(breaker).ainvoke(FakeChatModel(latency_seconds=0, failure_rate=1.0), "hi")
+
+        assert reply.response_metadata.get("fallback")
+        assert breaker.state == "open"
+
+    asyncio.run(scenario())
+
+
+def test_a_cancelled_probe_does_not_hold_the_circuit_half_open():
+    async def scenario():
+        breaker = open_breaker()
+        gateway = make_gateway(breaker)
+
+        probe = asyncio.create_task(gateway.ainvoke(FakeChatModel(latency_seconds=60), "hi"))
+        await asyncio.sleep(0.05)
+        assert breaker.state == "half-open"
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        assert breaker.state == "open"
+        reply = await gateway.ainvoke(FakeChatModel(latency_seconds=0, tokens_per_second=0), "hi")
+        assert not reply.response_metadata.get("fallback")
+        assert breaker.state == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_an_interrupted_sync_probe_is_released():
+    class Interrupted(BaseException):
+        pass
+
+    class InterruptedModel(FakeChatModel):
+        def invoke(self, input, config=None, **kwargs):
+            raise Interrupted()
+
+    breaker = open_breaker()
+    with pytest.raises(Interrupted):
+        make_gateway(breaker).invoke(InterruptedModel(), "hi")
+
+    assert breaker.state == "open"
+    assert breaker.allow() and breaker.state == "half-open"
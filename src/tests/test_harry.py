@@ -0,0 +1,122 @@
+import asyncio
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+from llm import harry
+from llm.fake import FakeChatModel
+from llm.gateway import CircuitBreaker, LLMGateway, LLMUnavailableError
+
+REPLY = "Blimey!"
+
+
+class CountingChatModel(FakeChatModel):
+    calls: int = 0
+
+    def _tokens(self) -> list[str]:
+        self.calls += 1
+        return super()._tokens()
+
+
+@pytest.fixture(autouse=True)
+def context(monkeypatch):
+    monkeypatch.setattr(harry.settings, "CONTEXT_MAX_TURNS", 2)
+    monkeypatch.setattr(harry.settings, "CONTEXT_MAX_TOKENS", 0)
+    monkeypatch.setattr(harry.settings, "CONTEXT_SUMMARIZE", True)
+    monkeypatch.setattr(harry.settings, "CONTEXT_COMPACT_RATIO", 0.5)
+    # A gateway of their own, so the failures of one test never open the circuit of another.
+    breaker = CircuitBreaker(failure_threshold=100, reset_seconds=60)
+    monkeypatch.setattr(harry, "_gateway", LLMGateway(4, 0, 5, False, breaker))
+
+
+def make_graph(summarizer: FakeChatModel):
+    model = FakeChatModel(reply=REPLY, latency_seconds=0, tokens_per_second=0)
+    return harry.create_graph(
+        checkpointer=MemorySaver(),
+        chain=harry.build_chain(model=model),
+        summary_chain=harry.build_summary_chain(model=summarizer),
+    )
+
+
+@pytest.fixture
+def summarizer():
+    return CountingChatModel(reply="They talked about Quidditch.", latency_seconds=0, tokens_per_second=0)
+
+
+@pytest.fixture
+def graph(summarizer):
+    return make_graph(summarizer)
+
+
+def config(thread_id: str) -> dict:
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def test_short_chats_are_answered_without_compaction(graph):
+    # The compact node has nothing to drop here and must not send an empty update.
+    state = graph.invoke({"messages": [("human", "Hello")]}, config("sync"))
+    assert [message.content for message in state["messages"]] == ["Hello", REPLY]
+    assert "summary" not in state
+
+    state = asyncio.run(graph.ainvoke({"messages": [("human", "Hello")]}, config("async")))
+    assert [message.content for message in state["messages"]] == ["Hello", REPLY]
+
+
+def test_old_turns_are_folded_into_the_summary(graph):
+    async def scenario():
+        for turn in range(4):
+            state = await graph.ainvoke({"messages": [("human", f"Question {turn}")]}, config("chat"))
+        return state
+
+    state = asyncio.run(scenario())
+
+    # The third turn overflows the window, which is compacted down to its latest turn before
+    # the reply; the fourth turn then fits within the limit.
+    assert [type(message) for message in state["messages"]] == [HumanMessage, AIMessage, HumanMessage, AIMessage]
+    assert [message.content for message in state["messages"] if isinstance(message, HumanMessage)] == [
+        "Question 2",
+        "Question 3",
+    ]
+    assert state["summary"] == "They talked about Quidditch."
+
+
+def test_fallback_replies_are_not_stored():
+    failing = FakeChatModel(latency_seconds=0, failure_rate=1.0)
+    graph = harry.create_graph(checkpointer=MemorySaver(), chain=harry.build_chain(model=failing))
+
+    with pytest.raises(LLMUnavailableError) as sync_error:
+        graph.invoke({"messages": [("human", "Hello")]}, config("sync"))
+    with pytest.raises(LLMUnavailableError) as async_error:
+        asyncio.run(graph.ainvoke({"messages": [("human", "Hello")]}, config("async")))
+
+    for error, thread_id in ((sync_error, "sync"), (async_error, "async")):
+        assert error.value.reply
+        messages = graph.get_state(config(thread_id)).values["messages"]
+        assert not any(isinstance(message, AIMessage) for message in messages)
+
+
+def test_the_summary_is_updated_once_every_few_turns(monkeypatch, summarizer):
+    monkeypatch.setattr(harry.settings, "CONTEXT_MAX_TURNS", 4)
+    graph = make_graph(summarizer)
+
+    async def scenario():
+        for turn in range(10):
+            await graph.ainvoke({"messages": [("human", f"Question {turn}")]}, config("chat"))
+
+    asyncio.run(scenario())
+
+    # Compacting down to 2 turns leaves room for 2 more before the next summary: turns 5, 8.
+    assert summarizer.calls == 2
+
+
+def test_a_failed_summary_keeps_the_window():
+    graph = make_graph(FakeChatModel(latency_seconds=0, failure_rate=1.0))
+
+    async def scenario():
+        for turn in range(3):
+            state = await graph.ainvoke({"messages": [("human", f"Question {turn}")]}, config("chat"))
+        return state
+
+    state = asyncio.run(scenario())
+
+    assert len(state["messages"]) == 6 and state["messages"][-1].content == REPLY
+    assert "summary" not in state
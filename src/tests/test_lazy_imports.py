@@ -0,0 +1,27 @@
+import os
+import subprocess
+import sys
+
+SRC = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY = ("langchain", "langchain_core", "langgraph", "langchain_google_genai")
+
+
+def loaded_after(code: str) -> set[str]:
+    """
+    Runs `code` in a fresh interpreter, since this one already imported the LLM stack, and
+    returns the top-level packages of `HEAVY` it loaded.
+    """
+    script = f"{code}\nimport sys\nprint(' '.join(sorted({{name.split('.')[0] for name in sys.modules}})))"
+    result = subprocess.run(
+        [sys.executable, "-c", script], cwd=SRC, env=os.environ.copy(), capture_output=True, text=True, check=True
+    )
+    return set(result.stdout.split()) & set(HEAVY)
+
+
+def test_importing_the_app_does_not_load_the_llm_stack():
+    assert loaded_after("import main") == set()
+
+
+def test_the_llm_stack_is_loaded_on_first_use():
+    assert {"langchain_core", "langgraph"} <= loaded_after("import helpers, llm\nllm.get_graph")
@@ -0,0 +1,45 @@
+import asyncio
+import time
+from helpers.loop_monitor import LoopMonitor, loop_monitor_metrics, tag_current_task
+
+
+def block_the_loop(seconds: float) -> None:
+    time.sleep(seconds)
+
+
+def test_a_blocked_loop_is_recorded_as_a_stall():
+    async def scenario():
+        monitor = LoopMonitor(interval=0.01, threshold=0.05, max_stalls=10)
+        monitor.start()
+        try:
+            await asyncio.sleep(0.05)
+            tag_current_task(route="/tests", chat_id="chat")
+            block_the_loop(0.3)
+            # Lets the heartbeat run, which closes the stall.
+            await asyncio.sleep(0.05)
+            return monitor.snapshot()
+        finally:
+            await monitor.stop()
+
+    stalls_before = loop_monitor_metrics["stalls"]
+    snapshot = asyncio.run(scenario())
+
+    assert loop_monitor_metrics["stalls"] - stalls_before == 1
+    [stall] = snapshot["recent_stalls"]
+    assert stall["blocked_seconds"] >= 0.2
+    assert stall["route"] == "/tests" and stall["chat_id"] == "chat"
+    assert stall["samples"] and "block_the_loop" in stall["samples"][0]
+    assert snapshot["lag_seconds_max"] >= 0.2
+
+
+def test_a_responsive_loop_records_no_stall():
+    async def scenario():
+        monitor = LoopMonitor(interval=0.01, threshold=0.2, max_stalls=10)
+        monitor.start()
+        try:
+            await asyncio.sleep(0.1)
+            return monitor.snapshot()
+        finally:
+            await monitor.stop()
+
+    assert asyncio.run(scenario())["recent_stalls"] == []
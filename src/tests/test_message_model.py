@@ -0,0 +1,69 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId
+from mongomock_motor import AsyncMongoMockClient
+from helpers import get_settings
+from enums import ChatSender
+from models.message_model import MessageModel
+
+
+@pytest.fixture
+def model(monkeypatch):
+    monkeypatch.setattr(get_settings(), "MESSAGE_WRITE_BEHIND", False)
+    return MessageModel(AsyncMongoMockClient()["harry"])
+
+
+def insert_messages(model: MessageModel, timestamps: list[datetime]) -> list[str]:
+    documents = [
+        {"_id": ObjectId(), "chat_id": "chat", "sender": ChatSender.USER.value, "message": f"message {i}", "timestamp": timestamp}
+        for i, timestamp in enumerate(timestamps)
+    ]
+    asyncio.run(model.collection.insert_many(documents))
+    return [document["message"] for document in documents]
+
+
+def read_all_pages(model: MessageModel, limit: int) -> list[list[str]]:
+    async def scenario():
+        pages, cursor = [], None
+        while True:
+            page = await model.get_chat_page("chat", limit, before=cursor)
+            pages.append([message.message for message in page.messages])
+            if not page.has_more:
+                assert page.cursor is None
+                return pages
+            cursor = page.cursor
+
+    return asyncio.run(scenario())
+
+
+def test_pages_with_equal_timestamps_have_no_duplicates_or_gaps(model):
+    now = datetime(2024, 1, 1, 12, 0)
+    # Several messages share each timestamp, and the ties straddle the page boundaries.
+    timestamps = [now] * 4 + [now + timedelta(seconds=1)] * 3 + [now + timedelta(seconds=2)]
+    expected = insert_messages(model, timestamps)
+
+    pages = read_all_pages(model, limit=3)
+
+    assert [len(page) for page in pages] == [3, 3, 2]
+    assert [message for page in reversed(pages) for message in page] == expected
+
+
+def test_the_last_page_is_exactly_full(model):
+    now = datetime(2024, 1, 1, 12, 0)
+    expected = insert_messages(model, [now] * 4)
+
+    pages = read_all_pages(model, limit=2)
+
+    assert pages == [expected[2:], expected[:2]]
+
+
+def test_an_empty_chat_has_one_empty_page(model):
+    assert read_all_pages(model, limit=5) == [[]]
+
+
+@pytest.mark.parametrize("cursor", ["garbage", "2024-01-01T12:00:00", "not-a-date|65a000000000000000000000",
+                                    "2024-01-01T12:00:00|not-an-id", "a|b|c"])
+def test_malformed_cursors_are_rejected(model, cursor):
+    with pytest.raises(ValueError):
+        asyncio.run(model.get_chat_page("chat", 10, before=cursor))
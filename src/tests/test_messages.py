@@ -0,0 +1,175 @@
+import asyncio
+import json
+import time
+import pytest
+import llm
+from routes import messages
+
+
+class Recorder:
+    def __init__(self):
+        self.frames: list[dict] = []
+        self.stored: list = []
+
+    async def send_frame_to_chat(self, frame, chat_id):
+        self.frames.append(frame)
+
+    async def create_message(self, message):
+        self.stored.append(message)
+
+
+@pytest.fixture
+def recorder(monkeypatch):
+    recorder = Recorder()
+
+    async def warmup():
+        pass
+
+    monkeypatch.setattr(messages.manager, "send_frame_to_chat", recorder.send_frame_to_chat)
+    monkeypatch.setattr(messages, "get_message_controller", lambda: recorder)
+    monkeypatch.setattr(llm, "warmup", warmup)
+    monkeypatch.setattr(messages.settings, "STREAM_RESPONSES", True)
+    return recorder
+
+
+def test_a_reply_interrupted_by_a_fallback_ends_with_an_error_frame(recorder, monkeypatch):
+    async def astream_harry_answer(*args):
+        yield "delta", "Blimey"
+        raise llm.LLMUnavailableError("Sorry, my wand is playing up.")
+
+    monkeypatch.setattr(llm, "astream_harry_answer", astream_harry_answer)
+    asyncio.run(messages.run_harry_turn("chat", [("Hello", False, "harry")]))
+
+    assert [frame["type"] for frame in recorder.frames] == ["start", "delta", "error"]
+    assert recorder.frames[-1]["message"] == "Sorry, my wand is playing up."
+    assert recorder.frames[-1]["fallback"] is True
+    assert recorder.stored == []
+
+
+def test_a_failed_turn_ends_with_an_error_frame(recorder, monkeypatch):
+    async def astream_harry_answer(*args):
+        yield "delta", "Blimey"
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(llm, "astream_harry_answer", astream_harry_answer)
+    with pytest.raises(RuntimeError):
+        asyncio.run(messages.run_harry_turn("chat", [("Hello", False, "harry")]))
+
+    assert [frame["type"] for frame in recorder.frames] == ["start", "delta", "error"]
+    assert recorder.frames[-1]["message"] == messages.TURN_ERROR_MESSAGE
+    assert "fallback" not in recorder.frames[-1]
+    assert recorder.stored == []
+
+
+class FakeWebSocket:
+    """
+    Records the frames sent to it; a stalled socket never completes a send.
+    """
+
+    def __init__(self, stalled: bool = False, subprotocols: tuple = ()):
+        self.stalled = stalled
+        self.scope = {"subprotocols": list(subprotocols)}
+        self.subprotocol = None
+        self.sent: list = []
+        self.close_code = None
+
+    async def accept(self, subprotocol=None):
+        self.subprotocol = subprotocol
+
+    async def send_text(self, data):
+        if self.stalled:
+            await asyncio.Event().wait()
+        self.sent.append(data)
+
+    send_bytes = send_text
+
+    async def close(self, code):
+        self.close_code = code
+
+
+def test_a_slow_consumer_is_evicted_without_holding_up_the_chat(monkeypatch):
+    monkeypatch.setattr(messages.settings, "WEBSOCKET_SEND_QUEUE_SIZE", 3)
+
+    async def scenario():
+        manager = messages.ConnectionManager()
+        healthy, stalled = FakeWebSocket(), FakeWebSocket(stalled=True)
+        await manager.connect(healthy, "chat")
+        await manager.connect(stalled, "chat")
+
+        for i in range(10):
+            await manager.send_message_to_chat(f"message {i}", "USER", "chat")
+            # Gives the healthy writer time to send; the stalled one never does.
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0.01)
+
+        assert manager.active_connections["chat"] == [healthy]
+        assert id(stalled) not in manager.writers
+        assert stalled.close_code == messages.status.WS_1013_TRY_AGAIN_LATER
+        assert len(healthy.sent) == 10
+        manager.disconnect(healthy, "chat")
+
+    asyncio.run(scenario())
+
+
+def test_a_send_that_times_out_disconnects_the_connection(monkeypatch):
+    monkeypatch.setattr(messages.settings, "WEBSOCKET_SEND_TIMEOUT_SECONDS", 0.02)
+
+    async def scenario():
+        manager = messages.ConnectionManager()
+        healthy, stalled = FakeWebSocket(), FakeWebSocket(stalled=True)
+        await manager.connect(healthy, "chat")
+        await manager.connect(stalled, "chat")
+
+        await manager.send_message_to_chat("first", "USER", "chat")
+        await asyncio.sleep(0.1)
+        await manager.send_message_to_chat("second", "USER", "chat")
+        await asyncio.sleep(0.01)
+
+        assert manager.active_connections["chat"] == [healthy]
+        assert stalled.close_code == messages.status.WS_1011_INTERNAL_ERROR
+        assert len(healthy.sent) == 2
+        manager.disconnect(healthy, "chat")
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("subprotocols, accepted", [
+    ((messages.ChatProtocol.MSGPACK.value,), messages.ChatProtocol.MSGPACK.value),
+    ((messages.ChatProtocol.JSON.value,), messages.ChatProtocol.JSON.value),
+    ((), None),
+])
+def test_frames_are_sent_in_the_negotiated_protocol(subprotocols, accepted):
+    msgpack = pytest.importorskip("msgpack")
+
+    async def scenario():
+        manager = messages.ConnectionManager()
+        websocket = FakeWebSocket(subprotocols=subprotocols)
+        await manager.connect(websocket, "chat")
+        await manager.send_message_to_chat("Hello", "USER", "chat")
+        await asyncio.sleep(0.01)
+        manager.disconnect(websocket, "chat")
+        return websocket
+
+    websocket = asyncio.run(scenario())
+
+    assert websocket.subprotocol == accepted
+    [data] = websocket.sent
+    frame = msgpack.unpackb(data) if isinstance(data, bytes) else json.loads(data)
+    assert isinstance(data, bytes) == (accepted == messages.ChatProtocol.MSGPACK.value)
+    assert frame == {"type": "message", "sender": "USER", "message": "Hello"}
+
+
+def test_the_deadline_starts_with_the_turn(recorder, monkeypatch):
+    deadlines = []
+
+    async def astream_harry_answer(query, chat_id, bypass_cache, user_id, deadline):
+        deadlines.append(deadline)
+        yield "end", "Blimey!"
+
+    monkeypatch.setattr(llm, "astream_harry_answer", astream_harry_answer)
+    started = time.time()
+    asyncio.run(messages.run_harry_turn("chat", [("Hello", False, "harry"), ("Still there?", False, "harry")]))
+
+    budget = messages.settings.TURN_DEADLINE_SECONDS
+    assert started + budget <= deadlines[0] <= time.time() + budget
+    assert [message.message for message in recorder.stored] == ["Blimey!"]
@@ -0,0 +1,266 @@
+import asyncio
+import mongomock
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.base import empty_checkpoint
+from mongomock_motor import AsyncMongoMockClient
+from enums import DataBaseEnum
+from llm.codecs import CheckpointCodec, CodecRegistry, ZstdCodec, zstandard
+from llm.mongo_db_saver import AsyncMongoDBSaver, MongoDBSaver
+
+THREAD = "chat-1"
+
+
+class SyncSaver:
+    """
+    Exposes the pymongo saver through the same coroutines as the Motor one, so every scenario
+    runs unchanged against both.
+    """
+
+    def __init__(self, saver: MongoDBSaver):
+        self.saver = saver
+        self.checkpoints = saver.checkpoints
+
+    async def put(self, config, checkpoint, metadata):
+        return self.saver.put(config, checkpoint, metadata, {})
+
+    async def put_writes(self, config, writes, task_id):
+        self.saver.put_writes(config, writes, task_id)
+
+    async def get_tuple(self, config):
+        return self.saver.get_tuple(config)
+
+    async def list(self, config, **kwargs):
+        return list(self.saver.list(config, **kwargs))
+
+    async def find_docs(self):
+        return list(self.checkpoints.find({}).sort("checkpoint_id", 1))
+
+
+class AsyncSaver:
+    def __init__(self, saver: AsyncMongoDBSaver):
+        self.saver = saver
+        self.checkpoints = saver.checkpoints
+
+    async def put(self, config, checkpoint, metadata):
+        return await self.saver.aput(config, checkpoint, metadata, {})
+
+    async def put_writes(self, config, writes, task_id):
+        await self.saver.aput_writes(config, writes, task_id)
+
+    async def get_tuple(self, config):
+        return await self.saver.aget_tuple(config)
+
+    async def list(self, config, **kwargs):
+        return [checkpoint async for checkpoint in self.saver.alist(config, **kwargs)]
+
+    async def find_docs(self):
+        return await self.checkpoints.find({}).sort("checkpoint_id", 1).to_list(length=None)
+
+
+def make_saver(kind: str, client=None, **options):
+    if kind == "sync":
+        return SyncSaver(MongoDBSaver(client or mongomock.MongoClient(), "checkpoints", **options))
+    return AsyncSaver(AsyncMongoDBSaver(client or AsyncMongoMockClient(), "checkpoints", **options))
+
+
+def make_checkpoint(step: int, messages: list) -> dict:
+    checkpoint = empty_checkpoint()
+    # Checkpoint IDs sort in the order they were written, like LangGraph's uuid6 IDs.
+    checkpoint["id"] = f"checkpoint-{step:04d}"
+    checkpoint["ts"] = f"2024-01-01T00:00:{step:02d}+00:00"
+    checkpoint["channel_values"] = {"messages": list(messages), "summary": f"summary {step}"}
+    checkpoint["channel_versions"] = {"messages": step, "summary": step}
+    return checkpoint
+
+
+def conversation(turns: int, keep_turns: int = 0) -> list[list]:
+    """
+    Returns the message list of every checkpoint of a conversation, one checkpoint per turn,
+    optionally keeping only the last `keep_turns` turns like the context compaction does.
+    """
+    messages, states = [], []
+    for turn in range(turns):
+        messages = messages + [
+            HumanMessage(content=f"Question {turn}", id=f"human-{turn}"),
+            AIMessage(content=f"Answer {turn}", id=f"ai-{turn}"),
+        ]
+        if keep_turns:
+            messages = messages[-2 * keep_turns:]
+        states.append(messages)
+    return states
+
+
+async def write_chain(saver, states: list[list]) -> list[dict]:
+    """
+    Writes one checkpoint per state, each the child of the previous one, and returns them.
+    """
+    config = {"configurable": {"thread_id": THREAD, "checkpoint_ns": ""}}
+    checkpoints = []
+    for step, messages in enumerate(states):
+        checkpoint = make_checkpoint(step, messages)
+        config = await saver.put(config, checkpoint, {"source": "loop", "step": step})
+        checkpoints.append(checkpoint)
+    return checkpoints
+
+
+def thread_config(checkpoint_id: str = None) -> dict:
+    configurable = {"thread_id": THREAD, "checkpoint_ns": ""}
+    if checkpoint_id is not None:
+        configurable["checkpoint_id"] = checkpoint_id
+    return {"configurable": configurable}
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+@pytest.mark.parametrize("kind", ["sync", "async"])
+def test_round_trip(kind):
+    async def scenario():
+        saver = make_saver(kind)
+        assert await saver.get_tuple(thread_config()) is None
+
+        checkpoints = await write_chain(saver, conversation(3))
+        await saver.put_writes(
+            thread_config(checkpoints[-1]["id"]), [("messages", ["pending"]), ("summary", "next")], "task-1"
+        )
+
+        latest = await saver.get_tuple(thread_config())
+        assert latest.checkpoint == checkpoints[-1]
+        assert latest.metadata == {"source": "loop", "step": 2}
+        assert latest.parent_config == thread_config(checkpoints[1]["id"])
+        assert latest.pending_writes == [("task-1", "messages", ["pending"]), ("task-1", "summary", "next")]
+
+        first = await saver.get_tuple(thread_config(checkpoints[0]["id"]))
+        assert first.checkpoint == checkpoints[0]
+        assert first.parent_config is None
+        assert first.pending_writes == []
+
+        listed = await saver.list(thread_config())
+        assert [item.checkpoint for item in listed] == checkpoints[::-1]
+        assert [item.checkpoint["id"] for item in await saver.list(thread_config(), limit=1)] == [checkpoints[-1]["id"]]
+        before = await saver.list(thread_config(), before=thread_config(checkpoints[-1]["id"]))
+        assert [item.checkpoint["id"] for item in before] == [checkpoints[1]["id"], checkpoints[0]["id"]]
+
+    run(scenario())
+
+
+@pytest.mark.parametrize("kind", ["sync", "async"])
+def test_put_writes_is_idempotent(kind):
+    async def scenario():
+        saver = make_saver(kind)
+        checkpoints = await write_chain(saver, conversation(1))
+        config = thread_config(checkpoints[0]["id"])
+        await saver.put_writes(config, [("messages", ["first"])], "task-1")
+        await saver.put_writes(config, [("messages", ["retried"])], "task-1")
+
+        assert (await saver.get_tuple(config)).pending_writes == [("task-1", "messages", ["retried"])]
+
+    run(scenario())
+
+
+@pytest.mark.parametrize("kind", ["sync", "async"])
+@pytest.mark.parametrize("keep_turns", [0, 2])
+def test_deltas_rebuild_every_checkpoint(kind, keep_turns):
+    async def scenario():
+        saver = make_saver(kind, snapshot_interval=3)
+        checkpoints = await write_chain(saver, conversation(7, keep_turns))
+
+        docs = await saver.find_docs()
+        assert [doc["storage"] for doc in docs] == ["snapshot", "delta", "delta"] * 2 + ["snapshot"]
+        for doc in docs:
+            stored_values = saver.saver.serde.loads_typed((doc["type"], doc["checkpoint"]))["channel_values"]
+            assert ("messages" in stored_values) == (doc["storage"] == "snapshot")
+        if keep_turns:
+            assert any(doc.get("drop") for doc in docs)
+
+        for checkpoint in checkpoints:
+            stored = await saver.get_tuple(thread_config(checkpoint["id"]))
+            assert stored.checkpoint == checkpoint
+
+        listed = await saver.list(thread_config())
+        assert [item.checkpoint for item in listed] == checkpoints[::-1]
+
+    run(scenario())
+
+
+@pytest.mark.parametrize("kind", ["sync", "async"])
+def test_a_fork_starts_a_new_snapshot(kind):
+    async def scenario():
+        saver = make_saver(kind, snapshot_interval=10)
+        checkpoints = await write_chain(saver, conversation(3))
+
+        # A checkpoint whose parent is not the last one written, e.g. a replayed turn.
+        fork = make_checkpoint(10, conversation(2)[-1] + [HumanMessage(content="Again", id="human-again")])
+        await saver.put(thread_config(checkpoints[0]["id"]), fork, {"source": "fork", "step": 10})
+
+        docs = await saver.find_docs()
+        assert docs[-1]["storage"] == "snapshot"
+        assert (await saver.get_tuple(thread_config(fork["id"]))).checkpoint == fork
+
+    run(scenario())
+
+
+def test_sync_and_async_savers_store_the_same_documents():
+    async def scenario():
+        stored = []
+        for kind in ("sync", "async"):
+            saver = make_saver(kind, snapshot_interval=3)
+            await write_chain(saver, conversation(5, keep_turns=2))
+            stored.append([{key: value for key, value in doc.items() if key != "_id"} for doc in await saver.find_docs()])
+
+        assert stored[0] == stored[1]
+
+    run(scenario())
+
+
+@pytest.mark.skipif(zstandard is None, reason="zstandard is not installed")
+@pytest.mark.parametrize("kind", ["sync", "async"])
+def test_zstd_codec_round_trip(kind):
+    async def scenario():
+        saver = make_saver(kind, snapshot_interval=3, codecs=CodecRegistry(ZstdCodec()))
+        checkpoints = await write_chain(saver, conversation(4))
+        await saver.put_writes(thread_config(checkpoints[-1]["id"]), [("summary", "x" * 500)], "task-1")
+
+        docs = await saver.find_docs()
+        assert {doc["codec"] for doc in docs} == {"zstd"}
+
+        latest = await saver.get_tuple(thread_config())
+        assert latest.checkpoint == checkpoints[-1]
+        assert latest.pending_writes == [("task-1", "summary", "x" * 500)]
+
+    run(scenario())
+
+
+@pytest.mark.skipif(zstandard is None, reason="zstandard is not installed")
+def test_codecs_read_each_others_documents():
+    client = mongomock.MongoClient()
+    raw = MongoDBSaver(client, "checkpoints")
+    compressed = MongoDBSaver(client, "checkpoints", codecs=CodecRegistry(ZstdCodec()))
+    config = {"configurable": {"thread_id": THREAD, "checkpoint_ns": ""}}
+
+    # Documents written before the codec was introduced have no codec field.
+    legacy = make_checkpoint(0, conversation(1)[0])
+    config = raw.put(config, legacy, {"step": 0}, {})
+    raw.checkpoints.update_many({}, {"$unset": {"codec": ""}})
+    assert compressed.get_tuple(config).checkpoint == legacy
+
+    newer = make_checkpoint(1, conversation(2)[1])
+    config = compressed.put(config, newer, {"step": 1}, {})
+    # A process without the zstd writer still decodes zstd documents.
+    assert raw.get_tuple(config).checkpoint == newer
+
+    raw.checkpoints.update_many({}, {"$set": {"codec": "zstd:42"}})
+    with pytest.raises(ValueError):
+        raw.get_tuple(config)
+
+
+def test_identity_codec_stores_serialized_blobs_unchanged():
+    saver = MongoDBSaver(mongomock.MongoClient(), "checkpoints", codecs=CodecRegistry(CheckpointCodec()))
+    checkpoint = make_checkpoint(0, conversation(1)[0])
+    saver.put({"configurable": {"thread_id": THREAD, "checkpoint_ns": ""}}, checkpoint, {}, {})
+
+    doc = saver.db[DataBaseEnum.CHECKPOINT_COLLECTION.value].find_one()
+    assert doc["codec"] == "identity"
+    assert (doc["type"], doc["checkpoint"]) == saver.serde.dumps_typed(checkpoint)
@@ -0,0 +1,18 @@
+from llm.response_cache import ResponseCache, response_cache_metrics
+
+
+def test_prompts_are_matched_after_normalization():
+    cache = ResponseCache(maxsize=10, ttl=60)
+    cache.store("Hello, Harry!", "Hi there.")
+
+    assert cache.lookup("  hello   harry ") == "Hi there."
+
+
+def test_prompts_without_words_are_not_cached():
+    cache = ResponseCache(maxsize=10, ttl=60)
+    stores = response_cache_metrics["stores"]
+    cache.store("👍", "Glad you liked it.")
+
+    assert response_cache_metrics["stores"] == stores
+    assert cache.lookup("?!") is None
+    assert cache.lookup("😡") is None
@@ -0,0 +1,65 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from mongomock_motor import AsyncMongoMockClient
+from enums import DataBaseEnum
+from llm import retention
+from llm.retention import acquire_lease, retention_metrics, run_retention
+
+
+def test_only_one_worker_holds_the_lease():
+    async def scenario():
+        db = AsyncMongoMockClient()["checkpoints"]
+
+        assert await acquire_lease(db, "job", "worker-1", 60)
+        assert not await acquire_lease(db, "job", "worker-2", 60)
+        # The holder renews its lease.
+        assert await acquire_lease(db, "job", "worker-1", 60)
+        # Other jobs have their own lease.
+        assert await acquire_lease(db, "other-job", "worker-2", 60)
+
+    asyncio.run(scenario())
+
+
+def test_an_expired_lease_is_taken_over():
+    async def scenario():
+        db = AsyncMongoMockClient()["checkpoints"]
+        assert await acquire_lease(db, "job", "worker-1", 60)
+
+        await db[DataBaseEnum.LEASE_COLLECTION.value].update_one(
+            {"_id": "job"}, {"$set": {"expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)}}
+        )
+        assert await acquire_lease(db, "job", "worker-2", 60)
+        assert not await acquire_lease(db, "job", "worker-1", 60)
+
+    asyncio.run(scenario())
+
+
+def test_a_pass_reports_the_bytes_it_reclaimed(monkeypatch):
+    async def no_orphans(db):
+        return {"writes_deleted": 0}
+
+    # mongomock does not implement the $lookup pipeline that finds orphaned writes.
+    monkeypatch.setattr(retention, "prune_orphaned_writes", no_orphans)
+
+    async def scenario():
+        db = AsyncMongoMockClient()["checkpoints"]
+        checkpoints = db[DataBaseEnum.CHECKPOINT_COLLECTION.value]
+        writes = db[DataBaseEnum.CHECKPOINT_WRITES_COLLECTION.value]
+        thread = {"thread_id": "chat", "checkpoint_ns": ""}
+        await checkpoints.insert_many([{**thread, "checkpoint_id": f"{i:04d}"} for i in range(5)])
+        await writes.insert_many([{**thread, "checkpoint_id": f"{i:04d}", "idx": 0} for i in range(5)])
+
+        sizes = {DataBaseEnum.CHECKPOINT_COLLECTION.value: 1000, DataBaseEnum.CHECKPOINT_WRITES_COLLECTION.value: 100}
+
+        async def command(name, collection):
+            assert name == "collStats"
+            return {"avgObjSize": sizes[collection]}
+
+        db.command = command
+        before = retention_metrics["bytes_reclaimed"]
+        stats = await run_retention(db, keep_last=2)
+
+        assert stats == {"checkpoints_deleted": 3, "writes_deleted": 3, "bytes_reclaimed": 3 * 1000 + 3 * 100}
+        assert retention_metrics["bytes_reclaimed"] - before == 3300
+
+    asyncio.run(scenario())
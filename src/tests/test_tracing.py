@@ -0,0 +1,56 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from helpers import get_settings, span
+from routes import metrics
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(get_settings(), "TRACING_ENABLED", True)
+    app = FastAPI()
+    app.include_router(metrics)
+    return TestClient(app)
+
+
+def series(body: str, prefix: str) -> dict[str, float]:
+    return {
+        name: float(value)
+        for name, value in (line.rsplit(" ", 1) for line in body.splitlines() if not line.startswith("#"))
+        if name.startswith(prefix)
+    }
+
+
+def test_a_traced_span_is_exposed_as_a_prometheus_histogram(client):
+    with span("tests.stage"):
+        pass
+    with pytest.raises(RuntimeError):
+        with span("tests.stage"):
+            raise RuntimeError("boom")
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "text/plain; version=0.0.4; charset=utf-8"
+    body = response.text
+    assert "# TYPE harry_stage_duration_seconds histogram" in body
+
+    buckets = series(body, 'harry_stage_duration_seconds_bucket{stage="tests.stage",')
+    counts = list(buckets.values())
+    assert counts == sorted(counts), "buckets must be cumulative"
+    assert buckets['harry_stage_duration_seconds_bucket{stage="tests.stage",le="+Inf"}'] == 2
+    assert series(body, 'harry_stage_duration_seconds_count{stage="tests.stage"}') == {
+        'harry_stage_duration_seconds_count{stage="tests.stage"}': 2
+    }
+    assert 'harry_stage_duration_seconds_sum{stage="tests.stage"}' in body
+    assert series(body, 'harry_stage_errors_total{stage="tests.stage"}') == {
+        'harry_stage_errors_total{stage="tests.stage"}': 1
+    }
+
+
+def test_spans_are_not_recorded_when_tracing_is_disabled(client, monkeypatch):
+    monkeypatch.setattr(get_settings(), "TRACING_ENABLED", False)
+    with span("tests.disabled"):
+        pass
+
+    assert 'stage="tests.disabled"' not in client.get("/metrics").text
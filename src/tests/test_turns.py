@@ -0,0 +1,151 @@
+import asyncio
+from helpers import TurnScheduler
+
+
+class Recorder:
+    """
+    A turn function that records its batches and blocks each turn until it is released.
+    """
+
+    def __init__(self, fail_on=()):
+        self.batches: list[tuple[str, list]] = []
+        self.running: set[str] = set()
+        self.max_parallel = 0
+        self.release = asyncio.Event()
+        self.fail_on = fail_on
+
+    async def __call__(self, key: str, batch: list):
+        assert key not in self.running, "turns of the same key overlapped"
+        self.running.add(key)
+        self.max_parallel = max(self.max_parallel, len(self.running))
+        try:
+            await self.release.wait()
+            self.batches.append((key, batch))
+            if any(item in self.fail_on for item in batch):
+                raise RuntimeError("turn failed")
+        finally:
+            self.running.discard(key)
+
+
+async def wait_idle(scheduler: TurnScheduler, *keys: str):
+    while any(scheduler.is_busy(key) for key in keys):
+        await asyncio.sleep(0)
+
+
+def test_messages_sent_during_a_turn_are_coalesced():
+    async def scenario():
+        run_turn = Recorder()
+        scheduler = TurnScheduler(run_turn, coalesce=True)
+
+        scheduler.submit("chat", "a")
+        await asyncio.sleep(0)
+        scheduler.submit("chat", "b")
+        scheduler.submit("chat", "c")
+        run_turn.release.set()
+        await wait_idle(scheduler, "chat")
+
+        assert run_turn.batches == [("chat", ["a"]), ("chat", ["b", "c"])]
+
+    asyncio.run(scenario())
+
+
+def test_coalesce_window_merges_a_burst_into_one_turn():
+    async def scenario():
+        run_turn = Recorder()
+        run_turn.release.set()
+        scheduler = TurnScheduler(run_turn, coalesce=True, coalesce_window=0.05)
+
+        for item in ("a", "b", "c"):
+            scheduler.submit("chat", item)
+            await asyncio.sleep(0.01)
+        await wait_idle(scheduler, "chat")
+
+        assert run_turn.batches == [("chat", ["a", "b", "c"])]
+
+    asyncio.run(scenario())
+
+
+def test_without_coalescing_every_message_gets_its_own_turn_in_order():
+    async def scenario():
+        run_turn = Recorder()
+        scheduler = TurnScheduler(run_turn)
+
+        for item in ("a", "b", "c"):
+            scheduler.submit("chat", item)
+        run_turn.release.set()
+        await wait_idle(scheduler, "chat")
+
+        assert run_turn.batches == [("chat", ["a"]), ("chat", ["b"]), ("chat", ["c"])]
+
+    asyncio.run(scenario())
+
+
+def test_turns_of_different_keys_run_in_parallel():
+    async def scenario():
+        run_turn = Recorder()
+        scheduler = TurnScheduler(run_turn, coalesce=True)
+
+        scheduler.submit("chat-1", "a")
+        scheduler.submit("chat-2", "b")
+        await asyncio.sleep(0)
+        assert run_turn.max_parallel == 2
+
+        run_turn.release.set()
+        await wait_idle(scheduler, "chat-1", "chat-2")
+        assert sorted(run_turn.batches) == [("chat-1", ["a"]), ("chat-2", ["b"])]
+
+    asyncio.run(scenario())
+
+
+def test_a_failed_turn_does_not_stop_the_next_ones():
+    async def scenario():
+        run_turn = Recorder(fail_on={"a"})
+        scheduler = TurnScheduler(run_turn)
+
+        scheduler.submit("chat", "a")
+        scheduler.submit("chat", "b")
+        run_turn.release.set()
+        await wait_idle(scheduler, "chat")
+
+        assert run_turn.batches == [("chat", ["a"]), ("chat", ["b"])]
+        assert not scheduler.is_busy("chat")
+
+    asyncio.run(scenario())
+
+
+def test_close_cancels_running_turns_and_drops_queued_ones():
+    async def scenario():
+        run_turn = Recorder()
+        scheduler = TurnScheduler(run_turn)
+
+        scheduler.submit("chat", "a")
+        scheduler.submit("chat", "b")
+        await asyncio.sleep(0)
+        await scheduler.close()
+
+        assert run_turn.batches == []
+        assert not scheduler.is_busy("chat")
+
+    asyncio.run(scenario())
+
+
+def test_items_past_max_pending_are_refused():
+    async def scenario():
+        run_turn = Recorder()
+        scheduler = TurnScheduler(run_turn, coalesce=True, max_pending=2)
+
+        assert scheduler.submit("chat", "a")
+        await asyncio.sleep(0)
+        # "a" is being answered; two more may wait for the next turn.
+        assert scheduler.submit("chat", "b") and scheduler.submit("chat", "c")
+        assert scheduler.is_full("chat") and not scheduler.submit("chat", "d")
+        assert scheduler.submit("other", "e")
+
+        run_turn.release.set()
+        await wait_idle(scheduler, "chat", "other")
+
+        assert ("chat", ["b", "c"]) in run_turn.batches
+        assert not scheduler.is_full("chat") and scheduler.submit("chat", "f")
+        await wait_idle(scheduler, "chat")
+
+    asyncio.run(scenario())
@@ -0,0 +1,65 @@
+import asyncio
+from datetime import timedelta
+import pytest
+from fastapi import HTTPException
+from controllers import UserController
+from helpers import create_access_token
+from schemas.user import UserInDB
+
+
+class FakeUserModel:
+    def __init__(self):
+        self.users: dict[str, UserInDB] = {}
+        self.reads = 0
+
+    async def get_user(self, username: str):
+        self.reads += 1
+        return self.users.get(username)
+
+
+def make_user(full_name: str = "Harry Potter") -> UserInDB:
+    return UserInDB(username="harry", email="harry@hogwarts.edu", full_name=full_name, hashed_password="x")
+
+
+def token_for(user: UserInDB) -> str:
+    claims = {"sub": user.username, "email": user.email, "full_name": user.full_name}
+    return create_access_token(claims, timedelta(minutes=30)).access_token
+
+
+def test_tokens_are_served_from_their_claims_and_cached():
+    model = FakeUserModel()
+    controller = UserController(model)
+    token = token_for(make_user())
+
+    first = asyncio.run(controller.get_current_user(token))
+    second = asyncio.run(controller.get_current_user(token))
+
+    assert first.full_name == "Harry Potter" and second is first
+    assert model.reads == 0
+
+
+def test_invalidated_users_are_read_from_the_database():
+    model = FakeUserModel()
+    controller = UserController(model)
+    token = token_for(make_user())
+    asyncio.run(controller.get_current_user(token))
+
+    # The user renames themselves; older tokens carry the old name in their claims.
+    model.users["harry"] = make_user("Harry James Potter")
+    controller.invalidate_user("harry")
+
+    assert asyncio.run(controller.get_current_user(token)).full_name == "Harry James Potter"
+    assert model.reads == 1
+
+
+def test_tokens_of_deleted_users_are_refused_once_invalidated():
+    model = FakeUserModel()
+    controller = UserController(model)
+    token = token_for(make_user())
+    asyncio.run(controller.get_current_user(token))
+
+    controller.invalidate_user("harry")
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(controller.get_current_user(token))
+    assert error.value.status_code == 401
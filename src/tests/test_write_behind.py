@@ -0,0 +1,158 @@
+import asyncio
+import pytest
+from bson.errors import InvalidDocument
+from pymongo.errors import AutoReconnect, BulkWriteError
+from helpers import WriteBehindSink
+from helpers.write_behind import DUPLICATE_KEY_ERROR
+
+
+class FakeCollection:
+    """
+    Records `insert_many` calls and fails them as scripted: each item of `failures` is the
+    exception raised by the matching attempt, or None for a successful one.
+    """
+
+    name = "messages"
+
+    def __init__(self, failures=()):
+        self.failures = list(failures)
+        self.attempts: list[list[dict]] = []
+        self.documents: dict = {}
+
+    async def insert_many(self, documents, ordered=True):
+        self.attempts.append(list(documents))
+        failure = self.failures.pop(0) if self.failures else None
+        if failure is not None:
+            raise failure
+        for document in documents:
+            self.documents[document["_id"]] = document
+
+
+def duplicate_key_error(count: int) -> BulkWriteError:
+    errors = [{"index": i, "code": DUPLICATE_KEY_ERROR, "errmsg": "duplicate key"} for i in range(count)]
+    return BulkWriteError({"writeErrors": errors, "writeConcernErrors": [], "nInserted": 0})
+
+
+@pytest.fixture(autouse=True)
+def no_retry_delay(monkeypatch):
+    monkeypatch.setattr(WriteBehindSink, "RETRY_SECONDS", 0)
+
+
+def documents(count: int) -> list[dict]:
+    return [{"_id": i, "chat_id": "chat", "message": f"message {i}"} for i in range(count)]
+
+
+def test_full_batches_are_written_without_waiting():
+    async def scenario():
+        collection = FakeCollection()
+        sink = WriteBehindSink(collection, max_batch=2, max_delay=60)
+        for document in documents(5):
+            sink.add(document)
+        await sink.close()
+
+        assert [len(batch) for batch in collection.attempts] == [2, 2, 1]
+        assert sink.metrics == {"buffered": 0, "batches": 3, "inserted": 5, "dropped": 0}
+
+    asyncio.run(scenario())
+
+
+def test_a_partial_batch_is_written_after_max_delay():
+    async def scenario():
+        collection = FakeCollection()
+        sink = WriteBehindSink(collection, max_batch=10, max_delay=0.01)
+        sink.add(documents(1)[0])
+        assert sink.has_pending("chat_id", "chat")
+
+        await asyncio.sleep(0.05)
+        assert collection.attempts == [documents(1)]
+        assert not sink.has_pending("chat_id", "chat")
+
+    asyncio.run(scenario())
+
+
+def test_transient_errors_are_retried():
+    async def scenario():
+        collection = FakeCollection([AutoReconnect("primary stepped down"), None])
+        sink = WriteBehindSink(collection, max_batch=10, max_delay=60)
+        for document in documents(3):
+            sink.add(document)
+        await sink.flush()
+
+        assert len(collection.attempts) == 2
+        assert len(collection.documents) == 3
+        assert sink.metrics["inserted"] == 3 and sink.metrics["dropped"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_duplicates_of_an_earlier_attempt_count_as_written():
+    async def scenario():
+        # The first attempt inserted the documents but its acknowledgement was lost; the retry
+        # only hits duplicate keys, which means the batch is already stored.
+        collection = FakeCollection([AutoReconnect("connection reset"), duplicate_key_error(3)])
+        sink = WriteBehindSink(collection, max_batch=10, max_delay=60)
+        for document in documents(3):
+            sink.add(document)
+        await sink.flush()
+
+        assert len(collection.attempts) == 2
+        assert sink.metrics["inserted"] == 3 and sink.metrics["dropped"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_other_write_errors_are_retried_then_dropped():
+    async def scenario():
+        failure = BulkWriteError({"writeErrors": [{"index": 0, "code": 121, "errmsg": "validation"}]})
+        collection = FakeCollection([failure] * WriteBehindSink.MAX_ATTEMPTS)
+        sink = WriteBehindSink(collection, max_batch=10, max_delay=60)
+        for document in documents(2):
+            sink.add(document)
+        await sink.flush()
+
+        assert len(collection.attempts) == WriteBehindSink.MAX_ATTEMPTS
+        assert sink.metrics["dropped"] == 2 and sink.metrics["inserted"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_a_batch_being_inserted_is_still_pending():
+    async def scenario():
+        collection = FakeCollection()
+        release = asyncio.Event()
+        insert_many = collection.insert_many
+
+        async def slow_insert_many(documents, ordered=True):
+            await release.wait()
+            await insert_many(documents, ordered)
+
+        collection.insert_many = slow_insert_many
+        sink = WriteBehindSink(collection, max_batch=10, max_delay=60)
+        sink.add(documents(1)[0])
+        flush = asyncio.create_task(sink.flush())
+        await asyncio.sleep(0)
+
+        assert sink.has_pending("chat_id", "chat")
+        release.set()
+        await flush
+        assert not sink.has_pending("chat_id", "chat")
+
+    asyncio.run(scenario())
+
+
+def test_unexpected_errors_drop_the_batch_without_escaping_the_flush(caplog):
+    async def scenario():
+        collection = FakeCollection([InvalidDocument("cannot encode object")])
+        sink = WriteBehindSink(collection, max_batch=2, max_delay=60)
+        for document in documents(2):
+            sink.add(document)
+        # The batch is full, so it is flushed by a background task.
+        await asyncio.sleep(0.01)
+
+        assert len(collection.attempts) == 1
+        assert sink.metrics["dropped"] == 2
+        assert not sink._flushes and not sink.has_pending("chat_id", "chat")
+        await sink.close()
+
+    asyncio.run(scenario())
+    assert "Dropping 2 buffered documents of messages (chats chat)" in caplog.text